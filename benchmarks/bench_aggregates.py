@@ -0,0 +1,101 @@
+"""
+Benchmark FSTree.aggregates() and FSTree.largest() against recursive walks.
+
+Builds a synthetic tree in memory (as benchmarks.bench_memory does), giving
+each package directory recorded file sizes, then times asking for the number
+of files and bytes under many directories, and for the largest directories,
+both by walking contents recursively each time, as callers used to, and with
+the cached aggregates, checking they agree.
+
+Usage: python -m benchmarks.bench_aggregates [DIRS] [FILES_PER_DIR] [QUERIES]
+"""
+
+import heapq
+import os
+import random
+import sys
+import time
+
+from roedoe_lib import FSTree
+
+from .bench_memory import build
+
+
+def add_sizes(tree, rng):
+    """Record random sizes for the files in every directory of a tree."""
+    for value in tree.contents.values():
+        if isinstance(value, FSTree):
+            add_sizes(value, rng)
+    tree.metadata = {'files': {
+        name: {'size': rng.randrange(100000)}
+        for name, value in tree.contents.items() if value is None
+    }}
+
+
+def walk_totals(tree):
+    """Count files and bytes under a directory, recursively."""
+    files = size = 0
+    sizes = tree.metadata['files']
+    for name, value in tree.contents.items():
+        if isinstance(value, FSTree):
+            below = walk_totals(value)
+            files += below[0]
+            size += below[1]
+        else:
+            files += 1
+            size += sizes[name]['size']
+    return files, size
+
+
+def walk_largest(tree, n):
+    """Find the largest directories by totalling every one of them."""
+    totals = []
+    stack = [('', tree)]
+    while stack:
+        prefix, node = stack.pop()
+        for name, value in node.contents.items():
+            if isinstance(value, FSTree):
+                totals.append((walk_totals(value)[1], prefix + name))
+                stack.append((prefix + name + os.sep, value))
+    return [path for _, path in heapq.nlargest(n, totals)]
+
+
+def main(dirs=10000, files_per_dir=20, queries=1000):
+    rng = random.Random(0)
+    tree = build(FSTree, dirs, files_per_dir, True)
+    add_sizes(tree, rng)
+    groups = [tree] + [tree[name] for name in tree.contents]
+    targets = [rng.choice(groups) for _ in range(queries)]
+
+    start = time.perf_counter()
+    walked = [walk_totals(target) for target in targets]
+    walk_time = time.perf_counter() - start
+    start = time.perf_counter()
+    walked_largest = walk_largest(tree, 10)
+    walk_largest_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tree.aggregates()
+    first_time = time.perf_counter() - start
+    start = time.perf_counter()
+    cached = [target.aggregates() for target in targets]
+    cached_time = time.perf_counter() - start
+    start = time.perf_counter()
+    largest = tree.largest(10)
+    largest_time = time.perf_counter() - start
+
+    assert walked == [(found.files, found.size) for found in cached], (
+        'Totals differ!')
+    assert sorted(walked_largest) == sorted(path for path, _ in largest), (
+        'Largest differ!')
+
+    print('{} queries'.format(queries))
+    print('{:28} {:9.3f}s'.format('recursive walks', walk_time))
+    print('{:28} {:9.3f}s'.format('aggregates(), first', first_time))
+    print('{:28} {:9.6f}s'.format('aggregates(), cached', cached_time))
+    print('{:28} {:9.3f}s'.format('top 10, recursive', walk_largest_time))
+    print('{:28} {:9.6f}s'.format('top 10, largest()', largest_time))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
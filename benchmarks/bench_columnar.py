@@ -0,0 +1,78 @@
+"""
+Benchmark analytics over a ColumnarTree against the same over an FSTree.
+
+Builds a synthetic tree in memory (as benchmarks.bench_memory does), converts
+it to a ColumnarTree, and times counting files, filtering by name suffix and
+extracting a subtree both ways, checking they agree, along with the memory
+each representation takes.
+
+Usage: python -m benchmarks.bench_columnar [DIRS] [FILES_PER_DIR]
+"""
+
+import re
+import sys
+import time
+
+from roedoe_lib import ColumnarTree, FSTree
+from roedoe_lib.columnar import KIND_FILE
+
+from .bench_memory import build, measure
+
+
+def count_files(tree):
+    """Count files in an FSTree, recursively."""
+    return sum(
+        count_files(value) if isinstance(value, FSTree) else 1
+        for value in tree.contents.values()
+    )
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(dirs=10000, files_per_dir=20):
+    tree, tree_size = measure(lambda: build(FSTree, dirs, files_per_dir, True))
+    (convert_time, columnar), columnar_size = measure(
+        lambda: timed(lambda: ColumnarTree.from_fstree(tree)))
+    print('{} nodes, converted in {:.3f}s'.format(len(columnar), convert_time))
+    print('{:8} {:8.1f} MB'.format('fstree', tree_size / 2 ** 20))
+    print('{:8} {:8.1f} MB'.format('columnar', columnar_size / 2 ** 20))
+
+    suffix_filter = [re.compile(r'.*\.md$')]
+    index = next(iter(columnar.children(next(iter(columnar.children())))))
+    path = columnar.path(index).split('/')
+    print('{:10} {:>10} {:>10} {:>8}'.format(
+        'operation', 'fstree', 'columnar', 'speedup'))
+    for label, by_tree, by_columns, same in (
+        (
+            'count',
+            lambda: count_files(tree),
+            lambda: columnar.count(KIND_FILE),
+            lambda a, b: a == b,
+        ),
+        (
+            'suffix',
+            lambda: tree.filter(suffix_filter),
+            lambda: columnar.filter_suffix('.md'),
+            lambda a, b: a == b.to_fstree(),
+        ),
+        (
+            'subtree',
+            lambda: tree[path[0]][path[1]],
+            lambda: columnar.subtree(index),
+            lambda a, b: a == b.to_fstree(),
+        ),
+    ):
+        tree_time, tree_result = timed(by_tree)
+        columns_time, columns_result = timed(by_columns)
+        assert same(tree_result, columns_result), 'Results differ!'
+        print('{:10} {:9.4f}s {:9.4f}s {:7.1f}x'.format(
+            label, tree_time, columns_time,
+            tree_time / max(columns_time, 1e-9)))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
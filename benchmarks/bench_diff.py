@@ -0,0 +1,55 @@
+"""
+Benchmark diffing two big FSTrees which differ a little.
+
+Builds two synthetic trees in memory (as benchmarks.bench_memory does), the
+second with a few files added and removed, then times finding the
+differences by comparing sets of every path, as callers used to, and with
+FSTree.diff(): first including working out the trees' digests, then with
+them already worked out, checking they agree.
+
+Usage: python -m benchmarks.bench_diff [DIRS] [FILES_PER_DIR] [CHANGES]
+"""
+
+import sys
+import time
+
+from roedoe_lib import FSTree
+
+from .bench_memory import build
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(dirs=10000, files_per_dir=20, changes=10):
+    old = build(FSTree, dirs, files_per_dir, True)
+    new = build(FSTree, dirs, files_per_dir, True)
+    for i in range(changes):
+        package = 'package{}'.format(i * (dirs // changes))
+        group = new['group{}'.format(i * (dirs // changes) // 100)]
+        group[package]['added.py'] = None
+        del group[package].contents['README.md']
+
+    def by_sets():
+        old_paths = set(old._path_index())
+        new_paths = set(new._path_index())
+        return sorted(new_paths - old_paths), sorted(old_paths - new_paths)
+
+    sets_time, (added, removed) = timed(by_sets)
+    first_time, diff = timed(lambda: old.diff(new))
+    again_time, again = timed(lambda: old.diff(new))
+    assert (sorted(diff.added), sorted(diff.removed)) == (added, removed)
+    assert again == diff
+    print('{} changes in {} paths'.format(
+        len(added) + len(removed), len(old._path_index())))
+    print('sets            {:8.4f}s'.format(sets_time))
+    print('diff (digests)  {:8.4f}s'.format(first_time))
+    print('diff (cached)   {:8.4f}s  {:.0f}x'.format(
+        again_time, sets_time / again_time))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
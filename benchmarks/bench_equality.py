@@ -0,0 +1,89 @@
+"""
+Benchmark comparing big FSTrees for equality, as caching layers do.
+
+Builds two equal synthetic trees in memory (as benchmarks.bench_memory
+does), then times comparing them repeatedly by comparing contents
+recursively, as FSTree.__eq__() used to, and with FSTree.__eq__(), which
+compares without recursion and skips directories the trees share, as trees
+derived with FSTree.with_item() do; and by digest, as hashing does (the
+first comparison working out the digests).  Also reports how much smaller
+pickling the tree gets with FSTree.dedup(), as every package has the same
+lib directory.
+
+Usage: python -m benchmarks.bench_equality [DIRS] [FILES_PER_DIR] [REPEATS]
+"""
+
+import os
+import pickle
+import sys
+import time
+
+from roedoe_lib import FSTree
+
+from .bench_memory import build
+
+
+def legacy_equal(first, second):
+    """Compare two trees as FSTree.__eq__() used to."""
+    if first.metadata != second.metadata:
+        return False
+    if first.contents.keys() != second.contents.keys():
+        return False
+    for name, value in first.contents.items():
+        other = second.contents[name]
+        if isinstance(value, FSTree) != isinstance(other, FSTree):
+            return False
+        if isinstance(value, FSTree) and not legacy_equal(value, other):
+            return False
+    return True
+
+
+def with_libs(tree):
+    """Give every package in a tree the same lib directory."""
+    for group in tree.contents.values():
+        for package in group.contents.values():
+            package['lib'] = FSTree({'util.py': None, 'core.py': None})
+    return tree
+
+
+def main(dirs=10000, files_per_dir=20, repeats=10):
+    first = with_libs(build(FSTree, dirs, files_per_dir, True))
+    second = with_libs(build(FSTree, dirs, files_per_dir, True))
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        assert legacy_equal(first, second)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        assert first == second
+    equal_time = time.perf_counter() - start
+
+    derived = first.with_item(os.path.join('group0', 'new.py'), None)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        assert derived != first
+    shared_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert first.digest() == second.digest()
+    first_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeats):
+        assert first.digest() == second.digest()
+    digest_time = time.perf_counter() - start
+
+    print('{} comparisons'.format(repeats))
+    print('recursive      {:8.4f}s'.format(legacy_time))
+    print('__eq__         {:8.4f}s'.format(equal_time))
+    print('__eq__, shared {:8.6f}s'.format(shared_time))
+    print('digest (first) {:8.4f}s'.format(first_time))
+    print('digest (rest)  {:8.6f}s'.format(digest_time))
+    print('pickled: {:.1f}MB, deduped {:.1f}MB'.format(
+        len(pickle.dumps(first)) / 2 ** 20,
+        len(pickle.dumps(first.dedup())) / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
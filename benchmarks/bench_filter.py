@@ -0,0 +1,77 @@
+"""
+Benchmark matching paths against many patterns, as FSTree.filter() does.
+
+Makes a list of synthetic paths and a mix of patterns like the ones we filter
+with (mostly extension suffixes, some case insensitive, plus some directory
+prefixes and a few general regexes), then for increasing numbers of patterns
+times trying each pattern in turn, as FSTree.filter() used to, against a
+CompiledFilter, checking they agree.
+
+Usage: python -m benchmarks.bench_filter [PATHS] [MAX_PATTERNS]
+"""
+
+import re
+import sys
+import time
+
+from roedoe_lib import CompiledFilter
+
+
+def make_paths(count):
+    """Some plausible relative paths."""
+    extensions = ('py', 'md', 'RST', 'txt', 'json', 'c', 'h', 'ext42')
+    return [
+        'd{}/sub{}/file{}.{}'.format(
+            i % 37, i % 11, i, extensions[i % len(extensions)])
+        for i in range(count)
+    ]
+
+
+def make_patterns(count):
+    """A mix of suffix, prefix and general patterns."""
+    patterns = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 6:
+            patterns.append(re.compile(r'.*\.ext{}$'.format(i)))
+        elif kind < 8:
+            patterns.append(
+                re.compile(r'.*\.x{}$'.format(i), re.IGNORECASE))
+        elif kind == 8:
+            patterns.append(re.compile(r'^d{}/.*'.format(100 + i)))
+        else:
+            patterns.append(re.compile(r'.*/sub{}/[^/]*\.py$'.format(i)))
+    return patterns
+
+
+def time_matching(match, paths):
+    """Time matching every path, returning the time and the matches."""
+    start = time.perf_counter()
+    matched = [path for path in paths if match(path)]
+    return time.perf_counter() - start, matched
+
+
+def main(path_count=20000, max_patterns=1000):
+    paths = make_paths(path_count)
+    print('{} paths'.format(path_count))
+    print('{:>8} {:>10} {:>10} {:>8} {:>8}'.format(
+        'patterns', 'any()', 'compiled', 'speedup', 'matched'))
+    for count in (10, 20, 50, 100, 200, 500, 1000, 2000, 5000):
+        if count > max_patterns:
+            break
+        patterns = make_patterns(count)
+
+        def naive(path):
+            return any(filter_.match(path) for filter_ in patterns)
+
+        naive_time, naive_matched = time_matching(naive, paths)
+        compiled = CompiledFilter(patterns)
+        compiled_time, compiled_matched = time_matching(compiled.match, paths)
+        assert naive_matched == compiled_matched, 'Matches differ!'
+        print('{:8} {:9.3f}s {:9.3f}s {:7.1f}x {:8}'.format(
+            count, naive_time, compiled_time, naive_time / compiled_time,
+            len(compiled_matched)))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,78 @@
+"""
+Benchmark FSTree.hash_files() against a simple serial hashing loop.
+
+Builds a tree of files of random contents in a temporary directory, then
+times hashing every file in it: one at a time, reading each whole; with
+hash_files(), serially and on a thread pool; and with hash_files() again
+given the previous result, when nothing has changed.  Checks the digests
+agree.
+
+Usage: python -m benchmarks.bench_hash [DIRS] [FILES_PER_DIR] [FILE_KB]
+    [WORKERS]
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from roedoe_lib import FSTree
+
+
+def make_files(root, dirs, files_per_dir, file_kb):
+    """Make dirs directories of files_per_dir random files each."""
+    for i in range(dirs):
+        directory = os.path.join(root, 'dir{}'.format(i))
+        os.makedirs(directory)
+        for j in range(files_per_dir):
+            with open(os.path.join(directory, 'file{}'.format(j)), 'wb') as f:
+                f.write(os.urandom(file_kb * 1024))
+
+
+def serial_loop(top, tree):
+    """Hash every file in a tree, one after another, reading each whole."""
+    digests = {}
+    for rel_path, value in tree._path_index().items():
+        if value is None:
+            with open(os.path.join(top, rel_path), 'rb') as f:
+                digests[rel_path] = hashlib.sha256(f.read()).hexdigest()
+    return digests
+
+
+def main(dirs=200, files_per_dir=50, file_kb=64, workers=8):
+    root = tempfile.mkdtemp(prefix='rd.bench.')
+    try:
+        make_files(root, dirs, files_per_dir, file_kb)
+        tree = FSTree.at_path(root, {root})
+
+        timings = []
+
+        def timed(label, function, *args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            timings.append((label, time.perf_counter() - start))
+            return result
+
+        digests = timed('serial loop', serial_loop, root, tree)
+        timed('hash_files()', tree.hash_files, root)
+        hashed = timed(
+            'hash_files({})'.format(workers), tree.hash_files, root,
+            workers=workers)
+        again = timed(
+            'hash_files(previous)', tree.hash_files, root, workers=workers,
+            previous=hashed)
+        for rel_path, digest in digests.items():
+            assert hashed.file_hash(rel_path) == digest, 'Digests differ!'
+            assert again.file_hash(rel_path) == digest, 'Digests differ!'
+    finally:
+        shutil.rmtree(root)
+
+    print('{} files of {}KB'.format(len(digests), file_kb))
+    for label, seconds in timings:
+        print('{:24} {:9.3f}s'.format(label, seconds))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,86 @@
+"""
+Benchmark FSTree.at_path() with typical ignores.
+
+Builds a synthetic source tree with a big node_modules directory, a .git
+directory and compiled files dotted about, and walks it with ignores for
+those, comparing the original walk (which checked every entry against the
+whole PathSpec) with the current one (which prunes directories whose
+contents are all ignored, and only checks the patterns which can match in
+each directory).  To separate the two effects, the current walk is also
+timed with the PathSpec wrapped up so it can't be analysed.
+
+Usage: python -m benchmarks.bench_ignores [DIRS] [FILES_PER_DIR] [PATTERNS]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from roedoe_lib import FSTree, ignore
+
+from .bench_scan import legacy_at_path, make_tree
+
+
+class Opaque:
+
+    """A PathSpec which can't be analysed."""
+
+    def __init__(self, spec):
+        self.match_file = spec.match_file
+
+
+def make_source_tree(root, dirs, files_per_dir):
+    """A tree of source, with a node_modules and .git alongside."""
+    make_tree(os.path.join(root, 'src'), dirs, files_per_dir, 0)
+    make_tree(os.path.join(root, 'node_modules'), dirs, files_per_dir, 0)
+    make_tree(os.path.join(root, '.git'), dirs // 4, files_per_dir, 0)
+    for i in range(0, dirs, 3):
+        path = os.path.join(
+            root, 'src', 'd{:03}'.format(i // 100), 'd{:03}'.format(i))
+        open(os.path.join(path, 'module.pyc'), 'a').close()
+
+
+def make_patterns(count):
+    """Typical ignores, padded out with anchored ones for other places."""
+    patterns = ['node_modules/', '.git/', '*.pyc', '/build/', 'docs/_build/']
+    patterns.extend(
+        '/vendor{}/*.o'.format(i) for i in range(count - len(patterns)))
+    return ignore(*patterns)
+
+
+def timed(func):
+    """Call func(), returning its result and the time taken."""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(dirs=400, files_per_dir=50, patterns=50):
+    root = tempfile.mkdtemp(prefix='rd.bench.')
+    try:
+        make_source_tree(root, dirs, files_per_dir)
+        ignores = make_patterns(patterns)
+        print('{} dirs of {} files in each of src and node_modules; '
+              '{} patterns'.format(dirs, files_per_dir, patterns))
+        legacy, legacy_time = timed(
+            lambda: legacy_at_path(root, {root}, ignores))
+        opaque, opaque_time = timed(
+            lambda: FSTree.at_path(root, {root}, Opaque(ignores)))
+        tree, tree_time = timed(
+            lambda: FSTree.at_path(root, {root}, ignores))
+        assert tree == legacy, 'Trees differ!'
+        assert opaque == legacy, 'Trees differ!'
+        for label, elapsed in (
+            ('legacy', legacy_time),
+            ('unanalysed', opaque_time),
+            ('analysed', tree_time),
+        ):
+            print('{:10} {:8.3f}s'.format(label, elapsed))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
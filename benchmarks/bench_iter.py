@@ -0,0 +1,68 @@
+"""
+Benchmark FSTree.iter_path() against FSTree.at_path().
+
+Builds a synthetic tree in a temporary directory (as benchmarks.bench_scan
+does), then times how long each takes to produce its first result and to
+finish, along with the peak memory each takes, checking they agree.
+
+Usage: python -m benchmarks.bench_iter [DIRS] [FILES_PER_DIR] [LINKS]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from roedoe_lib import FSTree
+
+from .bench_scan import make_tree
+
+
+def count_files(tree):
+    """Count files in an FSTree, recursively."""
+    return sum(
+        count_files(value) if isinstance(value, FSTree) else 1
+        for value in tree.contents.values()
+    )
+
+
+def main(dirs=2000, files_per_dir=50, links=20):
+    root = tempfile.mkdtemp(prefix='rd.bench.')
+    try:
+        make_tree(root, dirs, files_per_dir, links)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        tree = FSTree.at_path(root, {root})
+        at_path_total = time.perf_counter() - start
+        at_path_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        files = count_files(tree)
+        del tree
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        paths = FSTree.iter_path(root, {root})
+        first_file = next(path for path, is_dir in paths if not is_dir)
+        iter_path_first = time.perf_counter() - start
+        iter_files = 1 + sum(1 for _, is_dir in paths if not is_dir)
+        iter_path_total = time.perf_counter() - start
+        iter_path_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert iter_files == files, 'Walks differ!'
+    finally:
+        shutil.rmtree(root)
+
+    print('{} files; first is {}'.format(files, first_file))
+    print('{:10} {:>10} {:>10} {:>10}'.format(
+        '', 'first', 'total', 'peak'))
+    print('{:10} {:>10} {:9.3f}s {:8.1f}MB'.format(
+        'at_path', '', at_path_total, at_path_peak / 2 ** 20))
+    print('{:10} {:9.4f}s {:9.3f}s {:8.1f}MB'.format(
+        'iter_path', iter_path_first, iter_path_total,
+        iter_path_peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
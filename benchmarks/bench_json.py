@@ -0,0 +1,73 @@
+"""
+Benchmark the peak memory and time of saving and loading trees as JSON.
+
+Builds a synthetic tree in memory (as benchmarks.bench_memory does), then
+saves it to a file with to_json() and with dump_json(), and loads it with
+from_json() and with load_json(), measuring with tracemalloc the peak memory
+each takes beyond the tree itself, and checking they agree.
+
+Usage: python -m benchmarks.bench_json [DIRS] [FILES_PER_DIR]
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from roedoe_lib import FSTree
+
+from .bench_memory import build
+
+
+def peak(func):
+    """Call func(), returning its result, the time taken and peak memory."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak_size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak_size
+
+
+def main(dirs=10000, files_per_dir=20):
+    tree = build(FSTree, dirs, files_per_dir, True)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'tree.json')
+
+        def to_json():
+            with open(path, 'w') as fp:
+                fp.write(tree.to_json())
+
+        def dump_json():
+            with open(path, 'w') as fp:
+                tree.dump_json(fp)
+
+        def from_json():
+            with open(path) as fp:
+                return FSTree.from_json(fp.read())
+
+        def load_json():
+            with open(path) as fp:
+                return FSTree.load_json(fp)
+
+        print('{:10} {:>10} {:>10}'.format('', 'time', 'peak'))
+        for label, func in (
+            ('to_json', to_json),
+            ('dump_json', dump_json),
+            ('from_json', from_json),
+            ('load_json', load_json),
+        ):
+            result, elapsed, peak_size = peak(func)
+            if result is not None:
+                assert result == tree, 'Trees differ!'
+            print('{:10} {:9.3f}s {:8.1f}MB'.format(
+                label, elapsed, peak_size / 2 ** 20))
+            del result
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
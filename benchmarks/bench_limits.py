@@ -0,0 +1,62 @@
+"""
+Benchmark FSTree.at_path() with max_depth, max_entries and deadline limits.
+
+Builds a synthetic tree in a temporary directory (as benchmarks.bench_scan
+does), then times a full walk against walks limited by depth, by number of
+entries and by a deadline, reporting how much of the tree each one found and
+how many directories it left truncated, and checks expanding a truncated
+tree gives the full one.
+
+Usage: python -m benchmarks.bench_limits [DIRS] [FILES_PER_DIR] [LINKS]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+from roedoe_lib import FSTree
+
+from .bench_scan import make_tree
+
+
+def main(dirs=2000, files_per_dir=50, links=20):
+    root = tempfile.mkdtemp(prefix='rd.bench.')
+    try:
+        make_tree(root, dirs, files_per_dir, links)
+
+        start = time.perf_counter()
+        full = FSTree.at_path(root, {root})
+        full_time = time.perf_counter() - start
+        total = full.aggregates()
+
+        results = []
+        for label, limits in (
+            ('max_depth=1', {'max_depth': 1}),
+            ('max_entries=1000', {'max_entries': 1000}),
+            ('deadline=+{:.3f}s'.format(full_time / 10), {'deadline': None}),
+        ):
+            if 'deadline' in limits:
+                # A tenth of the full walk's time, from now.
+                limits['deadline'] = time.monotonic() + full_time / 10
+            start = time.perf_counter()
+            tree = FSTree.at_path(root, {root}, **limits)
+            elapsed = time.perf_counter() - start
+            results.append((label, elapsed, tree))
+
+        tree = FSTree.at_path(root, {root}, max_depth=1)
+        assert tree.expand(root, {root}) == full, 'Expanded tree differs!'
+    finally:
+        shutil.rmtree(root)
+
+    print('{} entries'.format(total.files + total.dirs))
+    print('{:20} {:9.3f}s'.format('full walk', full_time))
+    for label, elapsed, tree in results:
+        found = tree.aggregates()
+        print('{:20} {:9.3f}s {:8} entries {:6} truncated'.format(
+            label, elapsed, found.files + found.dirs,
+            len(tree.truncated_paths())))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,61 @@
+"""
+Benchmark checking whether many paths are in an FSTree.
+
+Builds a synthetic tree in memory (as benchmarks.bench_memory does), then
+checks a mix of present and absent paths both by chaining lookups of each
+component, as callers used to, and with FSTree.contains_many(), checking
+they agree.
+
+Usage: python -m benchmarks.bench_lookup [DIRS] [FILES_PER_DIR] [PATHS]
+"""
+
+import os
+import random
+import sys
+import time
+
+from roedoe_lib import FSTree
+
+from .bench_memory import build
+
+
+def chained_contains(tree, path):
+    """Check for a path by looking up each component in turn."""
+    for name in path.split(os.sep):
+        if not isinstance(tree, FSTree) or name not in tree.contents:
+            return False
+        tree = tree.contents[name]
+    return True
+
+
+def main(dirs=10000, files_per_dir=20, path_count=1000000):
+    tree = build(FSTree, dirs, files_per_dir, True)
+    rng = random.Random(0)
+    paths = [
+        os.path.join(
+            'group{}'.format(i // 100), 'package{}'.format(i),
+            'module{}.py'.format(rng.randrange(files_per_dir)))
+        for i in (rng.randrange(dirs) for _ in range(path_count))
+    ]
+
+    start = time.perf_counter()
+    chained = [chained_contains(tree, path) for path in paths]
+    chained_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tree.contains_many(paths[:1])
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = tree.contains_many(paths)
+    indexed_time = time.perf_counter() - start
+    assert chained == indexed, 'Results differ!'
+
+    print('{} paths, {} found'.format(path_count, sum(indexed)))
+    print('chained        {:8.3f}s'.format(chained_time))
+    print('index build    {:8.3f}s'.format(build_time))
+    print('contains_many  {:8.3f}s  {:.1f}x'.format(
+        indexed_time, chained_time / indexed_time))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
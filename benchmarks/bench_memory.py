@@ -0,0 +1,88 @@
+"""
+Benchmark the memory taken by big FSTrees.
+
+Builds a synthetic tree in memory, shaped like a big source tree (lots of
+packages with the same few file names in each), in three ways, measuring
+each with tracemalloc:
+
+* legacy: nodes with a __dict__, as FSTree used to be, and a fresh string
+  for every name, as a walk used to produce;
+* slots: FSTree as it is now (with __slots__), with names interned, as a walk
+  now produces;
+* compact: that, after FSTree.compact().
+
+Usage: python -m benchmarks.bench_memory [DIRS] [FILES_PER_DIR]
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from roedoe_lib import FSTree
+
+
+COMMON_NAMES = ('__init__.py', 'README.md', 'setup.py', 'conftest.py')
+
+
+class LegacyFSTree:
+
+    """FSTree as it was, with a __dict__."""
+
+    def __init__(self, contents, metadata=None):
+        self.contents = contents
+        self.metadata = metadata
+
+
+def fresh(name):
+    """A new copy of some string, as os.scandir() would give."""
+    return (name + '.')[:-1]
+
+
+def build(cls, dirs, files_per_dir, intern):
+    """Build a tree of dirs packages, in groups of 100."""
+    name = sys.intern if intern else fresh
+    groups = {}
+    for i in range(dirs):
+        files = {name(common): None for common in COMMON_NAMES}
+        for j in range(files_per_dir - len(COMMON_NAMES)):
+            files[name('module{}.py'.format(j))] = None
+        group = groups.setdefault(name('group{}'.format(i // 100)), {})
+        group[name('package{}'.format(i))] = cls(files)
+    return cls({key: cls(value) for key, value in groups.items()})
+
+
+def measure(func):
+    """Call func(), returning its result and the memory it keeps."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main(dirs=10000, files_per_dir=20):
+    entries = dirs * (files_per_dir + 1) + dirs // 100
+    print('{} entries'.format(entries))
+    legacy, legacy_size = measure(
+        lambda: build(LegacyFSTree, dirs, files_per_dir, False))
+    del legacy
+    compact, compact_size = measure(
+        lambda: build(FSTree, dirs, files_per_dir, True).compact())
+    del compact
+    tree, slots_size = measure(
+        lambda: build(FSTree, dirs, files_per_dir, True))
+    assert tree.compact() == tree, 'Trees differ!'
+    for label, size in (
+        ('legacy', legacy_size),
+        ('slots', slots_size),
+        ('compact', compact_size),
+    ):
+        print('{:8} {:8.1f} MB  {:6.1f} bytes/entry'.format(
+            label, size / 2 ** 20, size / entries))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
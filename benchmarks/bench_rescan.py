@@ -0,0 +1,62 @@
+"""
+Benchmark FSTree.rescan() against walking a tree from scratch.
+
+Builds a synthetic tree in a temporary directory (see bench_scan.make_tree()),
+backdates it so rescan() will trust its mtimes, then times a full walk, a
+rescan with nothing changed, and a rescan after adding a file in a few
+directories.
+
+Usage: python -m benchmarks.bench_rescan [DIRS] [FILES_PER_DIR] [CHANGED]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from roedoe_lib import FSTree
+
+from .bench_scan import make_tree
+
+
+def timed(func):
+    """Call func(), returning its result and the time taken."""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(dirs=1000, files_per_dir=50, changed=5):
+    root = tempfile.mkdtemp(prefix='rd.bench.')
+    try:
+        make_tree(root, dirs, files_per_dir, 0)
+        then = time.time() - 3600
+        for path, _, _ in os.walk(root):
+            os.utime(path, (then, then))
+        print('{} entries ({} dirs, {} files)'.format(
+            dirs + dirs * files_per_dir, dirs, dirs * files_per_dir))
+
+        _, at_path_time = timed(lambda: FSTree.at_path(root, {root}))
+        first, first_time = timed(lambda: FSTree.rescan(None, root, {root}))
+        same, same_time = timed(lambda: FSTree.rescan(first, root, {root}))
+        assert same is first
+        for i in range(changed):
+            open(os.path.join(
+                root, 'd{:03}'.format(i // 100), 'd{:03}'.format(i), 'new'),
+                'a').close()
+        _, changed_time = timed(lambda: FSTree.rescan(first, root, {root}))
+
+        for label, elapsed in (
+            ('at_path', at_path_time),
+            ('rescan (from nothing)', first_time),
+            ('rescan (unchanged)', same_time),
+            ('rescan ({} changed)'.format(changed), changed_time),
+        ):
+            print('{:24} {:8.3f}s'.format(label, elapsed))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,52 @@
+"""
+Benchmark checking paths against many valid roots.
+
+Compares PathResolver.contains() with the linear startswith() check
+get_path_resolver() used to make, over increasing numbers of roots.  Only
+the checks are timed, not resolving real paths.
+
+Usage: python -m benchmarks.bench_resolver [PATHS]
+"""
+
+import sys
+import time
+
+from roedoe_lib import PathResolver
+
+
+def legacy_contains(real_roots):
+    """The check get_path_resolver()'s function used to make."""
+    def contains(real_path):
+        return any(real_path.startswith(root) for root in real_roots)
+    return contains
+
+
+def timed(contains, paths):
+    """Time checking every path, returning the time and how many passed."""
+    start = time.perf_counter()
+    count = sum(1 for path in paths if contains(path))
+    return time.perf_counter() - start, count
+
+
+def main(path_count=20000):
+    print('{:>6} {:>10} {:>10}'.format('roots', 'legacy', 'trie'))
+    for root_count in (1, 10, 100, 1000, 5000):
+        # Half the paths are under roots, half not.
+        roots = [
+            '/srv/data/project{:05}'.format(i) for i in range(root_count)]
+        paths = [
+            '/srv/data/project{:05}/src/module{}/file{}.py'.format(
+                i % (2 * root_count), i % 17, i)
+            for i in range(path_count)
+        ]
+        legacy_time, legacy_count = timed(legacy_contains(roots), paths)
+        trie_time, trie_count = timed(PathResolver(roots).contains, paths)
+        # Root names are all the same length, so the legacy check's
+        # string prefixes give the right answer here.
+        assert legacy_count == trie_count, 'Results differ!'
+        print('{:6} {:9.3f}s {:9.3f}s'.format(
+            root_count, legacy_time, trie_time))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
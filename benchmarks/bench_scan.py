@@ -0,0 +1,143 @@
+"""
+Benchmark FSTree.at_path() against the original os.listdir()-based walk.
+
+Builds a synthetic tree in a temporary directory, walks it both ways, checks
+the results agree, and reports wall time plus the number of stat-family calls
+made through the os module.  DirEntry methods don't go through the os module,
+so for the scandir walk the count is topped up by one stat per symlink, which
+is what DirEntry.is_dir() costs for a link; other entries cost nothing beyond
+the directory listing itself.
+
+The scandir walk is also timed with a pool of worker threads listing
+directories ahead of it; on a local disk with a warm cache there's little to
+gain, but on network filesystems the listings overlap.
+
+Usage: python -m benchmarks.bench_scan [DIRS] [FILES_PER_DIR] [LINKS] [WORKERS]
+"""
+
+import collections
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from roedoe_lib import FSTree, get_path_resolver
+
+
+COUNTED = ('stat', 'lstat', 'listdir', 'scandir', 'readlink')
+
+
+def legacy_at_path(top, valid_roots, ignores=None):
+    """The os.listdir()-based FSTree.at_path() this package used to ship."""
+
+    get_real_path = get_path_resolver(valid_roots)
+
+    def ignored(path):
+        if not ignores:
+            return False
+        rel_path = os.path.relpath(path, top) if path != top else top
+        return ignores.match_file(rel_path)
+
+    def recursive_wibwab(path):
+        tree = FSTree({})
+        full_path = os.path.join(top, path)
+        contents = os.listdir(full_path)
+        for item in sorted(contents):
+            item_path = os.path.join(full_path, item)
+            if ignored(item_path):
+                continue
+            real_path = get_real_path(item_path)
+            if not real_path:
+                continue
+            if real_path in seen:
+                continue
+            seen.add(real_path)
+            if os.path.isdir(item_path):
+                dir_tree = recursive_wibwab(item_path)
+                if dir_tree:
+                    tree[item] = dir_tree
+            elif os.path.isfile(item_path):
+                tree[item] = None
+        return tree
+
+    if ignored(top) or not get_real_path(top):
+        return FSTree({})
+
+    seen = set()
+    return recursive_wibwab('')
+
+
+def make_tree(root, dirs, files_per_dir, links):
+    """Create a tree of dirs directories, each containing some files."""
+    for i in range(dirs):
+        path = os.path.join(
+            root, 'd{:03}'.format(i // 100), 'd{:03}'.format(i))
+        os.makedirs(path)
+        for j in range(files_per_dir):
+            open(os.path.join(path, 'f{:03}.txt'.format(j)), 'a').close()
+    for i in range(links):
+        os.symlink(
+            os.path.join(root, 'd000', 'd{:03}'.format(i % dirs)),
+            os.path.join(root, 'link{:03}'.format(i)),
+        )
+
+
+def counting(func):
+    """Call func(), returning its result, time taken and os call counts."""
+    counts = collections.Counter()
+    originals = {name: getattr(os, name) for name in COUNTED}
+
+    def wrap(name, original):
+        def wrapped(*args, **kwargs):
+            counts[name] += 1
+            return original(*args, **kwargs)
+        return wrapped
+
+    for name, original in originals.items():
+        setattr(os, name, wrap(name, original))
+    try:
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+    finally:
+        for name, original in originals.items():
+            setattr(os, name, original)
+    return result, elapsed, counts
+
+
+def main(dirs=1000, files_per_dir=50, links=20, workers=8):
+    root = tempfile.mkdtemp(prefix='rd.bench.')
+    try:
+        make_tree(root, dirs, files_per_dir, links)
+        entries = dirs + dirs * files_per_dir + links
+        print('{} entries ({} dirs, {} files, {} links)'.format(
+            entries, dirs, dirs * files_per_dir, links))
+
+        legacy, legacy_time, legacy_counts = counting(
+            lambda: legacy_at_path(root, {root}))
+        tree, scan_time, scan_counts = counting(
+            lambda: FSTree.at_path(root, {root}))
+        scan_counts['stat (DirEntry)'] = links
+        threaded, threaded_time, threaded_counts = counting(
+            lambda: FSTree.at_path(root, {root}, workers=workers))
+        threaded_counts['stat (DirEntry)'] = links
+        assert tree == legacy, 'Trees differ!'
+        assert threaded == legacy, 'Trees differ!'
+
+        for label, elapsed, counts in (
+            ('listdir', legacy_time, legacy_counts),
+            ('scandir', scan_time, scan_counts),
+            ('threaded', threaded_time, threaded_counts),
+        ):
+            print('{:8} {:8.3f}s  {:9} calls  {}'.format(
+                label, elapsed, sum(counts.values()),
+                ', '.join('{}={}'.format(k, v)
+                          for k, v in sorted(counts.items())),
+            ))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
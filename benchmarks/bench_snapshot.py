@@ -0,0 +1,69 @@
+"""
+Benchmark opening a saved tree and looking up one path in it.
+
+Builds a synthetic tree in memory (as benchmarks.bench_memory does), saves it
+as JSON and as a snapshot, then times loading each and looking up one file,
+checking they agree.
+
+Usage: python -m benchmarks.bench_snapshot [DIRS] [FILES_PER_DIR]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from roedoe_lib import FSTree
+
+from .bench_memory import build
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def write_json(tree, path):
+    with open(path, 'w') as json_file:
+        json_file.write(tree.to_json())
+
+
+def read_json(path):
+    with open(path) as json_file:
+        return FSTree.from_json(json_file.read())
+
+
+def main(dirs=10000, files_per_dir=20):
+    tree = build(FSTree, dirs, files_per_dir, True)
+    path = ('group{}'.format((dirs - 1) // 100),
+            'package{}'.format(dirs - 1), 'README.md')
+
+    def look_up(loaded):
+        return path[-1] in loaded[path[0]][path[1]].contents
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        json_path = os.path.join(tmpdir, 'tree.json')
+        snapshot_path = os.path.join(tmpdir, 'tree.snapshot')
+        write_json_time, _ = timed(lambda: write_json(tree, json_path))
+        write_snapshot_time, _ = timed(lambda: tree.to_snapshot(snapshot_path))
+        json_time, json_found = timed(
+            lambda: look_up(read_json(json_path)))
+        snapshot_time, snapshot_found = timed(
+            lambda: look_up(FSTree.from_snapshot(snapshot_path)))
+        assert json_found and snapshot_found, 'Not found!'
+        sizes = os.path.getsize(json_path), os.path.getsize(snapshot_path)
+    print('{:9} {:>8} {:>10} {:>12}'.format(
+        '', 'size', 'write', 'open+lookup'))
+    for label, size, write_time, read_time in (
+        ('json', sizes[0], write_json_time, json_time),
+        ('snapshot', sizes[1], write_snapshot_time, snapshot_time),
+    ):
+        print('{:9} {:6.1f}MB {:9.3f}s {:11.5f}s'.format(
+            label, size / 2 ** 20, write_time, read_time))
+    print('{:.0f}x quicker to open and look up'.format(
+        json_time / snapshot_time))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""
+Benchmark recording stat fields during FSTree.at_path() against a second walk.
+
+Builds a synthetic tree in a temporary directory (as benchmarks.bench_scan
+does), then times a plain walk followed by statting every path in the tree,
+as was needed before, and a walk given stat_fields, checking they agree.
+
+Usage: python -m benchmarks.bench_stats [DIRS] [FILES_PER_DIR] [LINKS]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from roedoe_lib import FSTree
+
+from .bench_scan import make_tree
+
+
+FIELDS = ('size', 'mtime_ns')
+
+
+def stat_all(top, tree):
+    """Stat everything in a tree, by path, as a second walk."""
+    return {
+        rel_path: os.stat(os.path.join(top, rel_path))
+        for rel_path in tree._path_index()
+    }
+
+
+def main(dirs=2000, files_per_dir=50, links=20):
+    root = tempfile.mkdtemp(prefix='rd.bench.')
+    try:
+        make_tree(root, dirs, files_per_dir, links)
+
+        start = time.perf_counter()
+        tree = FSTree.at_path(root, {root})
+        stats = stat_all(root, tree)
+        two_walks = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stat_tree = FSTree.at_path(root, {root}, stat_fields=FIELDS)
+        one_walk = time.perf_counter() - start
+
+        for rel_path, st in stats.items():
+            assert stat_tree.stats(rel_path) == {
+                'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+            }, 'Stats differ!'
+    finally:
+        shutil.rmtree(root)
+
+    print('{} paths'.format(len(stats)))
+    print('{:24} {:9.3f}s'.format('at_path + stat pass', two_walks))
+    print('{:24} {:9.3f}s'.format('at_path(stat_fields)', one_walk))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,79 @@
+"""
+Benchmark keeping many versions of an FSTree in memory.
+
+Builds a synthetic tree in memory (as benchmarks.bench_memory does), then
+derives a series of versions from it, each adding one file somewhere: both
+by deep copying the previous version and changing the copy with
+__setitem__, as callers used to, and with FSTree.with_item().  Reports the
+time taken and the memory kept for all the versions, and checks the final
+versions agree.
+
+Usage: python -m benchmarks.bench_versions [DIRS] [FILES_PER_DIR] [VERSIONS]
+"""
+
+import copy
+import os
+import random
+import sys
+import time
+
+from roedoe_lib import FSTree
+
+from .bench_memory import build, measure
+
+
+def changes(dirs, versions):
+    """Paths of the files to add, one per version."""
+    rng = random.Random(0)
+    for version in range(versions):
+        i = rng.randrange(dirs)
+        yield os.path.join(
+            'group{}'.format(i // 100), 'package{}'.format(i),
+            'new{}.py'.format(version))
+
+
+def deep_copies(tree, paths):
+    versions = [tree]
+    for path in paths:
+        tree = copy.deepcopy(tree)
+        *names, name = path.split(os.sep)
+        node = tree
+        for component in names:
+            node = node[component]
+        node[name] = None
+        versions.append(tree)
+    return versions
+
+
+def with_items(tree, paths):
+    versions = [tree]
+    for path in paths:
+        tree = tree.with_item(path, None)
+        versions.append(tree)
+    return versions
+
+
+def main(dirs=2000, files_per_dir=20, versions=20):
+    tree = build(FSTree, dirs, files_per_dir, True)
+    paths = list(changes(dirs, versions))
+    _, tree_size = measure(lambda: build(FSTree, dirs, files_per_dir, True))
+
+    results = []
+    for label, derive in (
+        ('deep copies', deep_copies),
+        ('with_item()', with_items),
+    ):
+        start = time.perf_counter()
+        kept, size = measure(lambda: derive(tree, paths))
+        results.append((label, time.perf_counter() - start, size, kept))
+
+    assert results[0][3][-1] == results[1][3][-1], 'Versions differ!'
+    print('{} versions of a tree of {:.1f}MB'.format(
+        versions, tree_size / 2 ** 20))
+    for label, seconds, size, _ in results:
+        print('{:12} {:9.3f}s {:9.2f}MB'.format(
+            label, seconds, size / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
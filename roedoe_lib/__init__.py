@@ -1 +1,3 @@
-from .base import FSTree, get_path_resolver, ignore  # noqa
+from .base import FSTree, PathResolver, get_path_resolver, ignore  # noqa
+from .filters import CompiledFilter  # noqa
+from .columnar import ColumnarTree  # noqa
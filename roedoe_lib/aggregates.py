@@ -0,0 +1,120 @@
+"""
+Aggregate statistics of FSTrees' subtrees, worked out bottom-up and cached.
+
+Each directory's Aggregates (see FSTree.aggregates()) follow from those of
+its subdirectories, so they're worked out for a whole tree in one pass, from
+the bottom up, and kept on each node; asking again, of the top or of any
+directory in it, is then just a lookup.
+
+Every aggregate of a directory is at least that of any directory in it, so
+largest_dirs() finds the directories with the largest values by a best-first
+search, which only looks into directories whose values are among the largest
+found so far, rather than sorting every directory in the tree.
+"""
+
+import collections
+import heapq
+import os
+
+from .traversal import bottom_up, is_dir
+
+
+Aggregates = collections.namedtuple(
+    'Aggregates', ('files', 'dirs', 'size', 'newest_mtime_ns'))
+Aggregates.__doc__ = """
+Aggregate statistics of a directory and everything under it: the numbers of
+files and of directories under it, the total size of the files, and the
+newest mtime of the directory itself or anything under it.
+
+Sizes and mtimes come from stat fields recorded by walks (see FSTree.stats())
+or by FSTree.hash_files(); files without a recorded size count as 0, and
+newest_mtime_ns is None if there are no mtimes at all.
+"""
+
+
+def aggregate_tree(tree, is_current, store):
+
+    """
+    Work out the aggregates of a directory and everything in it, without
+    recursion (see traversal.bottom_up()).
+
+    :param tree: the FSTree.
+    :param is_current: function returning a node's Aggregates if it already
+    has up to date ones, or else None.
+    :param store: function to call with each node and its new Aggregates.
+
+    :return aggregates: the tree's Aggregates.
+    """
+
+    def combine(node):
+        metadata = node.metadata if isinstance(node.metadata, dict) else {}
+        file_stats = metadata.get('files', {})
+        files = dirs = size = 0
+        newest = metadata.get('mtime_ns')
+        for name, value in node.contents.items():
+            if is_dir(value):
+                below = is_current(value)
+                files += below.files
+                dirs += below.dirs + 1
+                size += below.size
+                newest = _newer(newest, below.newest_mtime_ns)
+            else:
+                files += 1
+                stats = file_stats.get(name)
+                if stats:
+                    size += stats.get('size', 0)
+                    newest = _newer(newest, stats.get('mtime_ns'))
+        return Aggregates(files, dirs, size, newest)
+
+    return bottom_up(tree, is_current, store, combine)
+
+
+def largest_dirs(tree, n, key):
+
+    """
+    Find the directories under a tree with the largest of some aggregate.
+
+    :param tree: the FSTree.
+    :param n: how many directories to find.
+    :param key: name of the field of Aggregates to compare.
+
+    :return largest: a list of up to n (path, Aggregates) pairs, largest
+    first (ties in path order), where path is relative to the top of tree.
+    """
+
+    if key not in Aggregates._fields:
+        raise ValueError('Unknown aggregate: {}'.format(key))
+    tree.aggregates()
+    field = Aggregates._fields.index(key)
+    # Candidates: (negated value, path, aggregates, node), so the largest
+    # value comes off the heap first.
+    heap = []
+
+    def push_contents(node, prefix):
+        for name, value in node.contents.items():
+            if is_dir(value):
+                aggregates = value.aggregates()
+                heapq.heappush(heap, (
+                    -_value(aggregates[field]), prefix + name, aggregates,
+                    value))
+
+    push_contents(tree, '')
+    largest = []
+    while heap and len(largest) < n:
+        _, path, aggregates, node = heapq.heappop(heap)
+        largest.append((path, aggregates))
+        push_contents(node, path + os.sep)
+    return largest
+
+
+def _newer(mtime_ns, other):
+    if other is None:
+        return mtime_ns
+    if mtime_ns is None or other > mtime_ns:
+        return other
+    return mtime_ns
+
+
+def _value(value):
+    """A value to compare, with None (no mtimes) below everything."""
+    return -1 if value is None else value
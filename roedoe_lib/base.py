@@ -1,9 +1,21 @@
 import functools
 import json
 import os
+import sys
+import threading
 
 from pathspec import PathSpec
 
+from . import walk
+from .aggregates import aggregate_tree, largest_dirs
+from .compact import CompactContents
+from .diff import dedup_tree, diff_trees, digest_tree
+from .filters import CompiledFilter
+from .hashing import hash_tree
+from .ignores import IgnoreScopes
+from .jsonstream import dump_tree, load_tree
+from .snapshot import SnapshotContents, read_snapshot, write_snapshot
+
 
 class FSTree:
 
@@ -14,11 +26,37 @@ class FSTree:
     filenames, and keys which map to FSTree objects are directory names.  At
     each level there can be a piece of metadata also.
 
+    The contents can be any mapping: usually a dict, but see compact().
+
     """
 
+    __slots__ = ('contents', '_metadata', '_index', '_digest', '_aggregates')
+
     def __init__(self, contents, metadata=None):
         self.contents = contents
-        self.metadata = metadata
+        self._metadata = metadata
+        self._index = None
+        self._digest = None
+        self._aggregates = None
+
+    def __getstate__(self):
+        return self.contents, self._metadata, self._index, self._digest
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # Pickled before FSTree had slots: its instance dictionary.
+            state = state['contents'], state['metadata'], None, None
+        self.contents, self._metadata, self._index, self._digest = state
+        self._aggregates = None
+
+    @property
+    def metadata(self):
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, metadata):
+        self._metadata = metadata
+        self._changed()
 
     def __bool__(self):
         return bool(self.contents)
@@ -27,16 +65,296 @@ class FSTree:
         return repr(self.contents)
 
     def __eq__(self, other):
-        return all((
-            self.contents == other.contents,
-            self.metadata == other.metadata,
-        ))
+        if other is self:
+            return True
+        if not isinstance(other, FSTree):
+            return NotImplemented
+        return _equal(self, other)
+
+    def __hash__(self):
+        # As with any mutable object, a tree mustn't be changed while it's
+        # in a set or is a dictionary's key.
+        return int.from_bytes(self.digest()[:8], 'little')
 
     def __getitem__(self, key):
         return self.contents[key]
 
     def __setitem__(self, key, value):
         self.contents[key] = value
+        self._changed()
+
+    def __contains__(self, path):
+        try:
+            self.lookup(path)
+        except KeyError:
+            return False
+        return True
+
+    def lookup(self, path):
+        """
+        Look up a file or directory by its path within this tree.
+
+        Each component of the path is looked up in turn, so this takes time
+        in proportion to the path's depth, and in a tree read from a
+        snapshot, reads only the directories along it.  To check many paths
+        at once, see contains_many().
+
+        :param path: path relative to the top of the tree, with components
+        separated by os.sep, e.g. as yielded by iter_path().
+
+        :return value: None for a file, or an FSTree for a directory.
+
+        :raises KeyError: if there's nothing at path.
+        """
+        if not path or not isinstance(path, str):
+            raise KeyError(path)
+        value = self
+        for name in path.split(os.sep):
+            if not isinstance(value, FSTree) or name not in value.contents:
+                raise KeyError(path)
+            value = value.contents[name]
+        return value
+
+    def contains_many(self, paths):
+        """
+        Check whether each of some paths is in this tree.
+
+        The first call builds an index of every path in the tree, so that
+        each check takes constant time, however deep the path.  It's kept
+        until the tree is next changed (see digest()), and when it's
+        pickled.  Trees read from snapshots
+        aren't indexed, as that would read the whole file; each path is
+        looked up as by lookup() instead.
+
+        :param paths: an iterable of paths, as for lookup().
+
+        :return found: a list of bools, one per path.
+        """
+        if isinstance(self.contents, SnapshotContents):
+            return [path in self for path in paths]
+        index = self._path_index()
+        return [path in index for path in paths]
+
+    def stats(self, path=''):
+        """
+        Get the stat fields recorded for a file or directory within this
+        tree, by a walk given stat_fields (see at_path()).
+
+        :param path: path relative to the top of the tree, as for lookup();
+        '' for the top itself.
+
+        :return stats: a dictionary of stat fields by name, or None if none
+        were recorded.
+
+        :raises KeyError: if there's nothing at path.
+        """
+        metadata = self._item_metadata(path)
+        if metadata is None:
+            return None
+        return {
+            key: item for key, item in metadata.items()
+            if key in walk.STAT_FIELDS
+        } or None
+
+    def truncated_paths(self):
+        """
+        Find the directories in this tree which a limited walk didn't finish
+        (see at_path()), and which expand() could walk again.
+
+        :return paths: a list of their paths relative to the top of the tree
+        ('' for the top itself), in pre-order.
+        """
+        paths = []
+        stack = [('', self)]
+        while stack:
+            path, tree = stack.pop()
+            if walk.is_truncated(tree):
+                paths.append(path)
+            prefix = path + os.sep if path else ''
+            stack.extend(
+                (prefix + name, value)
+                for name, value in reversed(list(tree.contents.items()))
+                if isinstance(value, FSTree)
+            )
+        return paths
+
+    def file_hash(self, path, algorithm='sha256'):
+        """
+        Get the digest recorded for a file within this tree by hash_files().
+
+        :param path: path relative to the top of the tree, as for lookup().
+        :param algorithm: name of the algorithm it was hashed with.
+
+        :return digest: the hex digest, or None if none was recorded.
+
+        :raises KeyError: if there's nothing at path.
+        """
+        metadata = self._item_metadata(path)
+        if metadata is None:
+            return None
+        return metadata.get(algorithm)
+
+    def hash_files(self, top, algorithm='sha256', workers=None,
+                   previous=None):
+        """
+        Hash the contents of every file in this tree; see the hashing
+        module.
+
+        Each file's hex digest is recorded in its metadata (under 'files' in
+        its directory's metadata, as for stat fields), under the name of the
+        algorithm, with the 'size' and 'mtime_ns' it had when it was read;
+        see file_hash().  Files which can't be read get no digest.
+
+        :param top: Path this tree was walked from (see at_path()).
+
+        :param algorithm: Name of a hashlib algorithm with fixed length
+        digests.
+
+        :param workers: An optional number of threads with which to hash
+        files concurrently.
+
+        :param previous: An optional tree returned by an earlier call of this
+        method with the same top and algorithm; files whose size and mtime
+        are the same as then aren't read again, but keep their digests.
+
+        :return hashed: a copy of this tree, with digests recorded.  Its
+        directories' metadata must be dictionaries or None.
+        """
+        return hash_tree(
+            self, top, algorithm, workers=workers, previous=previous)
+
+    def digest(self):
+        """
+        A digest of this tree: the names of everything in it, whether each
+        is a file or a directory, and every directory's metadata.  Equal
+        trees have the same digest, and trees with the same digest are equal
+        (metadata of types other than those JSON has, numbers, bytes, sets
+        and tuples is compared by type and repr()), so it's what hashing
+        uses, and what diff() and dedup() compare directories by.
+
+        Each directory's digest is worked out from its subdirectories', and
+        is kept until that directory is next changed with __setitem__ or by
+        setting its metadata, so working out digests again is quick.
+        Directories don't know what they're in, so changes to a directory
+        aren't noticed by those above it, nor are changes made to contents
+        or metadata directly: once digests are worked out, derive changed
+        trees with with_item() and so on, which copy the directories above
+        whatever changes, rather than changing them in place.  Equality
+        doesn't rely on digests, so is always up to date.
+
+        :return digest: a bytes object.
+        """
+        def store(node, digest):
+            node._digest = digest
+
+        return digest_tree(self, _current_digest, store)
+
+    def aggregates(self):
+        """
+        Aggregate statistics of this tree: how many files and directories
+        are in it, their total size and the newest mtime; see
+        aggregates.Aggregates.  Sizes and mtimes are those recorded by
+        at_path() given stat_fields, or by hash_files().
+
+        As with digest(), every directory's aggregates are worked out in one
+        pass, from the bottom up, and kept until the directory is next
+        changed, so asking again (of this tree or any directory in it) is
+        quick.
+
+        :return aggregates: an aggregates.Aggregates.
+        """
+        def store(node, aggregates):
+            node._aggregates = aggregates
+
+        return aggregate_tree(self, _current_aggregates, store)
+
+    def largest(self, n=10, key='size'):
+        """
+        Find the directories in this tree with the largest of some aggregate
+        (see aggregates()), e.g. the biggest or those with the most files.
+
+        Any directory's aggregates are at least those of the directories in
+        it, so only directories which might be among the largest are looked
+        at, rather than every directory in the tree.
+
+        :param n: How many directories to find.
+
+        :param key: Name of the aggregate to compare: 'files', 'dirs',
+        'size' or 'newest_mtime_ns'.
+
+        :return largest: a list of up to n (path, aggregates) pairs, largest
+        first, where path is relative to the top of this tree.
+        """
+        return largest_dirs(self, n, key)
+
+    def dedup(self):
+        """
+        Return a copy of this tree in which identical directories (those
+        with the same digest, see digest()) are the same object, so that
+        they're stored once, in memory or when pickled.
+
+        Parts of the tree which are already so are shared with it rather
+        than copied.  As they're shared, changing one of the copies'
+        directories changes all of them.
+
+        :return deduped: an FSTree.
+        """
+        return dedup_tree(self)
+
+    def diff(self, other):
+        """
+        Find the structural differences between this tree and another.
+
+        The trees are walked together in name order, skipping any pair of
+        directories with the same digest (see digest()), so given digests
+        already worked out, the time taken depends on how much has changed.
+
+        :param other: the FSTree to compare this one with.
+
+        :return diff: a diff.TreeDiff of lists of paths (relative to the top)
+        added, removed and changed, going from this tree to other.  Changed
+        paths are those which changed between file and directory, and files
+        whose size, mtime, content digests or other metadata (see stats()
+        and hash_files()) differ in a field recorded in both trees.
+        """
+        return diff_trees(self, other)
+
+    def _item_metadata(self, path):
+        """
+        Metadata of a directory within this tree, or a file's entry in its
+        directory's, if it's a dictionary; otherwise None.
+        """
+        value = self.lookup(path) if path else self
+        if isinstance(value, FSTree):
+            metadata = value.metadata
+        else:
+            parent, name = os.path.split(path)
+            metadata = (self.lookup(parent) if parent else self).metadata
+            if isinstance(metadata, dict):
+                metadata = metadata.get('files', {}).get(name)
+        return metadata if isinstance(metadata, dict) else None
+
+    def _path_index(self):
+        """This tree's index of paths, building it if need be."""
+        if self._index is not None:
+            return self._index
+        index = {}
+        stack = [('', self)]
+        while stack:
+            prefix, tree = stack.pop()
+            for name, value in tree.contents.items():
+                path = prefix + name
+                index[path] = value
+                if isinstance(value, FSTree):
+                    stack.append((path + os.sep, value))
+        self._index = index
+        return index
+
+    def _changed(self):
+        """Forget what's been worked out about this tree."""
+        self._index = None
+        self._digest = None
+        self._aggregates = None
 
     @property
     def dict(self):
@@ -56,12 +374,31 @@ class FSTree:
         """Dual of FSTree.dict()"""
         return FSTree(
             contents={
-                k: cls.undict(v) if isinstance(v, dict) else v
+                sys.intern(k): cls.undict(v) if isinstance(v, dict) else v
                 for k, v in fstree_dict['contents'].items()
             },
             metadata=fstree_dict.get('metadata'),
         )
 
+    def compact(self):
+        """
+        Return a copy of this tree taking less memory, for big trees.
+
+        Each directory's contents become a CompactContents, which keeps names
+        and values in sorted parallel tuples rather than a dict, and names are
+        interned, so repeated names (__init__.py, README.md, ...) are stored
+        once.  The copy works the same as the original, but changing it is
+        slower.
+        """
+        return type(self)(
+            CompactContents(
+                (sys.intern(name),
+                 value.compact() if isinstance(value, FSTree) else value)
+                for name, value in self.contents.items()
+            ),
+            self.metadata,
+        )
+
     def to_json(self, *args, **kwargs):
         structure = {
             'type': 'FSTree',
@@ -77,61 +414,400 @@ class FSTree:
             raise ValueError(structure)
         return cls.undict(structure['fstree'])
 
+    def dump_json(self, fp):
+        """
+        Write this tree's JSON, as from to_json(), to a text file, node by
+        node, rather than building it all in memory first.
+
+        :param fp: file object to write to.
+        """
+        dump_tree(self, fp)
+
+    @classmethod
+    def load_json(cls, fp):
+        """
+        Read a tree's JSON, as from to_json(), from a file, node by node,
+        rather than parsing it all in memory first.
+
+        :param fp: text or binary file object to read from.
+
+        :return tree: an FSTree.
+        """
+        return load_tree(fp, cls)
+
+    def to_snapshot(self, path):
+        """
+        Write this tree to a snapshot file; see the snapshot module.
+
+        :param path: path of the file to write.
+        """
+        write_snapshot(self, path)
+
     @classmethod
-    def at_path(cls, top, valid_roots, ignores=None):
+    def from_snapshot(cls, path):
+        """
+        Open a snapshot file written by to_snapshot().
+
+        The file is mmapped, and nodes are made from it as they're needed, so
+        this is quick however big the tree is, and looking up a path reads
+        only the directories along it.  The tree's contents are read-only.
+
+        :param path: path of the file.
+
+        :return tree: an FSTree.
+        """
+        return read_snapshot(path, cls)
+
+    @classmethod
+    def at_path(cls, top, valid_roots, ignores=None, workers=None,
+                processes=None, ignore_files=None, stat_fields=None,
+                max_depth=None, max_entries=None, deadline=None):
         """Turn a directory tree on fisk into an FSTree object.
 
         :param top: Path to top of direcotry tree to walk.
 
         :param valid_roots: a set of paths; only links whose real paths are
         under the real paths of these roots will be kept in the returned
-        dictionary.
+        dictionary.  Can also be a PathResolver, e.g. to share one between
+        walks.
 
         :param ignores: An optional pathspec.PathSpec specifying paths to ignore.
 
+        :param workers: An optional number of threads with which to list
+        directories concurrently, which helps when the walk is bound by I/O
+        latency (e.g. on network filesystems).  The result is the same as
+        without.
+
+        :param processes: An optional number of processes across which to
+        shard the walk, each taking some of the directories directly under
+        top.  For very large trees; again, the result is the same as without.
+        If workers is also given, each process uses that many threads.
+
+        :param ignore_files: Optional names of ignore files (e.g.
+        ('.gitignore',)) to read from each directory walked, and honour as
+        git does: their patterns apply relative to their own directory, and
+        take precedence over those from further up and over ignores.  With
+        these, patterns matching a directory ignore the directory itself.
+
+        :param stat_fields: Optional names of stat fields to record during
+        the walk, from 'size', 'mtime_ns', 'mode', 'inode' and 'dev'
+        (following symlinks).  Each directory's metadata is then a
+        dictionary of its own fields, along with those of the files in it,
+        by name, under 'files'; see stats().  They come from the same
+        listing as everything else, so cost at most a stat call per entry.
+
+        :param max_depth: An optional limit on the depth of directories to
+        list: 1 lists just top, 2 the directories in it too, and so on.
+
+        :param max_entries: An optional limit on the number of files and
+        directories to take into the tree.
+
+        :param deadline: An optional time (a time.monotonic() value) by
+        which to stop walking.
+
+        If any of these limits is reached, the walk stops, and returns what
+        it has so far.  Directories it didn't finish (including any left
+        unlisted because of max_depth) are kept, even if nothing in them was
+        found, with their metadata (a dictionary) marking them 'truncated';
+        see truncated_paths() and expand().  Limits can't be used along with
+        processes.
+
         :rvalue tree: An FSTree object.
         """
 
+        stat_fields = walk.check_stat_fields(stat_fields)
+        limits = _limits(max_depth, max_entries, deadline)
+        if processes and limits is not None:
+            raise ValueError(
+                'Walks sharded across processes can\'t be limited')
         get_real_path = get_path_resolver(valid_roots)
 
-        def ignored(path):
-            """Test if some path is to be ignored."""
-            if not ignores:
-                return False
-            # Note special case logic here for checking vs top level of tree.
-            rel_path = os.path.relpath(path, top) if path != top else top
-            return ignores.match_file(rel_path)
-
-        def recursive_wibwab(path):
-            tree = cls({})
-            full_path = os.path.join(top, path)
-            contents = os.listdir(full_path)
-            for item in sorted(contents):
-                item_path = os.path.join(full_path, item)
-                if ignored(item_path):
-                    continue
-                real_path = get_real_path(item_path)
-                if not real_path:
-                    # Disallowed destination; skip it
-                    continue
-                if real_path in seen:
-                    continue
-                seen.add(real_path)
-                if os.path.isdir(item_path):
-                    dir_tree = recursive_wibwab(item_path)
-                    if dir_tree:
-                        tree[item] = dir_tree
-                elif os.path.isfile(item_path):
-                    tree[item] = None
-            return tree
-
         # First check that this whole directory is not supposed to be ignored
-        # and that it's under one of the valid roots.
-        if ignored(top) or not get_real_path(top):
+        # and that it's under one of the valid roots.  Note special case logic
+        # here for checking vs top level of tree.
+        if ignores and ignores.match_file(top):
+            return cls({})
+        real_top = get_real_path(top)
+        if not real_top:
             return cls({})
+        if ignore_files:
+            ignores = IgnoreScopes(ignores, ignore_files)
+
+        if processes:
+            return walk.sharded_walk(
+                cls, top, real_top, ignores, get_real_path, processes,
+                workers=workers, stat_fields=stat_fields)
+        return walk.walk(
+            cls, top, real_top, ignores, get_real_path, workers=workers,
+            stat_fields=stat_fields, limits=limits)
+
+    def expand(self, top, valid_roots, path='', ignores=None, workers=None,
+               ignore_files=None, stat_fields=None, max_depth=None,
+               max_entries=None, deadline=None):
+        """Walk a directory in this tree again, e.g. one a limited walk
+        truncated (see at_path() and truncated_paths()).
+
+        :param top: Path to the top of the directory tree this tree is of.
+
+        :param path: Path of the directory within this tree, as for lookup();
+        '' for the top itself.
 
+        :param valid_roots, ignores, workers, ignore_files, stat_fields: As
+        for at_path(); they should be the same as for the walk which made
+        this tree.
+
+        :param max_depth, max_entries, deadline: Limits on this walk, as for
+        at_path(), depths being counted from the directory.
+
+        :rvalue tree: a copy of this tree with the directory walked afresh
+        (dropped if it turns out empty), sharing everything else with this
+        tree; see with_item().  Links within the directory to the
+        directories above it aren't followed, but links to elsewhere in the
+        tree may be, so the same real path may then turn up twice.
+
+        :raises KeyError: if there's no directory at path.
+        """
+
+        node = self.lookup(path) if path else self
+        if not isinstance(node, FSTree):
+            raise KeyError(path)
+        stat_fields = walk.check_stat_fields(stat_fields)
+        limits = _limits(max_depth, max_entries, deadline)
+        get_real_path = get_path_resolver(valid_roots)
+        dir_path = os.path.join(top, path) if path else top
+        real_path = get_real_path(dir_path)
+        if not real_path:
+            return self._without_dir(path) if path else type(self)({})
+        if ignore_files:
+            ignores = IgnoreScopes(ignores, ignore_files)
+
+        # Real paths of the directory and those above it, as they'd already
+        # have been seen by a walk from the top.
         seen = set()
-        return recursive_wibwab('')
+        if path:
+            parts = path.split(os.sep)
+            for index in range(1, len(parts) + 1):
+                seen.add(get_real_path(os.path.join(top, *parts[:index])))
+        expanded = walk.walk(
+            type(self), dir_path, real_path, ignores, get_real_path,
+            workers=workers, stat_fields=stat_fields, limits=limits,
+            rel_path=path, seen=seen)
+        if not path:
+            return expanded
+        if not expanded and not walk.is_truncated(expanded):
+            return self._without_dir(path)
+        return self.with_item(path, expanded)
+
+    def _without_dir(self, path):
+        """
+        A copy of this tree without some directory, or the directories above
+        it which that would leave empty (short of the top), as a walk would
+        have dropped them; truncated directories are kept, empty or not.
+        """
+        parent, _ = _split_path(path)
+        while parent:
+            node = self.lookup(parent)
+            if len(node.contents) > 1 or walk.is_truncated(node):
+                break
+            path = parent
+            parent, _ = _split_path(path)
+        return self.without_item(path)
+
+    @classmethod
+    def iter_path(cls, top, valid_roots, ignores=None, workers=None,
+                  ignore_files=None):
+        """Walk a directory tree like FSTree.at_path(), yielding what's found.
+
+        The paths yielded are exactly those of the tree FSTree.at_path()
+        would return (directories which turn out empty are never yielded),
+        in the same order, but as they're found, without building the tree.
+        Stopping early (e.g. closing the generator) stops the walk.
+
+        :param top, valid_roots, ignores, workers, ignore_files: As for
+        FSTree.at_path().
+
+        :return paths: a generator of (rel_path, is_dir) pairs, where
+        rel_path is relative to top.
+        """
+
+        get_real_path = get_path_resolver(valid_roots)
+
+        if ignores and ignores.match_file(top):
+            return
+        real_top = get_real_path(top)
+        if not real_top:
+            return
+        if ignore_files:
+            ignores = IgnoreScopes(ignores, ignore_files)
+
+        yield from walk.iter_walk(
+            top, real_top, ignores, get_real_path, workers=workers)
+
+    @classmethod
+    async def at_path_async(cls, top, valid_roots, ignores=None,
+                            concurrency=8, executor=None, progress=None,
+                            ignore_files=None, stat_fields=None):
+        """Coroutine version of FSTree.at_path().
+
+        Directories are listed on an executor, so the event loop stays free
+        while the walk goes on; the result is the same as FSTree.at_path().
+
+        :param top, valid_roots, ignores, ignore_files, stat_fields: As for
+        FSTree.at_path().
+
+        :param concurrency: Maximum number of directories to list at once.
+
+        :param executor: An optional concurrent.futures.Executor on which to
+        list directories, e.g. to share one between many walks; by default,
+        each walk makes its own thread pool.
+
+        :param progress: An optional function to call after each directory
+        is listed, with the number of directories listed and files found so
+        far.
+
+        :rvalue tree: An FSTree object.
+        """
+
+        stat_fields = walk.check_stat_fields(stat_fields)
+        get_real_path = get_path_resolver(valid_roots)
+
+        if ignores and ignores.match_file(top):
+            return cls({})
+        if ignore_files:
+            ignores = IgnoreScopes(ignores, ignore_files)
+
+        return await walk.async_walk(
+            cls, top, ignores, get_real_path, concurrency,
+            executor=executor, progress=progress, stat_fields=stat_fields)
+
+    @classmethod
+    def rescan(cls, previous, top, valid_roots, ignores=None):
+        """Bring an FSTree from an earlier walk of a directory tree up to date.
+
+        Like FSTree.at_path(), but recording each directory's mtime and inode
+        in its metadata (a dictionary), so that next time only directories
+        which have changed need listing again.  Unchanged parts of previous
+        are reused, down to returning previous itself if nothing's changed.
+
+        Links which were dropped from previous (broken, or pointing outside
+        the valid roots) are only looked at again if their directory changes.
+
+        :param previous: An FSTree returned by an earlier call of this method
+        with the same top, valid_roots and ignores, or None to start afresh.
+
+        :param top, valid_roots, ignores: As for FSTree.at_path().
+
+        :rvalue tree: An FSTree object.
+        """
+
+        get_real_path = get_path_resolver(valid_roots)
+
+        if ignores and ignores.match_file(top):
+            return cls({})
+        real_top = get_real_path(top)
+        if not real_top:
+            return cls({})
+
+        return walk.rescan(
+            cls, top, real_top, ignores, get_real_path, previous)
+
+    def with_item(self, path, value):
+        """
+        Return a copy of this tree with a file or directory added at some
+        path, or replacing what's there.
+
+        Like the other with... methods, this leaves this tree as it is, and
+        copies only the directories along the path; everything else is
+        shared between the two, as is metadata, unless it changes.  So many
+        versions of a tree, each derived from the last, take memory in
+        proportion to their differences rather than their sizes, and cached
+        path indexes, digests and aggregates of what's shared stay valid.
+        Trees shared like this mustn't then be changed in place (with
+        __setitem__, or by setting metadata).
+
+        :param path: path relative to the top of the tree, as for lookup();
+        the directory it's in must be there already.
+        :param value: None for a file, or an FSTree for a directory.
+
+        :return tree: the new tree.  What the directory's metadata recorded
+        for a file at path (see stats()) is dropped, as it may no longer
+        apply.
+
+        :raises KeyError: if the directory path is in isn't in the tree.
+        """
+        parent, name = _split_path(path)
+
+        def add(node):
+            contents = dict(node.contents.items())
+            contents[name] = value
+            return node._copy(
+                contents, _without_file_metadata(node.metadata, {name}))
+
+        return self._rebuilt(parent, add)
+
+    def without_item(self, path):
+        """
+        Return a copy of this tree without the file or directory at some
+        path, sharing everything else; see with_item().
+
+        :param path: path relative to the top of the tree, as for lookup().
+
+        :return tree: the new tree.
+
+        :raises KeyError: if there's nothing at path.
+        """
+        parent, name = _split_path(path)
+
+        def remove(node):
+            contents = dict(node.contents.items())
+            del contents[name]
+            return node._copy(
+                contents, _without_file_metadata(node.metadata, {name}))
+
+        return self._rebuilt(parent, remove)
+
+    def with_metadata(self, metadata, path=''):
+        """
+        Return a copy of this tree with different metadata for some
+        directory in it, sharing everything else; see with_item().
+
+        :param metadata: the new metadata.
+        :param path: path of the directory relative to the top of the tree,
+        as for lookup(); '' for the top itself.
+
+        :return tree: the new tree.
+
+        :raises KeyError: if there's no directory at path.
+        """
+        return self._rebuilt(
+            path,
+            lambda node: node._copy(dict(node.contents.items()), metadata))
+
+    def _rebuilt(self, path, rebuild):
+        """
+        Copy this tree with the directory at some path replaced by
+        rebuild(directory), copying just the directories above it.
+        """
+        names = path.split(os.sep) if path else []
+        nodes = [self]
+        for name in names:
+            node = nodes[-1].contents[name]
+            if not isinstance(node, FSTree):
+                raise KeyError(path)
+            nodes.append(node)
+        new = rebuild(nodes.pop())
+        for name in reversed(names):
+            node = nodes.pop()
+            contents = dict(node.contents.items())
+            contents[name] = new
+            new = node._copy(contents, node.metadata)
+        return new
+
+    def _copy(self, contents, metadata):
+        """A node like this one, with other contents (a dict) and metadata."""
+        if isinstance(self.contents, CompactContents):
+            contents = CompactContents(contents)
+        return type(self)(contents, metadata)
 
     def filter(self, filters):
         """
@@ -140,49 +816,122 @@ class FSTree:
         :param tree: an FSTree returned by FSTree.at_path()
 
         :param filters: a list of compiled regex objects, the filters to be
-        applied.
+        applied, or a CompiledFilter made from such a list (which saves
+        compiling it again when filtering several trees the same way).
 
         :return filtered: a copy of tree without: 1) files whose paths within
         the tree (relative to its root - these are not absolute/real paths)
         don't match any of the given filters, and 2) directories which are
-        then empty.
+        then empty.  Directories which lose nothing aren't copied, but shared
+        with tree.
 
         """
 
         if not filters:
             return self
+        if not isinstance(filters, CompiledFilter):
+            filters = CompiledFilter(filters)
 
-        tree = self.dict
-
-        def getitem_in_contents(container, key):
-            return container['contents'][key]
-
-        def recursive_filter_wibwab(path):
-            if path:
-                parts = path.split('/') if path else []
-                subtree = functools.reduce(getitem_in_contents, parts, tree)
-            else:
-                subtree = tree
+        def recursive_filter_wibwab(tree, prefix):
             filtered = {}
-            contents = subtree['contents']
-            metadata = subtree.get('metadata')
-            for item, value in contents.items():
-                item_path = os.path.join(path, item)
+            unchanged = True
+            dropped = set()
+            for item, value in tree.contents.items():
+                item_path = prefix + item
                 if value is None:
-                    if any((filter_.match(item_path) for filter_ in filters)):
+                    if filters.match(item_path):
                         filtered[item] = value
-                elif isinstance(value, dict):
-                    item_dict = recursive_filter_wibwab(item_path)
-                    if item_dict['contents']:
-                        filtered[item] = item_dict
-            result = {
-                'contents': filtered,
-            }
-            if metadata:
-                result['metadata'] = metadata
-            return result
+                        continue
+                    dropped.add(item)
+                elif isinstance(value, FSTree):
+                    subtree = recursive_filter_wibwab(
+                        value, item_path + os.sep)
+                    if subtree:
+                        filtered[item] = subtree
+                        unchanged = unchanged and subtree is value
+                        continue
+                unchanged = False
+            metadata = tree.metadata
+            if unchanged and (metadata or metadata is None):
+                # Nothing filtered out, so share this part of the tree.
+                return tree
+            return FSTree(
+                filtered, _without_file_metadata(metadata, dropped) or None)
+
+        return recursive_filter_wibwab(self, '')
+
+
+def _limits(max_depth, max_entries, deadline):
+    """Limits on a walk, or None if there are none."""
+    if max_depth is None and max_entries is None and deadline is None:
+        return None
+    return walk.Limits(max_depth, max_entries, deadline)
+
+
+def _split_path(path):
+    """Split a path within a tree into its directory's path and its name."""
+    if not path:
+        raise KeyError(path)
+    parent, name = os.path.split(path)
+    if not name:
+        raise KeyError(path)
+    return parent, name
+
+
+def _without_file_metadata(metadata, names):
+    """
+    A directory's metadata without what it records for some files (see
+    FSTree.stats()), copied only if it records anything for them.
+    """
+    if not isinstance(metadata, dict):
+        return metadata
+    files = metadata.get('files')
+    if not files or not any(name in files for name in names):
+        return metadata
+    metadata = dict(metadata)
+    files = {
+        name: value for name, value in files.items() if name not in names}
+    if files:
+        metadata['files'] = files
+    else:
+        del metadata['files']
+    return metadata
+
+
+def _current_digest(tree):
+    return tree._digest
+
 
-        return FSTree.undict(recursive_filter_wibwab(''))
+def _current_aggregates(tree):
+    return tree._aggregates
+
+
+def _equal(tree, other):
+    """
+    Compare two trees' structure and metadata, without recursion, skipping
+    directories they share.
+    """
+    stack = [(tree, other)]
+    while stack:
+        tree, other = stack.pop()
+        if tree is other:
+            continue
+        if (
+            len(tree.contents) != len(other.contents) or
+            tree.metadata != other.metadata
+        ):
+            return False
+        for name, value in tree.contents.items():
+            if name not in other.contents:
+                return False
+            other_value = other.contents[name]
+            if isinstance(value, FSTree):
+                if not isinstance(other_value, FSTree):
+                    return False
+                stack.append((value, other_value))
+            elif value != other_value:
+                return False
+    return True
 
 
 def get_path_resolver(roots):
@@ -190,20 +939,188 @@ def get_path_resolver(roots):
     """
     Given some roots, return a function to compute the real path of some path,
     following links; if real path is not inside one of the roots, return None.
+
+    The function is a PathResolver; if roots is already one, it's returned as
+    it is.
     """
 
-    real_roots = [os.path.realpath(root) for root in roots]
+    if isinstance(roots, PathResolver):
+        return roots
+    return PathResolver(roots)
+
+
+class PathResolver:
 
-    def get_real_path(path):
+    """
+    Computes real paths of paths, following links, if they're inside one of
+    some roots.
+
+    The real paths of the roots are kept in a trie keyed on path components,
+    so checking a path costs time proportional to its depth, however many
+    roots there are; and a path is only inside a root if the root's real path
+    is a whole number of components of its real path (so /data/foo contains
+    /data/foo/bar, but not /data/foobar).
+
+    PathResolver objects can be shared between walks (pass one as
+    valid_roots to FSTree.at_path() etc.), and pickled.
+    """
+
+    def __init__(self, roots):
+        """
+        :param roots: paths under whose real paths real paths are allowed.
+        """
+        self.roots = list(roots)
+        self._trie = {}
+        for root in self.roots:
+            node = self._trie
+            for part in _path_parts(os.path.realpath(root)):
+                if ROOT_MARKER in node:
+                    # Already inside another root.
+                    break
+                node = node.setdefault(part, {})
+            else:
+                # Anything under it is covered by this root now.
+                node.clear()
+                node[ROOT_MARKER] = True
+
+    def __repr__(self):
+        return 'PathResolver({!r})'.format(self.roots)
+
+    def __call__(self, path):
         """
         Compute real path of some path, following links; if real path is not
-        inside one of real_roots, return None.
+        inside one of the roots, return None.
+        """
+        real_path = os.path.realpath(path)
+        if self.contains(real_path):
+            return real_path
+
+    def child(self, real_dir_path, name):
         """
-        _real_path = os.path.realpath(path)
-        if any((_real_path.startswith(root) for root in real_roots)):
-            return _real_path
+        Compute real path of something in a directory, given the directory's
+        real path; if it's not inside one of the roots, return None.
+        """
+        real_path = os.path.realpath(os.path.join(real_dir_path, name))
+        if self.contains(real_path):
+            return real_path
+
+    def caching(self, cache_size=None):
+        """
+        Return a CachingPathResolver with the same roots, for use during one
+        walk.
+
+        :param cache_size: as for CachingPathResolver.
+        """
+        return CachingPathResolver(self, cache_size)
+
+    def contains(self, real_path):
+        """Is some real path inside one of the roots?"""
+        node = self._trie
+        for part in _path_parts(real_path):
+            if ROOT_MARKER in node:
+                return True
+            node = node.get(part)
+            if node is None:
+                return False
+        return ROOT_MARKER in node
+
+
+class CachingPathResolver(PathResolver):
+
+    """
+    A PathResolver which remembers what it finds out about symlinks.
+
+    os.path.realpath() looks at every component of the path it's given, and
+    at every component of any symlink's target, every time.  Given the real
+    path of a directory, though, the real path of something in it is just
+    the directory's real path plus its name, unless it's a symlink; so
+    child() only reads the link (if it is one), and resolves the target one
+    component at a time, from the link's directory.  Each component's real
+    path, given its parent's, is cached (least recently used first out), so
+    link chains and links through other links are only followed once.
+
+    As the filesystem might change, one of these should only be used for one
+    walk; see PathResolver.caching().  Resolving a symlink loop falls back on
+    os.path.realpath(), so the results are the same as a PathResolver's.
+    """
+
+    def __init__(self, resolver, cache_size=None):
+        """
+        :param resolver: the PathResolver whose roots to use.
+        :param cache_size: number of real paths to remember; by default,
+        LINK_CACHE_SIZE.
+        """
+        self.roots = resolver.roots
+        self._trie = resolver._trie
+        self._resolving = threading.local()
+        self._resolve = functools.lru_cache(cache_size or LINK_CACHE_SIZE)(
+            self._resolve_uncached)
+
+    def __reduce__(self):
+        # Only the roots travel; the cache starts afresh.
+        return PathResolver, (self.roots,)
+
+    def child(self, real_dir_path, name):
+        try:
+            real_path = self._resolve(real_dir_path, name)
+        except SymlinkLoop:
+            real_path = os.path.realpath(os.path.join(real_dir_path, name))
+        if self.contains(real_path):
+            return real_path
+
+    def _resolve_uncached(self, real_dir_path, name):
+        """Real path of something in a directory with a known real path."""
+        path = os.path.join(real_dir_path, name)
+        try:
+            target = os.readlink(path)
+        except OSError:
+            # Not a link (or not there at all, which realpath() allows).
+            return path
+        resolving = getattr(self._resolving, 'paths', None)
+        if resolving is None:
+            resolving = self._resolving.paths = set()
+        if path in resolving:
+            raise SymlinkLoop(path)
+        resolving.add(path)
+        try:
+            if os.path.isabs(target):
+                drive, target = os.path.splitdrive(target)
+                real_path = drive + os.sep
+            else:
+                real_path = real_dir_path
+            for part in target.split(os.sep):
+                if not part or part == os.curdir:
+                    continue
+                if part == os.pardir:
+                    real_path = os.path.dirname(real_path)
+                else:
+                    real_path = self._resolve(real_path, part)
+            return real_path
+        finally:
+            resolving.discard(path)
+
+
+class SymlinkLoop(Exception):
+    """Raised by CachingPathResolver on finding a symlink loop."""
+
+
+# Default number of real paths for CachingPathResolver to remember.
+LINK_CACHE_SIZE = 65536
+
+# Key marking a node in PathResolver's trie as a root; never a path component.
+ROOT_MARKER = None
+
 
-    return get_real_path
+def _path_parts(real_path):
+    """Components of a real path, starting with its drive and/or root."""
+    drive, rest = os.path.splitdrive(real_path)
+    # Real paths are absolute, so this starts with '' (for the root), and
+    # has no empty parts except at the end, for the root itself.
+    parts = rest.split(os.sep)
+    if not parts[-1]:
+        parts.pop()
+    parts[0] = drive
+    return parts
 
 
 def ignore(*args):
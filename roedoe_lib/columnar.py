@@ -0,0 +1,318 @@
+"""
+A flat, columnar representation of an FSTree, for analytics.
+
+ColumnarTree holds a tree as a handful of arrays with one element per node,
+with the nodes in pre-order (each directory followed by everything in it,
+in name order), node 0 being the top of the tree:
+
+* parents: index of each node's directory (-1 for the top);
+* ends: index just past the last node in each node's subtree, so that the
+  subtree of node i is the slice [i, ends[i]);
+* kinds: KIND_FILE or KIND_DIR, one byte per node;
+* names: every node's name (encoded as by os.fsencode()) followed by a NUL
+  byte, end to end in one buffer, with offsets giving where each starts (and
+  a final one for the end of the buffer);
+* columns: optional integer columns, e.g. stat fields, by name, with MISSING
+  where a node has no value; files' values come from their directory's
+  metadata, under 'files', as walks record them.
+
+There are no per-node Python objects, so operations over the whole tree
+(counting, matching names by suffix, extracting subtrees) are loops in C over
+arrays and buffers rather than recursion over FSTree objects.  Conversion to
+and from FSTree keeps directories' metadata, which is held (sparsely) by node
+index alongside the arrays.
+"""
+
+import bisect
+import os
+import sys
+from array import array
+
+from .base import FSTree
+
+
+KIND_FILE = 0
+KIND_DIR = 1
+
+# Value of an integer column for nodes without one.
+MISSING = -2 ** 63
+
+# Node indices take 4 bytes, allowing for 2 ** 31 nodes; offsets into the
+# names buffer take 8.
+INDEX_TYPE = 'i'
+OFFSET_TYPE = 'q'
+COLUMN_TYPE = 'q'
+
+
+class ColumnarTree:
+
+    """
+    A tree as flat arrays in pre-order; see the module docstring.
+
+    Usually made with ColumnarTree.from_fstree().
+    """
+
+    def __init__(self, parents, ends, kinds, names, offsets, metadata=None,
+                 columns=None):
+        """
+        :param parents, ends, kinds, names, offsets: the arrays, as described
+        in the module docstring.
+        :param metadata: optional dictionary of directories' metadata, by
+        node index.
+        :param columns: optional dictionary of integer arrays, by name.
+        """
+        self.parents = parents
+        self.ends = ends
+        self.kinds = kinds
+        self.names = names
+        self.offsets = offsets
+        self.metadata = metadata or {}
+        self.columns = columns or {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __repr__(self):
+        return '<ColumnarTree of {} nodes>'.format(len(self))
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ColumnarTree) and
+            self.parents == other.parents and
+            self.kinds == other.kinds and
+            self.names == other.names and
+            self.offsets == other.offsets and
+            self.metadata == other.metadata and
+            self.columns == other.columns
+        )
+
+    @classmethod
+    def from_fstree(cls, tree, metadata_keys=()):
+        """
+        Make a ColumnarTree from an FSTree.
+
+        :param tree: an FSTree.
+        :param metadata_keys: optional keys of directories' metadata (where
+        it's a dictionary), and of files' (under 'files' in their directory's
+        metadata, as at_path() given stat_fields records it), whose integer
+        values to copy into columns of the same names.
+
+        :rvalue columnar: a ColumnarTree.
+        """
+
+        parents = array(INDEX_TYPE, [-1])
+        ends = array(INDEX_TYPE, [0])
+        kinds = bytearray([KIND_DIR])
+        names = bytearray(b'\0')
+        offsets = array(OFFSET_TYPE, [0])
+        metadata = {}
+        columns = {key: array(COLUMN_TYPE) for key in metadata_keys}
+
+        def add_columns(node_metadata):
+            if not isinstance(node_metadata, dict):
+                node_metadata = {}
+            for key, column in columns.items():
+                column.append(node_metadata.get(key, MISSING))
+
+        def add_metadata(index, node):
+            if node.metadata is not None:
+                metadata[index] = node.metadata
+            add_columns(node.metadata)
+
+        def files_of(node):
+            if not isinstance(node.metadata, dict):
+                return {}
+            files = node.metadata.get('files')
+            return files if isinstance(files, dict) else {}
+
+        add_metadata(0, tree)
+        # Pre-order, without recursion: a stack of directories' (index,
+        # remaining (name, value) pairs, files' metadata).  Contents from
+        # walks are already in name order, so sorting them is quick.
+        stack = [(0, iter(sorted(tree.contents.items())), files_of(tree))]
+        while stack:
+            parent, items, files = stack[-1]
+            item = next(items, None)
+            if item is None:
+                stack.pop()
+                ends[parent] = len(kinds)
+                continue
+            name, value = item
+            index = len(kinds)
+            parents.append(parent)
+            ends.append(index + 1)
+            offsets.append(len(names))
+            names += os.fsencode(name)
+            names.append(0)
+            if isinstance(value, FSTree):
+                kinds.append(KIND_DIR)
+                add_metadata(index, value)
+                stack.append((
+                    index, iter(sorted(value.contents.items())),
+                    files_of(value)))
+            else:
+                kinds.append(KIND_FILE)
+                add_columns(files.get(name))
+        offsets.append(len(names))
+
+        return cls(
+            parents, ends, kinds, bytes(names), offsets, metadata, columns)
+
+    def to_fstree(self, cls=FSTree):
+        """
+        Turn this back into an FSTree.
+
+        :param cls: FSTree class to build.
+
+        :rvalue tree: an FSTree.
+        """
+        # Each directory's contents, filled in as its nodes come by.
+        contents = [None] * len(self)
+        contents[0] = {}
+        for index in range(1, len(self)):
+            name = sys.intern(self.name(index))
+            if self.kinds[index] == KIND_DIR:
+                contents[index] = {}
+                value = cls(contents[index], self.metadata.get(index))
+            else:
+                value = None
+            contents[self.parents[index]][name] = value
+        return cls(contents[0], self.metadata.get(0))
+
+    def name(self, index):
+        """Name of some node ('' for the top)."""
+        return os.fsdecode(
+            self.names[self.offsets[index]:self.offsets[index + 1] - 1])
+
+    def path(self, index):
+        """Path of some node, relative to the top."""
+        parts = []
+        while index > 0:
+            parts.append(self.name(index))
+            index = self.parents[index]
+        return os.path.join(*reversed(parts)) if parts else ''
+
+    def children(self, index=0):
+        """Indices of the nodes in some directory, in name order."""
+        child = index + 1
+        end = self.ends[index]
+        while child < end:
+            yield child
+            child = self.ends[child]
+
+    def count(self, kind=None, index=0):
+        """
+        Count the nodes in some subtree (not counting the node itself).
+
+        :param kind: KIND_FILE or KIND_DIR to count just those, or None for
+        both.
+        :param index: index of the subtree's top node.
+        """
+        start, end = index + 1, self.ends[index]
+        if kind is None:
+            return end - start
+        return self.kinds.count(kind, start, end)
+
+    def match_suffix(self, suffix, kind=KIND_FILE):
+        """
+        Find nodes whose names end with some suffix.
+
+        :param suffix: the suffix, a str.
+        :param kind: KIND_FILE or KIND_DIR to find just those, or None for
+        both.
+
+        :return indices: an array of node indices, in order.
+        """
+        needle = os.fsencode(suffix) + b'\0'
+        names, offsets, kinds = self.names, self.offsets, self.kinds
+        indices = array(INDEX_TYPE)
+        # The top's name is empty, so start after it.
+        position = names.find(needle, 1)
+        while position >= 0:
+            index = bisect.bisect_right(offsets, position) - 1
+            if kind is None or kinds[index] == kind:
+                indices.append(index)
+            position = names.find(needle, position + len(needle))
+        return indices
+
+    def filter_suffix(self, suffix):
+        """
+        Keep only files whose names end with some suffix, and the directories
+        containing them.
+        """
+        keep = bytearray(len(self))
+        keep[0] = 1
+        parents = self.parents
+        for index in self.match_suffix(suffix):
+            while not keep[index]:
+                keep[index] = 1
+                index = parents[index]
+        return self._select(keep)
+
+    def subtree(self, index):
+        """Extract the subtree under some directory as a ColumnarTree."""
+        start, end = index, self.ends[index]
+        # The new top has no name, so its nodes' names start at 1.
+        first = self.offsets[start + 1]
+        names = b'\0' + self.names[first:self.offsets[end]]
+        offsets = array(OFFSET_TYPE, [0])
+        offsets.extend(
+            offset - first + 1
+            for offset in self.offsets[start + 1:end + 1])
+        parents = array(
+            INDEX_TYPE, (parent - start for parent in self.parents[start:end]))
+        parents[0] = -1
+        return ColumnarTree(
+            parents,
+            array(INDEX_TYPE, (e - start for e in self.ends[start:end])),
+            self.kinds[start:end],
+            names,
+            offsets,
+            {
+                i - start: metadata for i, metadata in self.metadata.items()
+                if start <= i < end
+            },
+            {
+                key: column[start:end] for key, column in self.columns.items()
+            },
+        )
+
+    def _select(self, keep):
+        """
+        Make a ColumnarTree of just some nodes, given a byte per node saying
+        whether to keep it; a node's directory must be kept if it is.
+        """
+        new_index = array(INDEX_TYPE, [-1]) * len(self)
+        parents = array(INDEX_TYPE)
+        kinds = bytearray()
+        names = bytearray()
+        offsets = array(OFFSET_TYPE)
+        metadata = {}
+        columns = {key: array(COLUMN_TYPE) for key in self.columns}
+        for index in range(len(self)):
+            if not keep[index]:
+                continue
+            new_index[index] = len(kinds)
+            parent = self.parents[index]
+            parents.append(new_index[parent] if parent >= 0 else -1)
+            kinds.append(self.kinds[index])
+            offsets.append(len(names))
+            names += self.names[self.offsets[index]:self.offsets[index + 1]]
+            if index in self.metadata:
+                metadata[new_index[index]] = self.metadata[index]
+            for key, column in columns.items():
+                column.append(self.columns[key][index])
+        offsets.append(len(names))
+        return ColumnarTree(
+            parents, _ends(parents), kinds, bytes(names), offsets, metadata,
+            columns)
+
+
+def _ends(parents):
+    """Work out the ends array for some pre-order parents array."""
+    ends = array(INDEX_TYPE, range(1, len(parents) + 1))
+    for index in range(len(parents) - 1, 0, -1):
+        parent = parents[index]
+        if ends[index] > ends[parent]:
+            ends[parent] = ends[index]
+    return ends
@@ -0,0 +1,294 @@
+"""
+Digests of FSTrees, and the diffs and deduplication they make quick.
+
+Each directory's digest (see FSTree.digest()) is a hash of its metadata, of
+the names and kinds of everything in it, and of its subdirectories' digests,
+Merkle-style, so two directories with equal digests are equal.
+
+diff_trees() walks two trees together, in name order, and skips any pair of
+directories which are the same object (as unchanged parts of trees from
+FSTree.rescan() are) or have equal digests, so once digests are cached its
+cost depends on the size of the change rather than the size of the trees.
+dedup_tree() makes identical directories one object.
+"""
+
+import collections
+import hashlib
+import numbers
+import os
+import struct
+
+from .compact import CompactContents
+from .traversal import bottom_up, is_dir
+
+
+TreeDiff = collections.namedtuple('TreeDiff', ('added', 'removed', 'changed'))
+TreeDiff.__doc__ = """
+Differences between two trees: lists of the paths (relative to the top, in
+pre-order) which were added, which were removed, and which changed: between
+being a file and being a directory, or files whose metadata recorded by walks
+or FSTree.hash_files() (size, mtime, content digests and so on) differs, in
+any field both trees record.  Everything in a directory which was added or
+removed (or became or stopped being a file) is itself added or removed.
+"""
+
+DIGEST_SIZE = 16
+
+KIND_FILE = b'f'
+KIND_DIR = b'd'
+KIND_VALUE = b'v'
+
+LENGTH = struct.Struct('<I')
+
+# Marks a name missing from one of the trees being compared.
+_ABSENT = object()
+
+
+def digest_tree(tree, is_current, store):
+
+    """
+    Work out the digests of a directory and everything in it, without
+    recursion (see traversal.bottom_up()).
+
+    :param tree: the FSTree.
+    :param is_current: function returning a node's digest if it already has
+    an up to date one, or else None.
+    :param store: function to call with each node and its new digest.
+
+    :return digest: the tree's digest, as bytes.
+    """
+
+    def combine(node):
+        hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        hasher.update(encode_metadata(node.metadata))
+        for name, value in sorted(node.contents.items(), key=_name):
+            encoded = os.fsencode(name)
+            hasher.update(LENGTH.pack(len(encoded)))
+            hasher.update(encoded)
+            if is_dir(value):
+                hasher.update(KIND_DIR)
+                hasher.update(is_current(value))
+            elif value is None:
+                hasher.update(KIND_FILE)
+            else:
+                # Not something walks make, but it counts too.
+                hasher.update(KIND_VALUE)
+                hasher.update(encode_metadata(value))
+        return hasher.digest()
+
+    return bottom_up(tree, is_current, store, combine)
+
+
+def encode_metadata(metadata):
+
+    """
+    Encode some metadata for hashing, such that equal metadata has the same
+    encoding.
+
+    Numbers are encoded by value, so that 1, 1.0 and True are the same.
+    Strings, bytes, lists, tuples, dictionaries and sets are encoded by
+    their contents; anything else by its type and repr().
+
+    :return encoded: bytes.
+    """
+
+    if metadata is None:
+        return b'N'
+    if isinstance(metadata, str):
+        return _tagged(b's', metadata.encode('utf-8', 'surrogatepass'))
+    if isinstance(metadata, (bytes, bytearray)):
+        return _tagged(b'b', bytes(metadata))
+    if isinstance(metadata, numbers.Number):
+        return _encode_number(metadata)
+    if isinstance(metadata, (list, tuple)):
+        tag = b'l' if isinstance(metadata, list) else b't'
+        return _tagged(
+            tag, b''.join(encode_metadata(value) for value in metadata))
+    if isinstance(metadata, dict):
+        return _tagged(b'd', b''.join(sorted(
+            encode_metadata(key) + encode_metadata(value)
+            for key, value in metadata.items()
+        )))
+    if isinstance(metadata, (set, frozenset)):
+        return _tagged(b'S', b''.join(
+            sorted(encode_metadata(value) for value in metadata)))
+    return _tagged(
+        b'o',
+        (type(metadata).__qualname__ + '\0' + repr(metadata)).encode(
+            'utf-8', 'surrogatepass'))
+
+
+def dedup_tree(tree):
+
+    """
+    Make a copy of a tree in which directories with the same digest are the
+    same object, sharing as much as possible with the tree, without
+    recursion.
+
+    :param tree: the FSTree.
+
+    :return deduped: an FSTree.
+    """
+
+    tree.digest()
+    # Directories in pre-order, each just once, so that reversed,
+    # everything's after what's in it.
+    order = []
+    visited = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        order.append(node)
+        stack.extend(
+            value for _, value in node.contents.items() if is_dir(value))
+    # The one directory with each digest.
+    canonical = {}
+    for node in reversed(order):
+        digest = node.digest()
+        if digest in canonical:
+            continue
+        contents = {
+            name: canonical[value.digest()] if is_dir(value) else value
+            for name, value in node.contents.items()
+        }
+        if all(
+            value is node.contents[name] for name, value in contents.items()
+        ):
+            canonical[digest] = node
+            continue
+        if isinstance(node.contents, CompactContents):
+            contents = CompactContents(contents)
+        deduped = canonical[digest] = type(node)(contents, node.metadata)
+        deduped._digest = node._digest
+    return canonical[tree.digest()]
+
+
+def diff_trees(old, new):
+
+    """
+    Find the differences between two trees; see the module docstring.
+
+    :param old, new: the FSTrees.
+
+    :return diff: a TreeDiff.
+    """
+
+    added = []
+    removed = []
+    changed = []
+    if _same(old, new):
+        return TreeDiff(added, removed, changed)
+    # Without recursion: a stack of remaining (name, old value, new value)
+    # triples of the directories being compared, with their paths and their
+    # files' metadata.
+    stack = [('', _merged(old, new), _files(old), _files(new))]
+    while stack:
+        prefix, items, old_files, new_files = stack[-1]
+        item = next(items, None)
+        if item is None:
+            stack.pop()
+            continue
+        name, old_value, new_value = item
+        path = prefix + name
+        if old_value is _ABSENT:
+            added.append(path)
+            added.extend(_paths_in(new_value, path))
+        elif new_value is _ABSENT:
+            removed.append(path)
+            removed.extend(_paths_in(old_value, path))
+        elif is_dir(old_value) and is_dir(new_value):
+            if not _same(old_value, new_value):
+                stack.append((
+                    path + os.sep, _merged(old_value, new_value),
+                    _files(old_value), _files(new_value)))
+        elif is_dir(old_value) or is_dir(new_value):
+            changed.append(path)
+            removed.extend(_paths_in(old_value, path))
+            added.extend(_paths_in(new_value, path))
+        elif _file_changed(old_files.get(name), new_files.get(name)):
+            changed.append(path)
+    return TreeDiff(added, removed, changed)
+
+
+def _tagged(tag, encoded):
+    return tag + LENGTH.pack(len(encoded)) + encoded
+
+
+def _encode_number(number):
+    """Encode a number by value, as exactly as possible."""
+    try:
+        integral = int(number)
+        if integral == number:
+            return _tagged(b'i', str(integral).encode('ascii'))
+    except (TypeError, ValueError, OverflowError):
+        pass
+    try:
+        real = float(number)
+        if real == number:
+            return _tagged(b'f', repr(real).encode('ascii'))
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return _tagged(b'n', repr(number).encode('utf-8', 'surrogatepass'))
+
+
+def _name(item):
+    return item[0]
+
+
+def _sorted_items(tree):
+    return iter(sorted(tree.contents.items(), key=_name))
+
+
+def _files(tree):
+    """A directory's files' metadata, by name, if it has any."""
+    if not isinstance(tree.metadata, dict):
+        return {}
+    files = tree.metadata.get('files')
+    return files if isinstance(files, dict) else {}
+
+
+def _file_changed(old, new):
+    """Does a file's metadata differ in any field recorded in both trees?"""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return False
+    return any(old[key] != new[key] for key in old.keys() & new.keys())
+
+
+def _same(old, new):
+    """Have two directories the same structure, as far as can quickly tell?"""
+    return old is new or old.digest() == new.digest()
+
+
+def _merged(old, new):
+    """
+    (name, old value, new value) triples for the contents of two directories,
+    in name order, with _ABSENT for a value where a name's missing.
+    """
+    old_contents = old.contents
+    new_contents = new.contents
+    for name in sorted(set(old_contents).union(new_contents)):
+        yield (
+            name,
+            old_contents.get(name, _ABSENT),
+            new_contents.get(name, _ABSENT),
+        )
+
+
+def _paths_in(value, prefix):
+    """Paths of everything in a directory (if it is one), in pre-order."""
+    if not is_dir(value):
+        return
+    stack = [(prefix + os.sep, _sorted_items(value))]
+    while stack:
+        prefix, items = stack[-1]
+        item = next(items, None)
+        if item is None:
+            stack.pop()
+            continue
+        name, value = item
+        yield prefix + name
+        if is_dir(value):
+            stack.append((prefix + name + os.sep, _sorted_items(value)))
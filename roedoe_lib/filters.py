@@ -0,0 +1,195 @@
+"""
+Matching paths against many regular expressions at once, for FSTree.filter().
+
+FSTree.filter() keeps files whose paths match (in the re.match() sense) any
+of a list of patterns.  Trying each pattern in turn costs one match call per
+pattern per file, which adds up with hundreds of patterns.  CompiledFilter
+instead sorts the patterns, once, into:
+
+* literal suffixes (e.g. r'.*\\.md$'), prefixes (e.g. r'^docs/.*') and whole
+  paths (e.g. r'^docs/index\\.md$'), case sensitive or not, which are looked
+  up in sets keyed by literal length, so the cost depends on the number of
+  distinct lengths rather than the number of patterns;
+
+* everything else that can safely be combined, which is merged into a single
+  alternation, each alternative keeping its own flags;
+
+* patterns which can't be combined without changing their meaning (those with
+  backreferences, named groups, global inline flags or unusual flags), and
+  things which aren't compiled str patterns at all, which are still tried one
+  at a time.
+
+The literal lookups are only exact for paths which are ASCII and contain no
+newlines (a newline stops '.*' and lets '$' match early, and case folding
+outside ASCII is more involved than str.lower()); other paths are matched
+against one alternation of all the combinable patterns instead.
+"""
+
+import re
+
+
+# Flags which can be scoped to part of a pattern, in every Python we support.
+SCOPED_FLAGS = (
+    (re.IGNORECASE, 'i'),
+    (re.MULTILINE, 'm'),
+    (re.DOTALL, 's'),
+)
+MERGEABLE_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL | re.UNICODE
+
+# Flags which don't change the meaning of a literal pattern, given a path
+# which is ASCII and contains no newlines.
+LITERAL_FLAGS = MERGEABLE_FLAGS | re.ASCII
+
+# Things which stop a pattern being combined with others: numbered
+# backreferences, named backreferences, conditionals and global inline flags.
+UNMERGEABLE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)')
+
+# A literal: characters with no special meaning, or escaped punctuation.
+LITERAL = r'(?:[^.^$*+?{}\[\]\\|()]|\\[^0-9A-Za-z])+'
+SUFFIX = re.compile(r'\^?\.\*(?P<literal>{})\$\Z'.format(LITERAL))
+PREFIX = re.compile(r'\^?(?P<literal>{})(?:\.\*\$?)?\Z'.format(LITERAL))
+EXACT = re.compile(r'\^?(?P<literal>{})\$\Z'.format(LITERAL))
+
+# Paths for which the literal lookups are exact.
+SIMPLE_PATH = re.compile(r'[\x00-\x09\x0b-\x7f]*\Z')
+
+
+class CompiledFilter:
+
+    """
+    A list of regular expressions, compiled to match paths against all of
+    them at once.
+
+    CompiledFilter(filters).match(path) is true exactly when
+    any(filter_.match(path) for filter_ in filters) is, but usually needs
+    only a couple of set lookups or one regex match to find out.  Build one
+    once and reuse it; FSTree.filter() accepts one in place of a list.
+    """
+
+    def __init__(self, filters):
+        """
+        :param filters: compiled regex objects (or strings, which are
+        compiled), as given to FSTree.filter().  Anything else with a match()
+        method is allowed too, and just called as usual.
+        """
+        self.filters = list(filters)
+        # Literals by kind, then case sensitivity, then length.
+        self._literals = {
+            kind: ({}, {}) for kind in ('suffix', 'prefix', 'exact')
+        }
+        merged = []
+        rest = []
+        self._separate = []
+        for filter_ in self.filters:
+            if isinstance(filter_, str):
+                filter_ = re.compile(filter_)
+            alternative = _alternative(filter_)
+            if alternative is None:
+                self._separate.append(filter_)
+                continue
+            merged.append(alternative)
+            if not self._add_literal(filter_):
+                rest.append(alternative)
+        # (ignore_case, (suffixes, exacts, prefixes)), the last three being
+        # (length, literals) pairs, for each case sensitivity with literals.
+        self._literal_lengths = []
+        for ignore_case in (False, True):
+            lengths = tuple(
+                tuple(sorted(self._literals[kind][ignore_case].items()))
+                for kind in ('suffix', 'exact', 'prefix')
+            )
+            if any(lengths):
+                self._literal_lengths.append((ignore_case, lengths))
+        self._merged = _combine(merged)
+        self._rest = _combine(rest)
+
+    def __len__(self):
+        return len(self.filters)
+
+    def __repr__(self):
+        return 'CompiledFilter({!r})'.format(self.filters)
+
+    def match(self, path):
+        """Does path match any of the filters?"""
+        if SIMPLE_PATH.match(path):
+            if self._match_literals(path):
+                return True
+            if self._rest is not None and self._rest.match(path):
+                return True
+        elif self._merged is not None and self._merged.match(path):
+            return True
+        return any(filter_.match(path) for filter_ in self._separate)
+
+    def _add_literal(self, pattern):
+        """
+        Index some pattern if it's a literal suffix, prefix or path, returning
+        whether it was.
+        """
+        if pattern.flags & ~LITERAL_FLAGS:
+            return False
+        for kind, form in (
+            ('suffix', SUFFIX),
+            ('exact', EXACT),
+            ('prefix', PREFIX),
+        ):
+            match = form.match(pattern.pattern)
+            if match:
+                break
+        else:
+            return False
+        literal = re.sub(r'\\(.)', r'\1', match.group('literal'))
+        if not SIMPLE_PATH.match(literal):
+            return False
+        ignore_case = bool(pattern.flags & re.IGNORECASE)
+        if ignore_case:
+            literal = literal.lower()
+        by_length = self._literals[kind][ignore_case]
+        by_length.setdefault(len(literal), set()).add(literal)
+        return True
+
+    def _match_literals(self, path):
+        """Does path, which is simple, match any indexed literal?"""
+        for ignore_case, (suffixes, exacts, prefixes) in self._literal_lengths:
+            if ignore_case:
+                path = path.lower()
+            length = len(path)
+            for literal_length, literals in suffixes:
+                if (
+                    literal_length <= length and
+                    path[length - literal_length:] in literals
+                ):
+                    return True
+            for literal_length, literals in exacts:
+                if literal_length == length and path in literals:
+                    return True
+            for literal_length, literals in prefixes:
+                if path[:literal_length] in literals:
+                    return True
+        return False
+
+
+def _alternative(pattern):
+    """
+    Turn a compiled pattern into something to put in an alternation with
+    others, keeping its flags, or None if it can't be.
+    """
+    if not isinstance(pattern, type(SIMPLE_PATH)):
+        return None
+    if not isinstance(pattern.pattern, str):
+        return None
+    if pattern.flags & ~MERGEABLE_FLAGS or pattern.groupindex:
+        return None
+    if UNMERGEABLE.search(pattern.pattern):
+        return None
+    flags = ''.join(
+        letter for flag, letter in SCOPED_FLAGS if pattern.flags & flag)
+    if flags:
+        return '(?{}:{})'.format(flags, pattern.pattern)
+    return '(?:{})'.format(pattern.pattern)
+
+
+def _combine(alternatives):
+    """Compile alternatives into one pattern, or None if there are none."""
+    if not alternatives:
+        return None
+    return re.compile('|'.join(alternatives))
@@ -0,0 +1,228 @@
+"""
+Hashing the contents of the files in an FSTree.
+
+hash_tree() reads every file in a tree on a thread pool (hashlib releases the
+GIL while hashing anything but tiny buffers, and reading releases it too), a
+bounded number of files ahead of where the results are being collected, and
+records each file's digest in its metadata: files are None in their
+directory's contents, so as with stat fields recorded by walks, their
+metadata is kept in their directory's metadata dictionary, under 'files', by
+name.  Each file's entry gets the hex digest under the name of the
+algorithm, along with the 'size' and 'mtime_ns' it had when it was read.
+
+Given a previous tree hashed the same way, files whose size and mtime are
+the same as then aren't read again; their previous digests are reused.
+(As with any such scheme, a file changed within the resolution of its
+filesystem's timestamps without changing size can be missed.)
+
+Small files are read into a reused buffer, in chunks; big ones are mmapped
+and hashed in one go.
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import mmap
+import os
+import threading
+
+from .compact import CompactContents
+
+
+# Files at least this big are mmapped rather than read.
+MMAP_SIZE = 8 * 2 ** 20
+
+# Size of chunks to read smaller files in.
+CHUNK_SIZE = 2 ** 20
+
+# How many files each worker thread may have queued or hashed but not yet
+# collected.
+PENDING_PER_WORKER = 16
+
+_buffers = threading.local()
+
+
+def check_algorithm(algorithm):
+    """
+    Check hashlib has some algorithm, and that its digests have a fixed
+    length, raising ValueError if not.
+    """
+    try:
+        hashlib.new(algorithm).hexdigest()
+    except TypeError:
+        raise ValueError(
+            'Variable length digests aren\'t supported: {}'.format(algorithm))
+
+
+def hash_tree(tree, top, algorithm, workers=None, previous=None):
+
+    """
+    Hash the files in a tree; see the module docstring.
+
+    :param tree: the FSTree; its directories' metadata must be dictionaries
+    or None.
+    :param top: path the tree was walked from.
+    :param algorithm: name of the hashlib algorithm to use.
+    :param workers: optional number of threads to hash files with.
+    :param previous: optional FSTree hashed earlier with the same algorithm,
+    whose digests to reuse where files are unchanged.
+
+    :return hashed: a copy of the tree, with digests recorded.  Files which
+    couldn't be read (e.g. because they've gone since the walk) get none.
+    """
+
+    check_algorithm(algorithm)
+    # Directories in pre-order, each with its path, its previous tree, and
+    # the index in order of its parent (or None), by which the copies are
+    # put together: a tree may have the same node at several paths (see
+    # FSTree.dedup()), whose copies may differ.
+    order = []
+    stack = [(tree, top, previous, None, None)]
+    while stack:
+        node, path, node_previous, parent, node_name = stack.pop()
+        if node.metadata is not None and not isinstance(node.metadata, dict):
+            raise ValueError(
+                'Can\'t record file metadata in: {!r}'.format(node.metadata))
+        index = len(order)
+        order.append((node, path, node_previous, parent, node_name))
+        for name, value in node.contents.items():
+            if hasattr(value, 'contents'):
+                item_previous = None
+                if node_previous is not None:
+                    item_previous = node_previous.contents.get(name)
+                    if not hasattr(item_previous, 'contents'):
+                        item_previous = None
+                stack.append((
+                    value, os.path.join(path, name), item_previous, index,
+                    name))
+
+    def jobs():
+        for index, (node, path, node_previous, _, _) in enumerate(order):
+            files = _files(node)
+            previous_files = _files(node_previous)
+            for name, value in node.contents.items():
+                if value is None:
+                    yield index, name, (
+                        os.path.join(path, name), algorithm, files.get(name),
+                        previous_files.get(name))
+
+    # Each directory's files' new metadata, by name.
+    hashed = [{} for _ in order]
+    if not workers:
+        for index, name, job in jobs():
+            hashed[index][name] = hash_file(*job)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            pending = collections.deque()
+            try:
+                for index, name, job in jobs():
+                    if len(pending) >= workers * PENDING_PER_WORKER:
+                        _collect(pending.popleft(), hashed)
+                    pending.append(
+                        (index, name, pool.submit(hash_file, *job)))
+                while pending:
+                    _collect(pending.popleft(), hashed)
+            finally:
+                for _, _, future in pending:
+                    future.cancel()
+
+    # Copy the tree, everything after what's in it; each directory's copies
+    # of its subdirectories, by name.
+    copies = [{} for _ in order]
+    for index in range(len(order) - 1, -1, -1):
+        node, _, _, parent, node_name = order[index]
+        dir_copies = copies[index]
+        contents = {
+            name: dir_copies[name] if hasattr(value, 'contents') else value
+            for name, value in node.contents.items()
+        }
+        if isinstance(node.contents, CompactContents):
+            contents = CompactContents(contents)
+        metadata = dict(node.metadata or {})
+        files = dict(_files(node))
+        for name, file_metadata in hashed[index].items():
+            if file_metadata is not None:
+                files[name] = dict(files.get(name, {}), **file_metadata)
+        if files:
+            metadata['files'] = files
+        copy = type(node)(contents, metadata or None)
+        if parent is None:
+            return copy
+        copies[parent][node_name] = copy
+
+
+def hash_file(path, algorithm, known=None, previous=None):
+
+    """
+    Hash a file, unless it's unchanged since a previous hashing.
+
+    :param path: path to the file.
+    :param algorithm: name of the hashlib algorithm to use.
+    :param known: optional metadata of the file giving its 'size' and
+    'mtime_ns', to save statting it before deciding whether to read it.
+    :param previous: optional metadata of the file from a previous hashing.
+
+    :return metadata: a dictionary of the file's digest (by algorithm),
+    'size' and 'mtime_ns', or None if it couldn't be read.
+    """
+
+    try:
+        if previous and algorithm in previous:
+            if known and 'size' in known and 'mtime_ns' in known:
+                size, mtime_ns = known['size'], known['mtime_ns']
+            else:
+                st = os.stat(path)
+                size, mtime_ns = st.st_size, st.st_mtime_ns
+            if (
+                previous.get('size') == size and
+                previous.get('mtime_ns') == mtime_ns
+            ):
+                return {
+                    algorithm: previous[algorithm],
+                    'size': size,
+                    'mtime_ns': mtime_ns,
+                }
+        hasher = hashlib.new(algorithm)
+        with open(path, 'rb', buffering=0) as source:
+            st = os.fstat(source.fileno())
+            if st.st_size >= MMAP_SIZE:
+                with mmap.mmap(
+                    source.fileno(), 0, access=mmap.ACCESS_READ
+                ) as mapped:
+                    hasher.update(mapped)
+            else:
+                buffer = _buffer()
+                view = memoryview(buffer)
+                while True:
+                    length = source.readinto(buffer)
+                    if not length:
+                        break
+                    hasher.update(view[:length])
+    except (OSError, ValueError):
+        # Gone, unreadable, or (ValueError) emptied before it was mapped.
+        return None
+    return {
+        algorithm: hasher.hexdigest(),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+    }
+
+
+def _buffer():
+    """This thread's buffer to read files into."""
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _buffers.buffer = bytearray(CHUNK_SIZE)
+    return buffer
+
+
+def _collect(item, hashed):
+    index, name, future = item
+    hashed[index][name] = future.result()
+
+
+def _files(node):
+    """A directory's files' metadata, by name, if it's a directory."""
+    if node is None or not isinstance(node.metadata, dict):
+        return {}
+    return node.metadata.get('files', {})
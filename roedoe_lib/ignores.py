@@ -0,0 +1,345 @@
+"""
+Analysis of ignore patterns, so walks needn't check every entry against them.
+
+FSTree.at_path() checks each entry's path (relative to the top of the walk)
+against a pathspec.PathSpec; the last pattern matching a path decides
+whether it's ignored.  Most patterns can only match in some places, though:
+'/build' can only match things under 'build', and 'docs/*.md' only things
+under 'docs'.  IgnoreScopes works out, for each directory the walk lists:
+
+* which patterns could possibly match something in it, so only those are
+  checked (and if there are none, nothing is); a pattern's reach follows from
+  the literal text its regex starts with, so patterns which can match at any
+  depth (like 'node_modules/' or '*.pyc') reach everywhere;
+
+* whether everything in it would be ignored (e.g. anything under a directory
+  matching 'node_modules/', unless a later '!' pattern could match something
+  in there), in which case it needn't be listed at all.  The directory itself
+  is kept or dropped as before; it just has nothing in it, as it would have
+  had anyway.
+
+The results are exactly as if every entry were checked against the whole
+PathSpec.  Only pathspec.PathSpec itself, with regex-based patterns, is
+analysed; anything else is just used as it is.
+
+IgnoreScopes can also read ignore files (like .gitignore) from each
+directory as it's listed, as git does.  Their patterns apply to paths
+relative to their own directory, and take precedence over those from ignore
+files further up, which take precedence over the PathSpec given.  Each
+directory's scope holds the compiled patterns of every ignore file above it,
+so each file's read and compiled once; files with the same contents share
+their compiled patterns.  When ignore files are read, as in git, patterns
+matching a directory ignore it (so that 'build/' ignores a directory called
+build, rather than everything in it), and nothing within it is looked at,
+its ignore files included.
+"""
+
+import collections
+import functools
+import os
+import re
+
+from pathspec import PathSpec
+from pathspec.util import normalize_file
+
+
+Scope = collections.namedtuple(
+    'Scope', ('pruned', 'patterns', 'spec', 'layers'))
+Scope.__doc__ = """
+What's needed to check entries of some directory: whether they're all
+ignored, the (index, pattern) pairs which might match any of them, and a
+PathSpec of just those (or None if there aren't any).  If ignore files are
+being read, layers holds what came from those in it and above it, nearest
+first, as (prefix_length, patterns) pairs, where prefix_length is the length
+of the prefix to strip from a path to make it relative to the ignore file's
+directory, and patterns are the file's patterns, last first, as (include,
+regex) pairs (see _entry_regex()); otherwise, layers is None.  See
+is_ignored().
+"""
+
+PRUNED = Scope(True, (), None, None)
+
+# Number of distinct ignore files to remember the compiled patterns of.
+IGNORE_FILE_CACHE_SIZE = 256
+
+# Number of directories to remember scopes for; as walks go depth first,
+# this needn't be big to cover the ancestors of wherever a walk's got to.
+SCOPE_CACHE_SIZE = 1024
+
+# Endings of gitwildmatch regexes which, when their ps_d group takes part
+# in a match, have matched a directory and so everything under it.
+DIR_MATCH_ENDINGS = ('(?P<ps_d>/)', '(?:(?P<ps_d>/)|$)')
+
+REGEX_SPECIAL = '.^$*+?{}[]\\|()'
+# Only regexes with no flags but this are looked into; others might not mean
+# what they seem to.
+PLAIN_FLAGS = re.UNICODE
+QUANTIFIERS = '*+?{'
+
+
+class IgnoreScopes:
+
+    """
+    A PathSpec, analysed so as to give the scope of each directory within the
+    walk; see the module docstring.
+    """
+
+    def __init__(self, spec, ignore_files=()):
+        """
+        :param spec: the pathspec.PathSpec to check paths against, or None.
+
+        :param ignore_files: names of ignore files to read from each directory,
+        in increasing order of precedence, e.g. ('.gitignore', '.ignore').
+        """
+        self.spec = spec
+        self.ignore_files = tuple(ignore_files)
+        if type(spec) is PathSpec:
+            patterns = tuple(
+                (index, pattern)
+                for index, pattern in enumerate(spec.patterns)
+                if pattern.include is not None
+            )
+            self._prefixes = {
+                index: _literal_prefix(pattern) for index, pattern in patterns
+            }
+        elif spec is None:
+            patterns = ()
+        else:
+            # Can't tell how it works, so everything could match anywhere.
+            patterns = None
+        self._patterns = patterns
+        self._specs = {}
+        self._init_cache()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['scope']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_cache()
+
+    def _init_cache(self):
+        self.scope = functools.lru_cache(SCOPE_CACHE_SIZE)(self._scope)
+
+    def _scope(self, rel_path, path):
+        """
+        Work out the scope of some directory, from that of its parent.
+
+        :param rel_path: path of the directory relative to the top of the walk
+        ('' for the top itself).
+        :param path: path to the directory, as reached by the walk.
+
+        :return scope: a Scope.
+        """
+
+        if not rel_path:
+            dir_prefix = ''
+            patterns = self._patterns
+            spec = self.spec
+            layers = () if self.ignore_files else None
+        else:
+            parent = self.scope(
+                os.path.dirname(rel_path), os.path.dirname(path))
+            if parent.pruned:
+                return parent
+            dir_prefix = normalize_file(rel_path) + '/'
+            patterns, spec = self._reaching(parent, dir_prefix)
+            layers = parent.layers
+            if layers is None and _covered(patterns, dir_prefix):
+                return PRUNED
+
+        if self.ignore_files:
+            for name in self.ignore_files:
+                file_patterns = _read_ignore_file(os.path.join(path, name))
+                if file_patterns:
+                    layers = ((len(dir_prefix), file_patterns),) + layers
+        return Scope(False, patterns, spec, layers)
+
+    def _reaching(self, parent, dir_prefix):
+        """
+        Find which of the patterns in the scope of some directory's parent
+        reach into it, and a PathSpec of them.
+        """
+        if parent.patterns is None:
+            return None, parent.spec
+        patterns = tuple(
+            (index, pattern) for index, pattern in parent.patterns
+            if _reaches(self._prefixes[index], dir_prefix)
+        )
+        if patterns == parent.patterns:
+            return patterns, parent.spec
+        if not patterns:
+            return patterns, None
+        indices = tuple(index for index, _ in patterns)
+        spec = self._specs.get(indices)
+        if spec is None:
+            spec = self._specs[indices] = PathSpec(
+                [pattern for _, pattern in patterns])
+        return patterns, spec
+
+
+def is_ignored(scope, rel_path, is_dir):
+
+    """
+    Is something in a directory ignored, given the directory's scope, where
+    ignore files are being read?
+
+    :param scope: the Scope of the directory.
+    :param rel_path: path of the thing relative to the top of the walk.
+    :param is_dir: whether the thing is a directory.
+    """
+
+    path = normalize_file(rel_path)
+    if is_dir:
+        path += '/'
+    for prefix_length, patterns in scope.layers:
+        layer_path = path[prefix_length:]
+        for include, regex in patterns:
+            if regex.search(layer_path):
+                return include
+    return bool(scope.spec and scope.spec.match_file(path))
+
+
+def _covered(patterns, dir_prefix):
+    """
+    Is everything in some directory ignored, given the patterns reaching it?
+    That's so if an include pattern matches it as a directory, and no later
+    negation might match something in it.
+    """
+    for _, pattern in reversed(patterns or ()):
+        if not pattern.include:
+            return False
+        if _matches_dir(pattern, dir_prefix):
+            return True
+    return False
+
+
+def _read_ignore_file(path):
+    """
+    Read an ignore file, returning its patterns (last first), or None if
+    there isn't one.
+    """
+    try:
+        with open(path, 'rb') as ignore_file:
+            text = os.fsdecode(ignore_file.read())
+    except OSError:
+        return None
+    return _compile_ignore_file(text)
+
+
+@functools.lru_cache(IGNORE_FILE_CACHE_SIZE)
+def _compile_ignore_file(text):
+    """Compile the contents of an ignore file; see _read_ignore_file()."""
+    spec = PathSpec.from_lines('gitwildmatch', text.splitlines())
+    return tuple(
+        (pattern.include, _entry_regex(pattern))
+        for pattern in reversed(spec.patterns)
+        if pattern.include is not None
+    )
+
+
+def _entry_regex(pattern):
+    """
+    A regex matching what some gitwildmatch pattern matches itself, rather
+    than by matching a directory above it: its directories have already been
+    decided on, so with ignore files, as in git, a pattern matching a
+    directory (e.g. '!build/') says nothing about what's in it.  Likewise,
+    'a/**' matches everything in a, but not a itself.
+    """
+    text = pattern.regex.pattern
+    for ending in DIR_MATCH_ENDINGS:
+        if text.endswith(ending):
+            text = text[:-len(ending)] + ending.replace(
+                '(?P<ps_d>/)', '/$')
+            break
+    else:
+        if text.endswith('/'):
+            text += '.'
+    return re.compile(text, pattern.regex.flags)
+
+
+def _literal_prefix(pattern):
+    """
+    Literal text every path matched by some pattern starts with, or None if
+    that can't be told.
+    """
+    regex = getattr(pattern, 'regex', None)
+    text = getattr(regex, 'pattern', None)
+    if (
+        not isinstance(text, str) or
+        not text.startswith('^') or
+        regex.flags & ~PLAIN_FLAGS or
+        _has_top_level_alternation(text)
+    ):
+        return None
+    prefix = []
+    i = 1
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            escaped = text[i + 1:i + 2]
+            if not escaped or escaped.isalnum():
+                break
+            prefix.append(escaped)
+            i += 2
+        elif char in REGEX_SPECIAL:
+            if char in QUANTIFIERS and prefix:
+                # The last character's optional or repeated.
+                prefix.pop()
+            break
+        else:
+            prefix.append(char)
+            i += 1
+    return ''.join(prefix)
+
+
+def _has_top_level_alternation(text):
+    """Does a regex have a '|' outside any group?"""
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 1
+        elif in_class:
+            if char == ']':
+                in_class = False
+        elif char == '[':
+            in_class = True
+            if text[i + 1:i + 2] == '^':
+                i += 1
+            if text[i + 1:i + 2] == ']':
+                i += 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and not depth:
+            return True
+        i += 1
+    return False
+
+
+def _reaches(prefix, dir_prefix):
+    """
+    Could a pattern whose matches start with prefix match anything in the
+    directory whose paths start with dir_prefix?
+    """
+    return (
+        prefix is None or
+        dir_prefix.startswith(prefix) or
+        prefix.startswith(dir_prefix)
+    )
+
+
+def _matches_dir(pattern, dir_prefix):
+    """Does a pattern match everything in some directory?"""
+    regex = getattr(pattern, 'regex', None)
+    text = getattr(regex, 'pattern', None)
+    if not isinstance(text, str) or not text.endswith(DIR_MATCH_ENDINGS):
+        return False
+    match = regex.search(dir_prefix)
+    return match is not None and match.group('ps_d') is not None
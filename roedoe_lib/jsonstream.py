@@ -0,0 +1,273 @@
+"""
+Streaming reading and writing of FSTrees' JSON.
+
+FSTree.to_json() builds a copy of the whole tree as dictionaries before
+encoding it, and FSTree.from_json() parses the whole document before
+building the tree, so each takes about twice the memory of the tree itself.
+dump_tree() and load_tree() instead write and read the same format node by
+node, in chunks, so that besides the tree itself they need memory only in
+proportion to its depth (and the size of any one piece of metadata).
+
+dump_tree() writes exactly what to_json() would, given no options.
+load_tree() reads whatever from_json() would (in any order of keys, with any
+whitespace), from a text or binary file.
+"""
+
+import codecs
+import json
+import re
+import sys
+from json.encoder import encode_basestring_ascii
+
+
+# Size of chunks to read and (roughly) write.
+CHUNK_SIZE = 65536
+
+WHITESPACE = ' \t\n\r'
+
+# The usual entry in a directory's contents: a name with nothing escaped,
+# and null for a file or the start of a directory.
+SIMPLE_ENTRY = re.compile(
+    r'[ \t\n\r]*(,?)[ \t\n\r]*"([^"\\\x00-\x1f]*)"'
+    r'[ \t\n\r]*:[ \t\n\r]*(null|\{)')
+
+
+def dump_tree(tree, fp, chunk_size=CHUNK_SIZE):
+    """
+    Write an FSTree's JSON, as from FSTree.to_json(), to a text file.
+
+    :param tree: the FSTree.
+    :param fp: file object to write to.
+    :param chunk_size: size of chunks to write, roughly.
+    """
+
+    pieces = []
+    size = 0
+
+    def write(piece):
+        nonlocal size
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            fp.write(''.join(pieces))
+            del pieces[:]
+            size = 0
+
+    write('{"type": "FSTree", "version": "1.0.0", "fstree": {"contents": {')
+    # Without recursion: a stack of directories' (node, remaining (name,
+    # value) pairs).
+    stack = [(tree, iter(tree.contents.items()))]
+    first = True
+    while stack:
+        node, items = stack[-1]
+        item = next(items, None)
+        if item is None:
+            stack.pop()
+            if node.metadata:
+                write('}, "metadata": ' + json.dumps(node.metadata) + '}')
+            else:
+                write('}}')
+            first = False
+            continue
+        name, value = item
+        write(('{}: ' if first else ', {}: ').format(
+            encode_basestring_ascii(name)))
+        if value is None:
+            write('null')
+            first = False
+        elif hasattr(value, 'contents'):
+            write('{"contents": {')
+            stack.append((value, iter(value.contents.items())))
+            first = True
+        else:
+            write(json.dumps(value))
+            first = False
+    write('}')
+    fp.write(''.join(pieces))
+
+
+def load_tree(fp, cls, chunk_size=CHUNK_SIZE):
+    """
+    Read an FSTree's JSON, as from FSTree.to_json(), from a file.
+
+    :param fp: text or binary (UTF-8) file object to read from.
+    :param cls: FSTree class to make nodes of.
+    :param chunk_size: size of chunks to read.
+
+    :return tree: the FSTree.
+    """
+
+    reader = _Reader(fp, chunk_size)
+    reader.expect('{')
+    envelope = {}
+    first = True
+    while True:
+        key = reader.key(first)
+        if key is None:
+            break
+        first = False
+        if key == 'fstree' and reader.peek() == '{':
+            reader.expect('{')
+            envelope[key] = _load_node(reader, cls)
+        else:
+            envelope[key] = reader.value()
+    if reader.peek():
+        reader.fail('Extra data')
+    if envelope.get('type') != 'FSTree' or 'fstree' not in envelope:
+        raise ValueError(envelope)
+    return envelope['fstree']
+
+
+class _Node:
+
+    """A node being read: its contents, metadata, and where the read's got."""
+
+    __slots__ = ('contents', 'metadata', 'in_contents', 'first')
+
+    def __init__(self):
+        self.contents = {}
+        self.metadata = None
+        self.in_contents = False
+        self.first = True
+
+
+def _load_node(reader, cls):
+    """
+    Read a node and everything in it, after its opening brace, without
+    recursion.
+    """
+    # The nodes being read above this one, with the names they'll have.
+    stack = []
+    node = _Node()
+    while True:
+        if node.in_contents:
+            entry = reader.simple_entry(node.first)
+            if entry is not None:
+                name, is_dir = entry
+                node.first = False
+                if is_dir:
+                    stack.append((node, name))
+                    node = _Node()
+                else:
+                    node.contents[sys.intern(name)] = None
+                continue
+        key = reader.key(node.first)
+        node.first = False
+        if node.in_contents:
+            if key is None:
+                node.in_contents = False
+            elif reader.peek() == '{':
+                reader.expect('{')
+                stack.append((node, key))
+                node = _Node()
+            else:
+                node.contents[sys.intern(key)] = reader.value()
+        elif key is None:
+            tree = cls(node.contents, node.metadata)
+            if not stack:
+                return tree
+            node, name = stack.pop()
+            node.contents[sys.intern(name)] = tree
+        elif key == 'contents':
+            reader.expect('{')
+            node.in_contents = True
+            node.first = True
+        elif key == 'metadata':
+            node.metadata = reader.value()
+        else:
+            reader.value()
+
+
+class _Reader:
+
+    """Incremental reading of JSON tokens from a file."""
+
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = None
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+        self.json_decoder = json.JSONDecoder()
+
+    def fill(self):
+        """Read another chunk, dropping what's been consumed."""
+        chunk = self.fp.read(self.chunk_size)
+        self.eof = not chunk
+        if isinstance(chunk, bytes):
+            if self.decoder is None:
+                self.decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = self.decoder.decode(chunk, final=self.eof)
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """The next character which isn't whitespace, or '' at the end."""
+        while True:
+            while self.pos < len(self.text) and (
+                    self.text[self.pos] in WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.text) or self.eof:
+                return self.text[self.pos:self.pos + 1]
+            self.fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            self.fail('Expecting {!r}'.format(char))
+        self.pos += 1
+
+    def simple_entry(self, first):
+        """
+        Read the next entry in a directory's contents as far as its value,
+        if it's a simple one (see SIMPLE_ENTRY) which has been read in full,
+        returning its name and whether it's a directory; otherwise, None.
+        """
+        match = SIMPLE_ENTRY.match(self.text, self.pos)
+        if match is None or bool(match.group(1)) == first:
+            return None
+        self.pos = match.end()
+        return match.group(2), match.group(3) == '{'
+
+    def key(self, first):
+        """
+        Read the next key in an object, and the colon after it, or its
+        closing brace (returning None).
+        """
+        if self.peek() == '}':
+            self.pos += 1
+            return None
+        if not first:
+            self.expect(',')
+        if self.peek() != '"':
+            self.fail('Expecting property name enclosed in double quotes')
+        key = self.decode(
+            lambda: json.decoder.scanstring(self.text, self.pos + 1))
+        self.expect(':')
+        return key
+
+    def value(self):
+        """Read any JSON value."""
+        self.peek()
+        return self.decode(
+            lambda: self.json_decoder.raw_decode(self.text, self.pos))
+
+    def decode(self, decode):
+        """
+        Decode something with a function returning it and where it ends,
+        reading more until it's not cut off by the end of what's been read.
+        """
+        while True:
+            try:
+                result, end = decode()
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return result
+            self.fill()
+
+    def fail(self, message):
+        raise json.JSONDecodeError(message, self.text, self.pos)
@@ -0,0 +1,448 @@
+"""
+An FSTree which keeps itself up to date, using Linux's inotify.
+
+LiveFSTree walks its tree once, as FSTree.at_path() does, watching every
+directory it finds; a background thread then reads inotify events, batching
+up bursts of them, and brings the affected directories up to date.  Readers
+take snapshots, which are plain FSTree objects unaffected by later updates.
+
+The tree's directories are never changed in place: updating one replaces it,
+and the directories above it, with copies (see FSTree.with_item()), so
+snapshots share everything which hasn't changed, with each other and with
+the live tree, and many snapshots take memory in proportion to how much
+changed between them rather than to the size of the tree.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+from . import walk
+from .base import FSTree, get_path_resolver
+from .ignores import IgnoreScopes
+
+
+# From <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+    IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class LiveFSTree:
+
+    """
+    An FSTree which keeps itself up to date as the filesystem changes.
+
+    The tree is kept as FSTree.at_path() would find it, with the same
+    valid_roots and ignores semantics, with one difference: where there are
+    several routes to the same real path, the first one found is kept, which
+    isn't necessarily the lexicographically first.  If it's later removed,
+    the others are looked at again.
+
+    Directories which can't be listed are treated as empty.
+
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, top, valid_roots, ignores=None, latency=0.05,
+                 max_latency=1.0):
+        """
+        :param top, valid_roots, ignores: As for FSTree.at_path().
+
+        :param latency: How long to wait for further events, after an event
+        arrives, before applying them; bursts of events are applied together.
+
+        :param max_latency: The longest to keep waiting for a burst of events
+        to end before applying them anyway.
+        """
+        self.top = top
+        self.latency = latency
+        self.max_latency = max_latency
+        self._ignores = ignores
+        self._ignore_scopes = IgnoreScopes(ignores) if ignores else None
+        self._get_real_path = get_path_resolver(valid_roots)
+        self._lister = None
+        self._lock = threading.Lock()
+        self._inotify = _Inotify()
+        self._stop_r, self._stop_w = os.pipe()
+        # The tree, including empty directories (which aren't in snapshots).
+        self._tree = FSTree({})
+        # Directories of the tree without their empty directories, as
+        # (directory, pruned) pairs by id(directory), to share between
+        # snapshots.
+        self._pruned = {}
+        # Real paths claimed by the tree.
+        self._seen = set()
+        # Real paths of links in the tree, by relative path.
+        self._links = {}
+        # Relative paths skipped because their real paths had been seen.
+        self._shadows = {}
+        # Watched directories: (real_path, wd) by relative path, and the set
+        # of relative paths by wd (several, if links lead to the same
+        # directory, as inotify gives each directory one watch).
+        self._dirs = {}
+        self._wds = {}
+        with self._lock:
+            self._walk_top()
+        self._thread = threading.Thread(
+            target=self._run, name='LiveFSTree({})'.format(top), daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop watching the tree."""
+        if self._thread is not None:
+            os.write(self._stop_w, b'x')
+            self._thread.join()
+            self._thread = None
+            self._inotify.close()
+            os.close(self._stop_r)
+            os.close(self._stop_w)
+
+    def snapshot(self):
+        """
+        Return the tree as it is now, as an FSTree.
+
+        Snapshots share whatever's unchanged between them, so they're quick
+        to take and cheap to keep, but mustn't be changed in place; derive
+        changed trees with FSTree.with_item() and so on instead.
+        """
+        with self._lock:
+            return _without_empty_dirs(self._tree, self._pruned)
+
+    # Walking
+
+    def _walk_top(self):
+        """(Re)build the whole tree."""
+        self._lister = walk.Lister(self._ignore_scopes, self._get_real_path)
+        for wd in self._wds:
+            self._inotify.remove_watch(wd)
+        self._seen.clear()
+        self._links.clear()
+        self._shadows.clear()
+        self._dirs.clear()
+        self._wds.clear()
+        self._pruned.clear()
+        self._tree = FSTree({})
+        if self._ignores and self._ignores.match_file(self.top):
+            return
+        real_top = self._get_real_path(self.top)
+        if real_top:
+            self._tree = self._walk_dir('', real_top)
+
+    def _walk_dir(self, rel_path, real_path):
+        """Watch and walk a directory, returning its tree."""
+        path = self._path(rel_path)
+        try:
+            wd = self._inotify.add_watch(path, WATCH_MASK)
+        except OSError:
+            return FSTree({})
+        self._dirs[rel_path] = (real_path, wd)
+        self._wds.setdefault(wd, set()).add(rel_path)
+        contents = {}
+        for entry in self._list(path, real_path, rel_path):
+            self._add(contents, entry)
+        return FSTree(contents)
+
+    def _list(self, path, real_path, rel_path):
+        """List a directory, or give nothing if it can't be listed."""
+        try:
+            return self._lister.list(path, real_path, rel_path)
+        except OSError:
+            return []
+
+    def _add(self, contents, entry):
+        """Add some entry to its directory's contents, if it's not seen."""
+        if entry.real_path in self._seen:
+            self._shadows.setdefault(entry.real_path, set()).add(
+                entry.rel_path)
+            return
+        self._seen.add(entry.real_path)
+        if entry.real_path != self._implied_real_path(entry.rel_path):
+            self._links[entry.rel_path] = entry.real_path
+        if entry.is_dir:
+            contents[entry.name] = self._walk_dir(
+                entry.rel_path, entry.real_path)
+        else:
+            contents[entry.name] = None
+
+    def _remove(self, contents, rel_path, released):
+        """
+        Remove some entry from its directory's contents, releasing its real
+        path and those of everything in it.
+        """
+        value = contents.pop(os.path.basename(rel_path))
+        self._release(rel_path, value, released)
+
+    def _release(self, rel_path, value, released):
+        """
+        Release the real path of something removed from the tree, and those
+        of everything in it, leaving it (perhaps in snapshots) as it was.
+        """
+        real_path = self._real_path(rel_path)
+        self._links.pop(rel_path, None)
+        self._seen.discard(real_path)
+        released.add(real_path)
+        if isinstance(value, FSTree):
+            self._pruned.pop(id(value), None)
+            for child, child_value in value.contents.items():
+                self._release(
+                    os.path.join(rel_path, child), child_value, released)
+            if rel_path in self._dirs:
+                _, wd = self._dirs.pop(rel_path)
+                rel_paths = self._wds[wd]
+                rel_paths.discard(rel_path)
+                if not rel_paths:
+                    # Its last route out of the tree.
+                    del self._wds[wd]
+                    self._inotify.remove_watch(wd)
+
+    # Updating
+
+    def _run(self):
+        """Read and apply events until told to stop."""
+        poll = select.poll()
+        poll.register(self._inotify.fd, select.POLLIN)
+        poll.register(self._stop_r, select.POLLIN)
+        while True:
+            ready = dict(poll.poll())
+            if self._stop_r in ready:
+                return
+            events = self._inotify.read()
+            started = time.monotonic()
+            while time.monotonic() - started < self.max_latency:
+                more = dict(poll.poll(self.latency * 1000))
+                if self._stop_r in more:
+                    return
+                if not more:
+                    break
+                events.extend(self._inotify.read())
+            with self._lock:
+                self._apply(events)
+
+    def _apply(self, events):
+        """Bring the tree up to date given a batch of events."""
+        # Links may have changed since last time, so forget about them.
+        self._lister = walk.Lister(self._ignore_scopes, self._get_real_path)
+        dirty = set()
+        reload = set()
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; start again.
+                self._walk_top()
+                return
+            for rel_path in self._wds.get(wd, ()):
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    if not rel_path:
+                        self._walk_top()
+                        return
+                    dirty.add(os.path.dirname(rel_path))
+                    # Something else of the same name may be there by the
+                    # time it's listed (e.g. rm -r build && mkdir build), so
+                    # drop this one whatever, and walk what's there afresh.
+                    reload.add(rel_path)
+                elif name:
+                    dirty.add(rel_path)
+                    if mask & IN_ATTRIB:
+                        # Might have become (un)readable, so look at it
+                        # afresh.
+                        reload.add(os.path.join(rel_path, name))
+        while dirty:
+            dirty = self._refresh(dirty, reload)
+            reload = set()
+
+    def _refresh(self, dirty, reload):
+        """
+        List some directories again and update the tree to match.
+
+        All removals happen before any additions, so that a directory moved
+        within the tree stays watched.
+
+        :return dirty: directories needing refreshing again, because an entry
+        they skipped as seen might now be free.
+        """
+        listings = []
+        released = set()
+        for rel_path in sorted(dirty):
+            if rel_path not in self._dirs:
+                # Gone already.
+                continue
+            real_path, _ = self._dirs[rel_path]
+            contents = dict(self._node(rel_path).contents)
+            entries = self._list(self._path(rel_path), real_path, rel_path)
+            names = {entry.name: entry for entry in entries}
+            removed = False
+            for name in list(contents):
+                item_rel_path = os.path.join(rel_path, name)
+                entry = names.get(name)
+                if (
+                    entry is None or
+                    item_rel_path in reload or
+                    entry.is_dir != isinstance(contents[name], FSTree) or
+                    entry.real_path != self._real_path(item_rel_path)
+                ):
+                    self._remove(contents, item_rel_path, released)
+                    removed = True
+            if removed:
+                self._replace(rel_path, contents)
+            listings.append((rel_path, entries))
+        for rel_path, entries in listings:
+            if rel_path not in self._dirs:
+                continue
+            contents = dict(self._node(rel_path).contents)
+            added = False
+            for entry in entries:
+                if entry.name not in contents:
+                    self._add(contents, entry)
+                    added = True
+            if added:
+                # Keep them in name order, as FSTree.at_path() does.
+                self._replace(rel_path, {
+                    name: contents[name] for name in sorted(contents)})
+        dirty = set()
+        for real_path in released:
+            for rel_path in self._shadows.pop(real_path, ()):
+                dirty.add(os.path.dirname(rel_path))
+        return dirty
+
+    # Helpers
+
+    def _path(self, rel_path):
+        """Path to something in the tree, given its relative path."""
+        return os.path.join(self.top, rel_path) if rel_path else self.top
+
+    def _node(self, rel_path):
+        """The FSTree for some directory in the tree."""
+        node = self._tree
+        for name in rel_path.split(os.sep) if rel_path else ():
+            node = node[name]
+        return node
+
+    def _replace(self, rel_path, contents):
+        """
+        Replace some directory in the tree with one with new contents,
+        copying the directories above it rather than changing them.
+        """
+        node = self._tree
+        self._pruned.pop(id(node), None)
+        for name in rel_path.split(os.sep) if rel_path else ():
+            node = node[name]
+            self._pruned.pop(id(node), None)
+        if rel_path:
+            self._tree = self._tree.with_item(rel_path, FSTree(contents))
+        else:
+            self._tree = FSTree(contents)
+
+    def _implied_real_path(self, rel_path):
+        """Real path of something in the tree if it's not a link."""
+        parent_real_path, _ = self._dirs[os.path.dirname(rel_path)]
+        return os.path.join(parent_real_path, os.path.basename(rel_path))
+
+    def _real_path(self, rel_path):
+        """Real path of something in the tree."""
+        return self._links.get(rel_path) or self._implied_real_path(rel_path)
+
+
+class _Inotify:
+
+    """Minimal wrapper around an inotify instance, via ctypes."""
+
+    _libc = None
+
+    def __init__(self):
+        if _Inotify._libc is None:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            if not hasattr(libc, 'inotify_init1'):
+                raise OSError('inotify is not available')
+            libc.inotify_add_watch.argtypes = (
+                ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+            libc.inotify_rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+            _Inotify._libc = libc
+        self.fd = self._check(
+            self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+    def add_watch(self, path, mask):
+        return self._check(
+            self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask))
+
+    def remove_watch(self, wd):
+        # Fails if the watch has already gone with its directory; fine.
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        """Read pending events, as (wd, mask, name) tuples."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+    @staticmethod
+    def _check(result):
+        if result < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return result
+
+
+def _without_empty_dirs(tree, pruned):
+    """
+    Copy an FSTree, dropping directories with nothing in them, sharing any
+    directories which have none with the original.
+
+    :param pruned: dictionary of previous results, as (directory, result)
+    pairs by id(directory), to reuse and add to.
+    """
+    cached = pruned.get(id(tree))
+    if cached is not None:
+        return cached[1]
+    contents = {}
+    unchanged = True
+    for name, value in tree.contents.items():
+        if isinstance(value, FSTree):
+            kept = _without_empty_dirs(value, pruned)
+            if not kept:
+                unchanged = False
+                continue
+            unchanged = unchanged and kept is value
+            value = kept
+        contents[name] = value
+    result = tree if unchanged else FSTree(contents, tree.metadata)
+    pruned[id(tree)] = (tree, result)
+    return result
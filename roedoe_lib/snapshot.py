@@ -0,0 +1,266 @@
+"""
+A binary on-disk format for FSTrees, which is read lazily via mmap.
+
+Loading a tree from JSON means parsing the whole document and building every
+node before anything can be looked up.  A snapshot instead keeps each
+directory as a record which can be read on its own, and is mmapped, so that
+opening one and looking up a path reads just the records along that path
+(and so just the pages of the file they're in).
+
+The format (all integers little-endian):
+
+* a header: the magic bytes MAGIC, the format version (VERSION), and the
+  offset of the top directory's record;
+* a record per distinct directory (identical directories, with the same
+  metadata, encoded the same, share one), each written after those of its
+  subdirectories:
+  its number of entries, the length of its metadata and of its names, then
+  its metadata (as JSON, or nothing for None), a table of its entries and
+  the names themselves; each entry in the table gives where its name is in
+  the names, the name's length, and the offset of the subdirectory's record
+  (or 0 for a file).
+
+Entries are in order of their names (as encoded by os.fsencode()), so each
+lookup is a binary search of the table.  SnapshotContents is the mapping
+FSTree nodes read from a snapshot have as contents; it makes the nodes for
+subdirectories the first time they're needed.  Snapshots are read-only.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+from .diff import DIGEST_SIZE
+
+
+MAGIC = b'RDSNAP\r\n'
+VERSION = 1
+
+HEADER = struct.Struct('<8sIQ')
+RECORD = struct.Struct('<III')
+ENTRY = struct.Struct('<IIQ')
+
+
+def write_snapshot(tree, path):
+    """
+    Write an FSTree to a snapshot file.
+
+    :param tree: the FSTree.
+    :param path: path of the file to write.
+    """
+
+    # Offsets of the records written so far, by a digest of the record, so
+    # that identical directories are written once, and share a record; and
+    # by id(node), so that a directory which is the same object as one
+    # already written (as in deduped trees) isn't looked into again.  Trees'
+    # own digests won't do, as equal trees' metadata may differ in ways JSON
+    # keeps: 1 and True, say.
+    written = {}
+    nodes = {}
+    with open(path, 'wb') as snapshot:
+        snapshot.write(HEADER.pack(MAGIC, VERSION, 0))
+        # Directories are written after their subdirectories, without
+        # recursion: a stack of directories' (name, node, remaining (name,
+        # value) pairs, (name, offset) pairs so far).
+        stack = [(None, tree, _sorted_items(tree), [])]
+        while stack:
+            name, node, items, entries = stack[-1]
+            item = next(items, None)
+            if item is None:
+                stack.pop()
+                record = _record(node.metadata, entries)
+                key = hashlib.blake2b(
+                    record, digest_size=DIGEST_SIZE).digest()
+                offset = written.get(key)
+                if offset is None:
+                    offset = written[key] = snapshot.tell()
+                    snapshot.write(record)
+                nodes[id(node)] = offset
+                if stack:
+                    stack[-1][3].append((name, offset))
+            elif item[1] is None:
+                entries.append((item[0], 0))
+            elif id(item[1]) in nodes:
+                entries.append((item[0], nodes[id(item[1])]))
+            else:
+                stack.append(
+                    (item[0], item[1], _sorted_items(item[1]), []))
+        snapshot.seek(0)
+        snapshot.write(HEADER.pack(MAGIC, VERSION, offset))
+
+
+def read_snapshot(path, cls):
+    """
+    Open a snapshot file.
+
+    :param path: path of the file.
+    :param cls: FSTree class to make nodes of.
+
+    :return tree: the top of the tree, whose nodes are made as they're
+    needed.
+    """
+    with open(path, 'rb') as snapshot:
+        try:
+            buffer = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped.
+            buffer = b''
+    if len(buffer) < HEADER.size:
+        raise ValueError('Not an FSTree snapshot: {}'.format(path))
+    magic, version, offset = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError('Not an FSTree snapshot: {}'.format(path))
+    if version != VERSION:
+        raise ValueError(
+            'Unsupported FSTree snapshot version {}: {}'.format(version, path))
+    return _node(buffer, offset, cls)
+
+
+class SnapshotContents(Mapping):
+
+    """
+    Contents of a directory in a snapshot.
+
+    Iteration is in order of the encoded names.  Nodes for subdirectories are
+    made the first time they're needed, then kept.
+    """
+
+    __slots__ = ('buffer', 'cls', 'count', 'entries', 'names', 'children')
+
+    def __init__(self, buffer, offset, cls):
+        """
+        :param buffer: the mmapped snapshot.
+        :param offset: offset of the directory's record.
+        :param cls: FSTree class to make nodes of.
+        """
+        self.buffer = buffer
+        self.cls = cls
+        self.count, metadata_length, _ = RECORD.unpack_from(buffer, offset)
+        self.entries = offset + RECORD.size + metadata_length
+        self.names = self.entries + self.count * ENTRY.size
+        self.children = {}
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __reduce__(self):
+        return dict, (list(self.items()),)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield os.fsdecode(self._name(index))
+
+    def __contains__(self, name):
+        return self._index(name) is not None
+
+    def __getitem__(self, name):
+        index = self._index(name)
+        if index is None:
+            raise KeyError(name)
+        return self._value(index)
+
+    def items(self):
+        return SnapshotItemsView(self)
+
+    def _entry(self, index):
+        return ENTRY.unpack_from(
+            self.buffer, self.entries + index * ENTRY.size)
+
+    def _name(self, index):
+        start, length, _ = self._entry(index)
+        start += self.names
+        return self.buffer[start:start + length]
+
+    def _value(self, index):
+        child = self.children.get(index)
+        if child is None:
+            offset = self._entry(index)[2]
+            if not offset:
+                return None
+            child = self.children[index] = _node(self.buffer, offset, self.cls)
+        return child
+
+    def _index(self, name):
+        """Index of some name, or None if it's not there."""
+        if not isinstance(name, str):
+            return None
+        key = os.fsencode(name)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._name(low) == key:
+            return low
+        return None
+
+
+class SnapshotItemsView:
+
+    """Items of a SnapshotContents; quicker than the generic ItemsView."""
+
+    __slots__ = ('contents',)
+
+    def __init__(self, contents):
+        self.contents = contents
+
+    def __len__(self):
+        return self.contents.count
+
+    def __iter__(self):
+        contents = self.contents
+        for index in range(contents.count):
+            yield os.fsdecode(contents._name(index)), contents._value(index)
+
+    def __contains__(self, item):
+        name, value = item
+        index = self.contents._index(name)
+        if index is None:
+            return False
+        found = self.contents._value(index)
+        if found is None or value is None:
+            return found is value
+        return found == value
+
+
+def _node(buffer, offset, cls):
+    """Make the node for the directory whose record is at some offset."""
+    _, metadata_length, _ = RECORD.unpack_from(buffer, offset)
+    metadata = None
+    if metadata_length:
+        start = offset + RECORD.size
+        metadata = json.loads(
+            bytes(buffer[start:start + metadata_length]).decode('utf-8'))
+    return cls(SnapshotContents(buffer, offset, cls), metadata)
+
+
+def _sorted_items(tree):
+    """A directory's (encoded name, value) pairs, in order."""
+    return iter(sorted(
+        (os.fsencode(name), value) for name, value in tree.contents.items()))
+
+
+def _record(metadata, entries):
+    """The record of a directory, given its (encoded name, offset) pairs."""
+    if metadata is None:
+        metadata = b''
+    else:
+        metadata = json.dumps(metadata).encode('utf-8')
+    table = []
+    names = []
+    position = 0
+    for name, offset in entries:
+        table.append(ENTRY.pack(position, len(name), offset))
+        names.append(name)
+        position += len(name)
+    return b''.join(
+        [RECORD.pack(len(entries), len(metadata), position), metadata] +
+        table + names)
@@ -0,0 +1,48 @@
+"""
+Bottom-up traversal of FSTrees, for values of directories (digests,
+aggregates) which follow from those of their subdirectories.
+
+The values are cached on each node by the caller, so bottom_up() only visits
+directories without an up to date one, and works out each directory's value
+after those of everything in it, without recursion.
+"""
+
+
+def bottom_up(tree, is_current, store, combine):
+
+    """
+    Work out some value of a directory and everything in it, without
+    recursion.
+
+    :param tree: the FSTree.
+    :param is_current: function returning a node's value if it already has
+    an up to date one, or else None.
+    :param store: function to call with each node and its new value.
+    :param combine: function of a node, returning its value; it's called
+    once the values of all the node's subdirectories are stored, so can get
+    them with is_current.
+
+    :return value: the tree's value.
+    """
+
+    value = is_current(tree)
+    if value is not None:
+        return value
+    # Nodes in pre-order, so that reversed, everything's after what's in it.
+    order = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(
+            value for _, value in node.contents.items()
+            if is_dir(value) and is_current(value) is None
+        )
+    for node in reversed(order):
+        store(node, combine(node))
+    return is_current(tree)
+
+
+def is_dir(value):
+    """Is something in an FSTree's contents a directory?"""
+    return hasattr(value, 'contents')
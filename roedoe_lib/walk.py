@@ -0,0 +1,1018 @@
+"""
+Machinery for walking directory trees on disk, used by FSTree.at_path().
+
+Directories are listed with os.scandir(), so each entry's type comes from the
+information cached on its DirEntry rather than from separate stat calls.  Real
+paths are only resolved for entries which are actually symlinks; for anything
+else the real path is just the real path of the containing directory plus the
+entry's name.
+
+Listing can optionally happen on a thread pool, ahead of the walk itself; the
+walk still visits directories in the same order, and only the walking thread
+ever looks at or updates the set of real paths seen so far, so the results are
+the same as for a single-threaded walk.
+
+Alternatively, the directories at the top of the tree can be walked in
+separate processes (see sharded_walk()), with the results stitched together
+afterwards in such a way that the outcome is again the same.
+
+Stat fields (sizes, mtimes, ...) can be recorded in the metadata of the tree
+built, as directories are listed; see dir_metadata().  They come from the
+DirEntry objects listing yields anyway, so this takes no second walk.
+
+Walks can be limited in depth, in the number of entries taken and in time
+(see Limits); directories the walk didn't finish are kept, marked as
+truncated in their metadata, so that they can be walked later.
+
+iter_walk() walks in the same way, but yields what it finds as it goes,
+rather than building an FSTree.
+
+For use in asyncio programs, async_walk() does the same as walk(), but awaits
+listings done on an executor, so the event loop is free in between.
+
+Finally, rescan() walks a tree again given the result of a previous walk,
+only listing directories which have changed since.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import operator
+import os
+import sys
+import time
+
+from .ignores import IgnoreScopes, is_ignored
+
+
+Entry = collections.namedtuple(
+    'Entry', ('name', 'path', 'rel_path', 'real_path', 'is_dir', 'stats'))
+Entry.__doc__ = """
+A file or directory found while listing a directory; stats is a dictionary of
+its stat fields, if any were asked for, otherwise None.
+"""
+
+# Stat fields walks can record in metadata, and the attributes of
+# os.stat_result they come from.
+STAT_FIELDS = {
+    'size': 'st_size',
+    'mtime_ns': 'st_mtime_ns',
+    'mode': 'st_mode',
+    'inode': 'st_ino',
+    'dev': 'st_dev',
+}
+
+
+def list_dir(path, real_path, rel_path, ignores, get_real_path,
+             stat_fields=()):
+
+    """
+    List the files and directories in some directory.
+
+    :param path: path to the directory, as reached by the walk.
+    :param real_path: real path of the directory.
+    :param rel_path: path of the directory relative to the top of the walk
+    ('' for the top itself).
+    :param ignores: optional ignores.IgnoreScopes, for a pathspec.PathSpec
+    specifying paths (relative to the top of the walk) to ignore and/or ignore
+    files to read.
+    :param get_real_path: a PathResolver, giving real paths of things if
+    they're under a valid root; see get_path_resolver().
+    :param stat_fields: optional tuple of names of stat fields (see
+    STAT_FIELDS) to record for each entry, following symlinks.
+
+    :return entries: a list of Entry tuples, in name order, for the files and
+    directories which are neither ignored nor outside the valid roots.
+    """
+
+    ignored = layered_scope = None
+    if ignores:
+        scope = ignores.scope(rel_path, path)
+        if scope.pruned:
+            # Everything in it would be ignored, so don't even look.
+            return []
+        if scope.layers is not None:
+            # Reading ignore files, so whether something's a directory
+            # matters; check once that's known.
+            layered_scope = scope
+        elif scope.spec:
+            ignored = scope.spec.match_file
+
+    with os.scandir(path) as dir_entries:
+        dir_entries = sorted(dir_entries, key=operator.attrgetter('name'))
+    rel_prefix = os.path.join(rel_path, '')
+    real_prefix = os.path.join(real_path, '')
+    entries = []
+    for dir_entry in dir_entries:
+        # Interned, as the same names turn up again and again in big trees.
+        name = sys.intern(dir_entry.name)
+        item_rel_path = rel_prefix + name
+        if ignored and ignored(item_rel_path):
+            continue
+        if dir_entry.is_symlink():
+            item_real_path = get_real_path.child(real_path, name)
+            if not item_real_path:
+                # Disallowed destination; skip it
+                continue
+        else:
+            # Not a link, so its real path follows from its directory's, and
+            # it's under a valid root if its directory is.
+            item_real_path = real_prefix + name
+        if _is_dir(dir_entry):
+            is_dir = True
+        elif _is_file(dir_entry):
+            is_dir = False
+        else:
+            # Broken link, socket, etc.
+            continue
+        if layered_scope and is_ignored(layered_scope, item_rel_path, is_dir):
+            continue
+        stats = None
+        if stat_fields:
+            try:
+                stats = entry_stats(dir_entry, stat_fields)
+            except OSError:
+                # Gone since it was listed.
+                continue
+        entries.append(Entry(
+            name, dir_entry.path, item_rel_path, item_real_path, is_dir,
+            stats))
+    return entries
+
+
+def check_stat_fields(stat_fields):
+    """
+    Check some names of stat fields are all in STAT_FIELDS, raising
+    ValueError if not.
+
+    :return stat_fields: the names as a sorted tuple (empty if there are
+    none).
+    """
+    stat_fields = tuple(sorted(set(stat_fields or ())))
+    unknown = [field for field in stat_fields if field not in STAT_FIELDS]
+    if unknown:
+        raise ValueError('Unknown stat fields: {}'.format(', '.join(unknown)))
+    return stat_fields
+
+
+def entry_stats(dir_entry, stat_fields):
+    """
+    Get stat fields of a DirEntry, following symlinks, as a dictionary.
+
+    DirEntry caches its stat result (which checking whether a link is a
+    directory has usually fetched already), and knows its own inode without
+    one, so this costs at most one stat call per entry, and none if only
+    the inode of something other than a link is wanted.
+    """
+    if stat_fields == ('inode',) and not dir_entry.is_symlink():
+        return {'inode': dir_entry.inode()}
+    st = dir_entry.stat()
+    return {field: getattr(st, STAT_FIELDS[field]) for field in stat_fields}
+
+
+def path_stats(path, stat_fields):
+    """Like entry_stats(), but for a path; None if no fields are wanted."""
+    if not stat_fields:
+        return None
+    st = os.stat(path)
+    return {field: getattr(st, STAT_FIELDS[field]) for field in stat_fields}
+
+
+def dir_metadata(stats, file_stats):
+    """
+    Metadata for a directory walked recording stat fields: its own, along
+    with a dictionary of those of the files in it, by name, under 'files'.
+    None if stat fields aren't being recorded.
+    """
+    if stats is None:
+        return None
+    metadata = dict(stats)
+    if file_stats:
+        metadata['files'] = file_stats
+    return metadata
+
+
+def walk(cls, top, real_top, ignores, get_real_path, workers=None,
+         stat_fields=(), limits=None, rel_path='', seen=None):
+
+    """
+    Walk a directory tree, building an FSTree.
+
+    Files and directories are visited in name order, depth first; anything
+    whose real path has already been seen is skipped, so cycles and repeated
+    links are resolved lexicographically.  Directories which turn out to be
+    empty are dropped.
+
+    :param cls: FSTree class to build.
+    :param top: path to top of directory tree to walk.
+    :param real_top: real path of top.
+    :param ignores: as for Lister.
+    :param get_real_path: as for list_dir().
+    :param workers: optional number of threads to list directories with.
+    :param stat_fields: optional tuple of names of stat fields to record, as
+    checked by check_stat_fields(); see dir_metadata() for where they go.
+    :param limits: optional Limits on the walk.
+    :param rel_path: path of top relative to the top of the tree it's in, if
+    it's not the top itself, for ignores.
+    :param seen: optional set of real paths already seen, if walking just
+    part of a tree.
+
+    :rvalue tree: An FSTree object.
+    """
+
+    stats = path_stats(top, stat_fields)
+    if seen is None:
+        seen = set()
+    if not workers:
+        lister = Lister(ignores, get_real_path, stat_fields)
+        return walk_dir(
+            cls, top, real_top, rel_path, lister, seen, stats, limits)
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        lister = PrefetchingLister(
+            ignores, get_real_path, pool, workers * PREFETCH_PER_WORKER,
+            stat_fields)
+        try:
+            return walk_dir(
+                cls, top, real_top, rel_path, lister, seen, stats, limits)
+        finally:
+            lister.cancel()
+
+
+class Limits:
+
+    """
+    Limits on how much of a tree a walk takes in.
+
+    Directories deeper than max_depth aren't listed.  Once max_entries files
+    and directories have been taken into the tree, or the deadline has
+    passed, nothing more is; the walk then finishes straight away.  Every
+    directory which was cut short like this is marked as truncated (see
+    truncated_metadata()) and kept, even if nothing was found in it.
+    """
+
+    def __init__(self, max_depth=None, max_entries=None, deadline=None):
+        """
+        :param max_depth: optional depth of the deepest directories to list,
+        the top of the walk being at depth 0 (so 0 lists nothing, and 1 just
+        the top).
+        :param max_entries: optional number of entries to take at most.
+        :param deadline: optional time.monotonic() value to stop by.
+        """
+        self.max_depth = max_depth
+        self.max_entries = max_entries
+        self.deadline = deadline
+        self.entries = 0
+        self.exhausted = False
+
+    def allows(self, depth):
+        """Check whether a directory at some depth may be listed."""
+        if self.max_depth is not None and depth >= self.max_depth:
+            return False
+        return self.available()
+
+    def available(self):
+        """Check (once and for all, if not) that there's budget left."""
+        if not self.exhausted:
+            self.exhausted = (
+                self.max_entries is not None and
+                self.entries >= self.max_entries
+            ) or (
+                self.deadline is not None and
+                time.monotonic() >= self.deadline
+            )
+        return not self.exhausted
+
+    def take(self):
+        """Take an entry, if there's budget left, returning whether so."""
+        if not self.available():
+            return False
+        self.entries += 1
+        return True
+
+
+def truncated_metadata(metadata):
+    """
+    Mark a directory's metadata (a dictionary or None) as truncated: the
+    walk didn't take in all of its contents.
+    """
+    return dict(metadata or {}, truncated=True)
+
+
+def is_truncated(tree):
+    """Check whether a directory was truncated by a walk."""
+    return isinstance(tree.metadata, dict) and bool(
+        tree.metadata.get('truncated'))
+
+
+def iter_walk(top, real_top, ignores, get_real_path, workers=None):
+
+    """
+    Walk a directory tree like walk(), but yielding what's found as it goes.
+
+    Directories are yielded just before the first thing found in them, so
+    those walk() would drop as empty never are, and the paths yielded are
+    exactly those in the tree walk() would build, in pre-order.  Apart from
+    the set of real paths seen so far, memory is proportional to the depth
+    of the tree rather than its size.  Closing the generator early stops the
+    walk, cancelling any outstanding listings.
+
+    :param top, real_top, ignores, get_real_path, workers: as for walk().
+
+    :return paths: a generator of (rel_path, is_dir) pairs.
+    """
+
+    if not workers:
+        yield from iter_walk_dir(
+            top, real_top, Lister(ignores, get_real_path), set())
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        lister = PrefetchingLister(
+            ignores, get_real_path, pool, workers * PREFETCH_PER_WORKER)
+        try:
+            yield from iter_walk_dir(top, real_top, lister, set())
+        finally:
+            lister.cancel()
+
+
+def iter_walk_dir(path, real_path, lister, seen):
+
+    """
+    Walk a directory for iter_walk(), listing directories with lister,
+    without recursion.
+    """
+
+    # Entries left in each directory being walked, and those directories
+    # (the innermost ones) which haven't been yielded yet, as nothing's been
+    # found in them yet.
+    stack = [iter(lister.list(path, real_path, ''))]
+    pending = []
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            if pending:
+                # It was empty after all.
+                pending.pop()
+            continue
+        if entry.real_path in seen:
+            if entry.is_dir:
+                lister.discard(entry)
+            continue
+        seen.add(entry.real_path)
+        if entry.is_dir:
+            pending.append(entry.rel_path)
+            stack.append(iter(
+                lister.list(entry.path, entry.real_path, entry.rel_path)))
+            continue
+        for rel_path in pending:
+            yield rel_path, True
+        del pending[:]
+        yield entry.rel_path, False
+
+
+# How many directory listings each worker thread may have queued or done but
+# not yet consumed by the walk.
+PREFETCH_PER_WORKER = 4
+
+
+class Lister:
+
+    """Lists directories for a walk, as they're reached."""
+
+    def __init__(self, ignores, get_real_path, stat_fields=()):
+        """
+        :param ignores: optional pathspec.PathSpec specifying paths (relative
+        to the top of the walk) to ignore, or an ignores.IgnoreScopes.
+        :param get_real_path: as for list_dir(); symlinks found are cached
+        for the Lister's lifetime, so it should be used for just one walk.
+        :param stat_fields: as for list_dir().
+        """
+        if ignores and not isinstance(ignores, IgnoreScopes):
+            ignores = IgnoreScopes(ignores)
+        self.ignores = ignores or None
+        self.get_real_path = get_real_path.caching()
+        self.stat_fields = stat_fields
+
+    def list(self, path, real_path, rel_path):
+        """List some directory; see list_dir()."""
+        return list_dir(
+            path, real_path, rel_path, self.ignores, self.get_real_path,
+            self.stat_fields)
+
+    def discard(self, entry):
+        """Note that the walk won't be listing some directory after all."""
+
+
+class PrefetchingLister(Lister):
+
+    """
+    Lists directories on a thread pool, ahead of the walk.
+
+    Whenever a directory is listed, its subdirectories are queued for listing
+    too, so that by the time the walk gets to them their listings are ready.
+    At most max_pending listings are queued or waiting to be consumed at any
+    time; directories which don't fit are listed by the walking thread when
+    it reaches them.
+    """
+
+    def __init__(self, ignores, get_real_path, pool, max_pending,
+                 stat_fields=()):
+        super().__init__(ignores, get_real_path, stat_fields)
+        self.pool = pool
+        self.max_pending = max_pending
+        self.pending = {}
+
+    def list(self, path, real_path, rel_path):
+        future = self.pending.pop(rel_path, None)
+        if future is None:
+            entries = super().list(path, real_path, rel_path)
+        else:
+            entries = future.result()
+        for entry in entries:
+            if len(self.pending) >= self.max_pending:
+                break
+            if entry.is_dir:
+                self.pending[entry.rel_path] = self.pool.submit(
+                    super().list, entry.path, entry.real_path, entry.rel_path)
+        return entries
+
+    def discard(self, entry):
+        future = self.pending.pop(entry.rel_path, None)
+        if future is not None:
+            future.cancel()
+
+    def cancel(self):
+        """Cancel all outstanding listings."""
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+
+async def async_walk(cls, top, ignores, get_real_path, concurrency,
+                     executor=None, progress=None, stat_fields=()):
+
+    """
+    Walk a directory tree like walk(), but as a coroutine.
+
+    Directories are listed on an executor, at most concurrency at a time,
+    with subdirectories listed ahead of the walk as in PrefetchingLister.
+    Cancelling the walk cancels any listings which haven't started yet.
+
+    :param cls: FSTree class to build.
+    :param top: path to top of directory tree to walk.
+    :param ignores: as for Lister.
+    :param get_real_path: as for list_dir().
+    :param concurrency: maximum number of directories to list at once.
+    :param executor: optional concurrent.futures.Executor to list directories
+    on; if not given, a thread pool is made for the walk.
+    :param progress: optional function to call after each directory is
+    listed, with the number of directories listed and files found so far.
+    :param stat_fields: as for walk().
+
+    :rvalue tree: An FSTree object.
+    """
+
+    loop = asyncio.get_event_loop()
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ThreadPoolExecutor(concurrency)
+    lister = AsyncLister(
+        Lister(ignores, get_real_path, stat_fields), loop, executor,
+        concurrency, concurrency * PREFETCH_PER_WORKER)
+    seen = set()
+    counts = [0, 0]
+
+    async def recursive_wibwab(path, real_path, rel_path, stats):
+        contents = {}
+        file_stats = {}
+        # Listings done ahead of time don't need waiting for, so make sure
+        # the loop gets a look in between directories regardless.
+        await asyncio.sleep(0)
+        entries = await lister.list(path, real_path, rel_path)
+        counts[0] += 1
+        counts[1] += sum(1 for entry in entries if not entry.is_dir)
+        if progress:
+            progress(*counts)
+        for entry in entries:
+            if entry.real_path in seen:
+                if entry.is_dir:
+                    lister.discard(entry)
+                continue
+            seen.add(entry.real_path)
+            if entry.is_dir:
+                dir_tree = await recursive_wibwab(
+                    entry.path, entry.real_path, entry.rel_path, entry.stats)
+                if dir_tree:
+                    contents[entry.name] = dir_tree
+            else:
+                contents[entry.name] = None
+                if entry.stats is not None:
+                    file_stats[entry.name] = entry.stats
+        return cls(contents, dir_metadata(stats, file_stats))
+
+    try:
+        real_top = await loop.run_in_executor(executor, get_real_path, top)
+        if not real_top:
+            return cls({})
+        stats = await loop.run_in_executor(
+            executor, path_stats, top, stat_fields)
+        return await recursive_wibwab(top, real_top, '', stats)
+    finally:
+        lister.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+class AsyncLister:
+
+    """
+    Lists directories on an executor for async_walk(), ahead of the walk.
+
+    This works like PrefetchingLister, but with asyncio tasks; at most
+    concurrency listings are actually running on the executor at once.
+    """
+
+    def __init__(self, lister, loop, executor, concurrency, max_pending):
+        self.lister = lister
+        self.loop = loop
+        self.executor = executor
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_pending = max_pending
+        self.pending = {}
+
+    async def list_in_executor(self, path, real_path, rel_path):
+        """List some directory on the executor; see list_dir()."""
+        async with self.semaphore:
+            return await self.loop.run_in_executor(
+                self.executor, self.lister.list, path, real_path, rel_path)
+
+    async def list(self, path, real_path, rel_path):
+        """List some directory, starting on its subdirectories too."""
+        task = self.pending.pop(rel_path, None)
+        if task is None:
+            entries = await self.list_in_executor(path, real_path, rel_path)
+        else:
+            entries = await task
+        for entry in entries:
+            if len(self.pending) >= self.max_pending:
+                break
+            if entry.is_dir:
+                self.pending[entry.rel_path] = asyncio.ensure_future(
+                    self.list_in_executor(
+                        entry.path, entry.real_path, entry.rel_path))
+        return entries
+
+    def discard(self, entry):
+        """Note that the walk won't be listing some directory after all."""
+        task = self.pending.pop(entry.rel_path, None)
+        if task is not None:
+            _cancel_task(task)
+
+    def cancel(self):
+        """Cancel all outstanding listings."""
+        for task in self.pending.values():
+            _cancel_task(task)
+        self.pending.clear()
+
+
+def _cancel_task(task):
+    """Cancel an asyncio task whose result is no longer wanted."""
+    task.cancel()
+    # If it had already failed, retrieve the exception so asyncio doesn't
+    # complain that nobody did.
+    task.add_done_callback(
+        lambda task: task.cancelled() or task.exception())
+
+
+def rescan(cls, top, real_top, ignores, get_real_path, previous):
+
+    """
+    Walk a directory tree like walk(), reusing what's unchanged from before.
+
+    Every directory in the returned tree has a metadata dictionary recording
+    its 'mtime_ns' and 'inode', along with what's needed to bring the tree up
+    to date next time without listing it again:
+
+        - 'links': real paths of the directory's contents which are links.
+
+        - 'pruned': metadata (in this same form) of subdirectories which were
+          walked but dropped because there was nothing in them.
+
+        - 'shadowed': real paths of the directory's contents which were
+          skipped because they'd already been seen.
+
+    (These are left out when empty.)  A directory whose mtime and inode match
+    the previous tree's, and whose links still point to the same places, has
+    the same contents as before, so its previous contents are reused rather
+    than listing it again.  Its subdirectories still need checking in turn,
+    as do the real paths of everything reused, as the seen logic applies as
+    usual.  Wherever nothing has changed, the previous FSTree object itself
+    is returned.
+
+    Directories modified within RACY_NS of being walked can't be trusted not
+    to change again without their mtime changing, so they're always listed.
+
+    :param previous: an FSTree returned by rescan() with the same ignores and
+    valid roots, or None to walk everything.
+
+    Other parameters are as for walk().
+    """
+
+    lister = Lister(ignores, get_real_path)
+    seen = set()
+
+    def recursive_wibwab(path, real_path, rel_path, st, previous):
+        metadata = {
+            'mtime_ns': st.st_mtime_ns,
+            'inode': st.st_ino,
+        }
+        if unchanged(path, metadata, previous):
+            items = reused_items(real_path, previous)
+        else:
+            items = listed_items(path, real_path, rel_path, previous)
+        contents = {}
+        links = {}
+        pruned = {}
+        shadowed = {}
+        prefix = os.path.join(path, '')
+        real_prefix = os.path.join(real_path, '')
+        for name, item_real_path, is_dir, item_previous in items:
+            if item_real_path in seen:
+                shadowed[name] = item_real_path
+                continue
+            if is_dir is None:
+                # Previously shadowed, so we don't know what it is.
+                if os.path.isdir(prefix + name):
+                    is_dir = True
+                elif os.path.isfile(prefix + name):
+                    is_dir = False
+                else:
+                    continue
+            if is_dir:
+                try:
+                    item_st = os.stat(prefix + name)
+                except FileNotFoundError:
+                    # Gone since it was listed.
+                    continue
+            seen.add(item_real_path)
+            if item_real_path != real_prefix + name:
+                links[name] = item_real_path
+            if is_dir:
+                dir_tree = recursive_wibwab(
+                    prefix + name, item_real_path,
+                    os.path.join(rel_path, name), item_st, item_previous)
+                if dir_tree:
+                    contents[name] = dir_tree
+                else:
+                    pruned[name] = dir_tree.metadata
+            else:
+                contents[name] = None
+        if time.time() * 1e9 - st.st_mtime_ns < RACY_NS:
+            metadata['racy'] = True
+        for key, value in (
+            ('links', links),
+            ('pruned', pruned),
+            ('shadowed', shadowed),
+        ):
+            if value:
+                metadata[key] = value
+        if (
+            previous is not None and
+            metadata == previous.metadata and
+            list(contents) == list(previous.contents) and
+            all(
+                value is previous.contents[name]
+                for name, value in contents.items()
+            )
+        ):
+            return previous
+        return cls(contents, metadata)
+
+    def unchanged(path, metadata, previous):
+        """Test if a directory is as it was in a previous tree."""
+        if previous is None or not isinstance(previous.metadata, dict):
+            return False
+        if previous.metadata.get('racy'):
+            return False
+        if any(previous.metadata.get(k) != v for k, v in metadata.items()):
+            return False
+        pruned = previous.metadata.get('pruned', {})
+        for name, link_real_path in previous.metadata.get(
+            'links', {}
+        ).items():
+            link_path = os.path.join(path, name)
+            if get_real_path(link_path) != link_real_path:
+                return False
+            # Dangling links still have real paths, so check there's still
+            # something there, of the same kind.
+            if name in pruned or isinstance(previous.contents.get(name), cls):
+                if not os.path.isdir(link_path):
+                    return False
+            elif not os.path.isfile(link_path):
+                return False
+        return True
+
+    def reused_items(real_path, previous):
+        """
+        Contents of an unchanged directory, as (name, real_path, is_dir,
+        previous) tuples in name order, from its previous tree.
+        """
+        links = previous.metadata.get('links', {})
+        real_prefix = os.path.join(real_path, '')
+        items = [
+            (name, isinstance(value, cls), value)
+            for name, value in previous.contents.items()
+        ]
+        items.extend(
+            (name, True, cls({}, metadata))
+            for name, metadata in previous.metadata.get('pruned', {}).items()
+        )
+        items = [
+            (name, links.get(name) or real_prefix + name, is_dir,
+             item_previous)
+            for name, is_dir, item_previous in items
+        ]
+        items.extend(
+            (name, item_real_path, None, None)
+            for name, item_real_path
+            in previous.metadata.get('shadowed', {}).items()
+        )
+        return sorted(items, key=operator.itemgetter(0))
+
+    def listed_items(path, real_path, rel_path, previous):
+        """
+        Contents of a changed directory, as for reused_items(), from listing
+        it; any previous subtrees are passed along for reuse.
+        """
+        if previous is None:
+            previous_contents = {}
+            previous_pruned = {}
+        else:
+            previous_contents = previous.contents
+            previous_pruned = (
+                previous.metadata.get('pruned', {})
+                if isinstance(previous.metadata, dict) else {}
+            )
+        items = []
+        for entry in lister.list(path, real_path, rel_path):
+            item_previous = None
+            if entry.is_dir:
+                item_previous = previous_contents.get(entry.name)
+                if entry.name in previous_pruned:
+                    item_previous = cls({}, previous_pruned[entry.name])
+                elif not isinstance(item_previous, cls):
+                    item_previous = None
+            items.append(
+                (entry.name, entry.real_path, entry.is_dir, item_previous))
+        return items
+
+    return recursive_wibwab(top, real_top, '', os.stat(top), previous)
+
+
+# How recently a directory must have been modified, when walked by rescan(),
+# for its mtime not to be trusted next time.
+RACY_NS = 2 * 10 ** 9
+
+
+def walk_dir(cls, path, real_path, rel_path, lister, seen, stats=None,
+             limits=None):
+
+    """
+    Walk a directory for walk(), listing directories with lister.
+
+    The directory's own real path should already be in seen, if appropriate;
+    seen is updated with the real paths of everything found.  If lister
+    records stat fields, stats should be the directory's own.  Depths for
+    limits are counted from the directory.
+    """
+
+    def recursive_wibwab(path, real_path, rel_path, stats, depth):
+        if limits is not None and not limits.allows(depth):
+            return cls({}, truncated_metadata(stats))
+        contents = {}
+        file_stats = {}
+        truncated = False
+        for entry in lister.list(path, real_path, rel_path):
+            if entry.real_path in seen:
+                if entry.is_dir:
+                    lister.discard(entry)
+                continue
+            if limits is not None and not limits.take():
+                truncated = True
+                break
+            seen.add(entry.real_path)
+            if entry.is_dir:
+                dir_tree = recursive_wibwab(
+                    entry.path, entry.real_path, entry.rel_path, entry.stats,
+                    depth + 1)
+                if dir_tree or is_truncated(dir_tree):
+                    contents[entry.name] = dir_tree
+            else:
+                contents[entry.name] = None
+                if entry.stats is not None:
+                    file_stats[entry.name] = entry.stats
+        metadata = dir_metadata(stats, file_stats)
+        if truncated:
+            metadata = truncated_metadata(metadata)
+        return cls(contents, metadata)
+
+    return recursive_wibwab(path, real_path, rel_path, stats, 0)
+
+
+def sharded_walk(cls, top, real_top, ignores, get_real_path, processes,
+                 workers=None, stat_fields=()):
+
+    """
+    Walk a directory tree like walk(), sharding the work across processes.
+
+    Each directory directly under top is walked in a separate worker process,
+    which sends back a compact record of what it found (see scan_shard()).
+    Those are then stitched together here, in order, applying the same seen
+    logic as walk() so that the result is the same.
+
+    :param get_real_path: as for walk(); it's sent to the worker processes, so
+    must be picklable, as a PathResolver is.
+    :param processes: number of worker processes.
+    :param workers: optional number of threads each worker process should list
+    directories with.
+
+    Other parameters are as for walk().
+    """
+
+    lister = Lister(ignores, get_real_path, stat_fields)
+    stats = path_stats(top, stat_fields)
+    entries = lister.list(top, real_top, '')
+    shards = [
+        (entry.path, entry.real_path, entry.rel_path)
+        for entry in entries
+        if entry.is_dir
+    ]
+    seen = set()
+    contents = {}
+    file_stats = {}
+
+    def merge_wibwab(path, real_path, rel_path, records, count, stats):
+        """Build the FSTree for the next count records' worth of a shard."""
+        contents = {}
+        file_stats = {}
+        for _ in range(count):
+            name, kind, link_real_path, n_records, item_stats = next(records)
+            item_path = os.path.join(path, name)
+            item_real_path = link_real_path or os.path.join(real_path, name)
+            item_rel_path = os.path.join(rel_path, name)
+            if item_real_path in seen:
+                # Skip this one, along with whatever the worker found in it.
+                skip_records(records, n_records)
+                continue
+            seen.add(item_real_path)
+            # Unpickled names are fresh copies; share them again.
+            name = sys.intern(name)
+            if kind == SHARD_FILE:
+                contents[name] = None
+                if item_stats is not None:
+                    file_stats[name] = item_stats
+                continue
+            if kind == SHARD_DIR:
+                dir_tree = merge_wibwab(
+                    item_path, item_real_path, item_rel_path, records,
+                    n_records, item_stats)
+            else:
+                # The worker had already seen this directory, but only
+                # because of something we've since dropped, so it's up to us
+                # to walk it.
+                dir_tree = walk_dir(
+                    cls, item_path, item_real_path, item_rel_path, lister,
+                    seen, item_stats)
+            if dir_tree:
+                contents[name] = dir_tree
+        return cls(contents, dir_metadata(stats, file_stats))
+
+    # Each shard's sent how to list it (rather than workers being set up
+    # with an initializer, which needs Python 3.7).
+    config = (ignores, get_real_path, workers, stat_fields)
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        shard_records = pool.map(scan_shard, shards, [config] * len(shards))
+        for entry in entries:
+            if not entry.is_dir:
+                if entry.real_path not in seen:
+                    seen.add(entry.real_path)
+                    contents[entry.name] = None
+                    if entry.stats is not None:
+                        file_stats[entry.name] = entry.stats
+                continue
+            records = iter(next(shard_records))
+            if entry.real_path in seen:
+                continue
+            seen.add(entry.real_path)
+            dir_tree = merge_wibwab(
+                entry.path, entry.real_path, entry.rel_path, records,
+                next(records), entry.stats)
+            if dir_tree:
+                contents[entry.name] = dir_tree
+
+    return cls(contents, dir_metadata(stats, file_stats))
+
+
+def skip_records(records, count):
+    """Skip the next count records' worth of a shard, and their contents."""
+    for _ in range(count):
+        n_records = next(records)[3]
+        skip_records(records, n_records)
+
+
+# Kinds of record in a shard worker's results; see scan_shard().
+SHARD_FILE = 'f'
+SHARD_DIR = 'd'
+SHARD_SEEN_DIR = 's'
+
+
+def scan_shard(shard, config):
+
+    """
+    Walk one directory in a shard worker process.
+
+    :param shard: (path, real_path, rel_path) of the directory.
+    :param config: (ignores, get_real_path, workers, stat_fields) as for
+    sharded_walk(), saying how to list directories.
+
+    :return records: a flat list, starting with the number of records
+    describing the directory's immediate contents, followed by those records
+    in pre-order.  Each record is a (name, kind, link_real_path, n_records,
+    stats) tuple, where link_real_path is the real path of a symlink
+    (otherwise None, as it's implied by the parent's real path), n_records
+    is the number of records describing a directory's immediate contents,
+    which follow it, and stats is the entry's stat fields, if any are being
+    recorded.
+
+    Every file found is recorded, but (as the worker can't know what's been
+    seen in other shards) whether it's kept is left up to sharded_walk().  A
+    directory which was already seen in this shard is recorded with kind
+    SHARD_SEEN_DIR and no contents; sharded_walk() will walk it itself if
+    the thing that saw it first was dropped.
+    """
+
+    ignores, get_real_path, workers, stat_fields = config
+    if not workers:
+        return list_shard(Lister(ignores, get_real_path, stat_fields), shard)
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        lister = PrefetchingLister(
+            ignores, get_real_path, pool, workers * PREFETCH_PER_WORKER,
+            stat_fields)
+        try:
+            return list_shard(lister, shard)
+        finally:
+            lister.cancel()
+
+
+def list_shard(lister, shard):
+    """Make scan_shard()'s records for a shard, with some lister."""
+    path, real_path, rel_path = shard
+    seen = {real_path}
+    records = [None]
+
+    def recursive_wibwab(path, real_path, rel_path):
+        entries = lister.list(path, real_path, rel_path)
+        for entry in entries:
+            link_real_path = entry.real_path
+            if link_real_path == os.path.join(real_path, entry.name):
+                link_real_path = None
+            if not entry.is_dir:
+                records.append(
+                    (entry.name, SHARD_FILE, link_real_path, 0, entry.stats))
+            elif entry.real_path in seen:
+                lister.discard(entry)
+                records.append(
+                    (entry.name, SHARD_SEEN_DIR, link_real_path, 0,
+                     entry.stats))
+            else:
+                seen.add(entry.real_path)
+                index = len(records)
+                records.append(None)
+                n_records = recursive_wibwab(
+                    entry.path, entry.real_path, entry.rel_path)
+                records[index] = (
+                    entry.name, SHARD_DIR, link_real_path, n_records,
+                    entry.stats)
+        return len(entries)
+
+    records[0] = recursive_wibwab(path, real_path, rel_path)
+    return records
+
+
+def _is_dir(dir_entry):
+    """Like os.path.isdir(), but for a DirEntry."""
+    try:
+        return dir_entry.is_dir()
+    except OSError:
+        return False
+
+
+def _is_file(dir_entry):
+    """Like os.path.isfile(), but for a DirEntry."""
+    try:
+        return dir_entry.is_file()
+    except OSError:
+        return False
@@ -11,6 +11,8 @@ nested dictionary with the following properties:
     - A value of None means "create a file here"; specifically, an empty file
     will be created.
 
+    - A value of type str means a file with that text in it.
+
     - A value of type Link represents a relative soft link to some
     destination specified relatively.
 
@@ -160,6 +162,77 @@ def with_suffixes(request):
     return spec, temp_tree_for_fixture(spec, request)
 
 
+@pytest.fixture(scope='session')
+def odd_entries(request):
+    """
+    A tree with links to files, broken links, and links out of the tree.
+    """
+    spec = {
+        'a': {
+            'b': Link('z'),
+            'c': Link('nowhere'),
+            'd': Link('/'),
+            'z': None,
+        },
+        'e': Link('a/z'),
+        'f': {
+            'g': None,
+        },
+    }
+    return spec, temp_tree_for_fixture(spec, request)
+
+
+@pytest.fixture(scope='session')
+def cross_linked(request):
+    """
+    A wider tree, with links across its branches and back up to its top.
+    """
+    spec = {}
+    for i in range(10):
+        branch = spec['b{}'.format(i)] = {
+            'c{}'.format(j): {
+                'f{}'.format(k): None
+                for k in range(3)
+            }
+            for j in range(5)
+        }
+        branch['next'] = LinkWithinTree('b{}'.format((i + 1) % 10))
+        branch['up'] = Link('..')
+    return spec, temp_tree_for_fixture(spec, request)
+
+
+@pytest.fixture(scope='session')
+def ignored_alias(request):
+    """
+    Links to a tree, where part of the tree is ignored (by path) when reached
+    via the first link but not via a later one.
+    """
+    spec = {
+        'a': {
+            'x': LinkWithinTree('c/real'),
+        },
+        'c': {
+            'p': LinkWithinTree('c/real'),
+            'q': LinkWithinTree('c/real/y'),
+            'real': {
+                'y': {
+                    'file': None,
+                },
+            },
+        },
+    }
+    return spec, temp_tree_for_fixture(spec, request)
+
+
+@pytest.fixture
+def scratch(request):
+    """
+    A function making temporary trees from specs, for tests which need to
+    change them.
+    """
+    return functools.partial(temp_tree_for_fixture, request=request)
+
+
 # Helpers
 
 def temp_tree_for_fixture(tree_spec, request):
@@ -195,6 +268,9 @@ def create_tree(root, tree_spec):
             if v is None:
                 # Touch file
                 open(path, 'a').close()
+            elif isinstance(v, str):
+                with open(path, 'w') as f:
+                    f.write(v)
             elif isinstance(v, dict):
                 os.mkdir(path)
                 _create_tree(path, v)
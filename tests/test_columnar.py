@@ -0,0 +1,156 @@
+"""
+Tests of columnar.ColumnarTree.
+"""
+
+import os
+import pickle
+import re
+
+from roedoe_lib import ColumnarTree, FSTree
+from roedoe_lib.columnar import KIND_DIR, KIND_FILE, MISSING
+
+
+def sample_tree():
+    return FSTree({
+        'a': FSTree({
+            'x.py': None,
+            'y.txt': None,
+            'empty': FSTree({}),
+        }, metadata={'inode': 5}),
+        'b.py': None,
+        'c': FSTree({
+            'd': FSTree({'z.py': None, 'py': None}),
+            'w.txt': None,
+        }, metadata='other'),
+        'caf\udce9.py': None,
+    }, metadata={'inode': 1})
+
+
+def test_round_trip(basic):
+    """Test converting to columns and back gives the same tree."""
+    _, tmpdir = basic
+    walked = FSTree.at_path(tmpdir, {tmpdir})
+    # Walks give contents in name order, which is kept.
+    assert ColumnarTree.from_fstree(walked).to_fstree().to_json() == (
+        walked.to_json())
+    for tree in (FSTree.at_path(tmpdir, {tmpdir}), sample_tree(), FSTree({})):
+        columnar = ColumnarTree.from_fstree(tree)
+        back = columnar.to_fstree()
+        assert back == tree
+        assert back.dict == tree.dict
+        assert pickle.loads(pickle.dumps(columnar)) == columnar
+
+
+def test_layout():
+    """Test the arrays are in pre-order, with subtrees contiguous."""
+    columnar = ColumnarTree.from_fstree(sample_tree())
+    paths = [columnar.path(index) for index in range(len(columnar))]
+    assert paths == [
+        '',
+        'a', 'a/empty', 'a/x.py', 'a/y.txt',
+        'b.py',
+        'c', 'c/d', 'c/d/py', 'c/d/z.py', 'c/w.txt',
+        'caf\udce9.py',
+    ]
+    assert list(columnar.parents) == [-1, 0, 1, 1, 1, 0, 0, 6, 7, 7, 6, 0]
+    assert list(columnar.ends) == [12, 5, 3, 4, 5, 6, 11, 10, 9, 10, 11, 12]
+    assert list(columnar.kinds) == [
+        KIND_DIR, KIND_DIR, KIND_DIR, KIND_FILE, KIND_FILE, KIND_FILE,
+        KIND_DIR, KIND_DIR, KIND_FILE, KIND_FILE, KIND_FILE, KIND_FILE]
+    assert columnar.names.startswith(b'\0a\0empty\0x.py\0')
+    assert list(columnar.children()) == [1, 5, 6, 11]
+    assert list(columnar.children(6)) == [7, 10]
+    assert list(columnar.children(2)) == []
+    assert columnar.metadata == {0: {'inode': 1}, 1: {'inode': 5}, 6: 'other'}
+
+
+def test_count():
+    """Test counting nodes, overall and in subtrees."""
+    columnar = ColumnarTree.from_fstree(sample_tree())
+    assert columnar.count() == 11
+    assert columnar.count(KIND_FILE) == 7
+    assert columnar.count(KIND_DIR) == 4
+    assert columnar.count(KIND_FILE, index=6) == 3
+    assert columnar.count(index=2) == 0
+
+
+def test_match_suffix():
+    """Test finding nodes by name suffix."""
+    columnar = ColumnarTree.from_fstree(sample_tree())
+
+    def paths(indices):
+        return [columnar.path(index) for index in indices]
+
+    assert paths(columnar.match_suffix('.py')) == [
+        'a/x.py', 'b.py', 'c/d/z.py', 'caf\udce9.py']
+    assert paths(columnar.match_suffix('py')) == [
+        'a/x.py', 'b.py', 'c/d/py', 'c/d/z.py', 'caf\udce9.py']
+    assert paths(columnar.match_suffix('\udce9.py')) == ['caf\udce9.py']
+    assert paths(columnar.match_suffix('d', kind=KIND_DIR)) == ['c/d']
+    assert paths(columnar.match_suffix('ty', kind=None)) == ['a/empty']
+    assert len(columnar.match_suffix('', kind=None)) == 11
+    assert paths(columnar.match_suffix('.nope')) == []
+
+
+def test_filter_suffix():
+    """Test filtering agrees with FSTree.filter()."""
+    tree = sample_tree()
+    columnar = ColumnarTree.from_fstree(tree)
+    for suffix in ('.py', '.txt', 'py', '.nope'):
+        filtered = columnar.filter_suffix(suffix)
+        expected = tree.filter([re.compile('.*' + re.escape(suffix) + '$')])
+        assert filtered.to_fstree() == expected
+        assert filtered == ColumnarTree.from_fstree(expected)
+
+
+def test_subtree():
+    """Test extracting subtrees."""
+    tree = sample_tree()
+    columnar = ColumnarTree.from_fstree(tree)
+    for index in (0, 1, 2, 6, 7):
+        subtree = columnar.subtree(index)
+        expected = tree
+        for part in filter(None, columnar.path(index).split('/')):
+            expected = expected[part]
+        assert subtree.to_fstree() == expected
+        assert subtree == ColumnarTree.from_fstree(expected)
+
+
+def test_columns():
+    """Test columns from directories' metadata."""
+    columnar = ColumnarTree.from_fstree(
+        sample_tree(), metadata_keys=('inode',))
+    inodes = columnar.columns['inode']
+    assert inodes[0] == 1 and inodes[1] == 5
+    assert all(inode == MISSING for inode in inodes[2:])
+    assert list(columnar.subtree(1).columns['inode']) == [5] + [MISSING] * 3
+    filtered = columnar.filter_suffix('.txt')
+    assert list(filtered.columns['inode']) == [1, 5, MISSING, MISSING, MISSING]
+
+
+def test_file_columns(scratch):
+    """Test columns from files' metadata, as walks record it."""
+    tmpdir = scratch({'a': {'b.txt': 'four'}, 'c.txt': 'eight...'})
+    tree = FSTree.at_path(tmpdir, {tmpdir}, stat_fields=('size',))
+    columnar = ColumnarTree.from_fstree(tree, ('size', 'mtime_ns'))
+    sizes = {
+        columnar.path(index): columnar.columns['size'][index]
+        for index in range(len(columnar))
+        if columnar.kinds[index] == KIND_FILE
+    }
+    assert sizes == {os.path.join('a', 'b.txt'): 4, 'c.txt': 8}
+    assert all(mtime == MISSING for mtime in columnar.columns['mtime_ns'])
+    assert columnar.to_fstree() == tree
+
+
+def test_deep():
+    """Test very deep trees are fine either way."""
+    tree = FSTree({'f': None})
+    for _ in range(5000):
+        tree = FSTree({'d': tree})
+    columnar = ColumnarTree.from_fstree(tree)
+    assert len(columnar) == 5002
+    assert columnar.path(5001) == '/'.join(['d'] * 5000 + ['f'])
+    assert ColumnarTree.from_fstree(columnar.to_fstree()) == columnar
+    assert columnar.filter_suffix('f') == columnar
+    assert len(columnar.subtree(4000)) == 1002
@@ -0,0 +1,128 @@
+"""
+Tests of filters.CompiledFilter.
+"""
+
+import re
+
+import pytest
+
+from roedoe_lib import CompiledFilter, FSTree
+
+
+PATHS = [
+    '',
+    'a',
+    'README.md',
+    'readme.MD',
+    'docs/index.md',
+    'docs/index.md\n',
+    'docs/api/index.rst',
+    'docs\nindex.md',
+    'src/thing.py',
+    'src/thing.pyc',
+    'src/.md',
+    'src/ındex.md',
+    'src/K.md',
+    'src/\u212a.md',
+    'k.md',
+    'tests/test_thing.py',
+    'aa/aa',
+    'ab/ab',
+    'x.tar.gz',
+    'build/x.o',
+]
+
+PATTERNS = [
+    # Literal suffixes, prefixes and paths.
+    (r'.*\.md$',),
+    (r'.*\.md$', re.IGNORECASE),
+    (r'^.*\.rst$', re.IGNORECASE | re.ASCII),
+    (r'.*\.tar\.gz$',),
+    (r'^docs/.*',),
+    (r'docs/.*$', re.IGNORECASE),
+    (r'^src',),
+    (r'^docs/index\.md$',),
+    (r'^DOCS/INDEX\.MD$', re.IGNORECASE),
+    (r'.*K\.md$', re.IGNORECASE),
+    (r'.*I\.md$', re.IGNORECASE),
+    (r'^src/ındex\.md$',),
+    (r'.*\.md$', re.MULTILINE),
+    # Other mergeable patterns.
+    (r'.*(d|i)$',),
+    (r'^docs/index.md$',),
+    (r'.*/test_[^/]*\.py$',),
+    (r'(?i:.*\.PY)$',),
+    (r'.*\.o$', re.DOTALL),
+    (r'(?s).*',),
+    # Patterns which are matched separately.
+    (r'(.)\1/\1\1',),
+    (r'(?P<x>.)(?P=x)/',),
+    (r'(?P<dir>[^/]+)/.*\.py$',),
+    (r'(?i).*\.MD$',),
+    (r'.*  \. md $', re.VERBOSE),
+    (r'(a)?(?(1)a|b)/',),
+]
+
+
+@pytest.mark.parametrize(
+    'patterns',
+    [[p] for p in PATTERNS] + [PATTERNS[:13], PATTERNS[13:], PATTERNS[:-6],
+                               PATTERNS[-6:], PATTERNS],
+)
+def test_same_as_any(patterns):
+    """Test matching gives the same answer as trying each pattern."""
+    filters = [re.compile(*p) for p in patterns]
+    compiled = CompiledFilter(filters)
+    for path in PATHS:
+        expected = any(filter_.match(path) for filter_ in filters)
+        assert compiled.match(path) == expected, (patterns, path)
+
+
+def test_strings_and_other_matchers():
+    """Test strings are compiled, and other objects just used."""
+
+    class EndsInO:
+        def match(self, path):
+            return path.endswith('o')
+
+    compiled = CompiledFilter([r'.*\.py$', EndsInO()])
+    assert len(compiled) == 2
+    assert compiled.match('src/thing.py')
+    assert compiled.match('build/x.o')
+    assert not compiled.match('x.tar.gz')
+
+
+def test_no_filters():
+    """Test an empty CompiledFilter matches nothing."""
+    compiled = CompiledFilter([])
+    assert not compiled
+    assert not any(compiled.match(path) for path in PATHS)
+
+
+def test_filter_with_compiled(with_suffixes):
+    """Test FSTree.filter() takes a CompiledFilter in place of a list."""
+    _, tmpdir = with_suffixes
+    tree = FSTree.at_path(tmpdir, {tmpdir})
+    filters = [
+        re.compile(r'.*\.md$', re.IGNORECASE),
+        re.compile(r'.*\.rst$', re.IGNORECASE),
+        re.compile('^foo/moo/thing$'),
+    ]
+    compiled = CompiledFilter(filters)
+    assert tree.filter(compiled) == tree.filter(filters)
+    assert tree.filter(compiled) == FSTree({
+        'foo': FSTree({
+            'bar.md': None,
+            'moo': FSTree({
+                'BAR.MD': None,
+                'thing': None,
+                'zoo': FSTree({
+                    'BAR.md': None,
+                    'BAR.RST': None,
+                }),
+            }),
+        }),
+        'fred': FSTree({
+            'klang.rst': None
+        }),
+    })
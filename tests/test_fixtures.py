@@ -76,6 +76,47 @@ def test_foobar(with_suffixes):
     assert_isfile(tmpdir, 'zoom/klang.rst')
 
 
+def test_odd_entries(odd_entries):
+    _, tmpdir = odd_entries
+    assert_isdir_(tmpdir, '')
+    assert_isdir_(tmpdir, 'a')
+    assert_islink(tmpdir, 'a/b', 'z')
+    assert_islink(tmpdir, 'a/c', 'nowhere')
+    assert_islink(tmpdir, 'a/d', '/')
+    assert_isfile(tmpdir, 'a/z')
+    assert_islink(tmpdir, 'e', 'a/z')
+    assert_isdir_(tmpdir, 'f')
+    assert_isfile(tmpdir, 'f/g')
+
+
+def test_cross_linked(cross_linked):
+    _, tmpdir = cross_linked
+    for i in range(10):
+        branch = 'b{}'.format(i)
+        assert_isdir_(tmpdir, branch)
+        for j in range(5):
+            assert_isdir_(tmpdir, '{}/c{}'.format(branch, j))
+            for k in range(3):
+                assert_isfile(tmpdir, '{}/c{}/f{}'.format(branch, j, k))
+        assert_islink(
+            tmpdir, branch + '/next',
+            os.path.join(tmpdir, 'b{}'.format((i + 1) % 10)))
+        assert_islink(tmpdir, branch + '/up', '..')
+
+
+def test_ignored_alias(ignored_alias):
+    _, tmpdir = ignored_alias
+    assert_isdir_(tmpdir, '')
+    assert_isdir_(tmpdir, 'a')
+    assert_islink(tmpdir, 'a/x', os.path.join(tmpdir, 'c/real'))
+    assert_isdir_(tmpdir, 'c')
+    assert_islink(tmpdir, 'c/p', os.path.join(tmpdir, 'c/real'))
+    assert_islink(tmpdir, 'c/q', os.path.join(tmpdir, 'c/real/y'))
+    assert_isdir_(tmpdir, 'c/real')
+    assert_isdir_(tmpdir, 'c/real/y')
+    assert_isfile(tmpdir, 'c/real/y/file')
+
+
 # Helpers
 
 def assert_isdir_(root, path):
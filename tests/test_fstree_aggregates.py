@@ -0,0 +1,157 @@
+"""
+Tests of FSTree.aggregates() and FSTree.largest().
+"""
+
+import os
+import pickle
+
+import pytest
+
+from roedoe_lib import FSTree, aggregates
+from roedoe_lib.aggregates import Aggregates
+
+
+def files(**sizes):
+    """Directory metadata recording some files' sizes and mtimes."""
+    return {'files': {
+        name: {'size': size, 'mtime_ns': size * 10}
+        for name, size in sizes.items()
+    }}
+
+
+def sample_tree():
+    return FSTree({
+        'a': FSTree({
+            'b': FSTree({'c.txt': None}, files(**{'c.txt': 100})),
+            'd.txt': None,
+            'e.txt': None,
+        }, files(**{'d.txt': 10, 'e.txt': 20})),
+        'f': FSTree({'g.txt': None}, files(**{'g.txt': 50})),
+        'h.txt': None,
+    }, dict(files(**{'h.txt': 1}), mtime_ns=5000))
+
+
+def test_aggregates():
+    """Test counts, sizes and mtimes of a tree and its subtrees."""
+    tree = sample_tree()
+    assert tree.aggregates() == Aggregates(5, 3, 181, 5000)
+    assert tree['a'].aggregates() == Aggregates(3, 1, 130, 1000)
+    assert tree['a']['b'].aggregates() == Aggregates(1, 0, 100, 1000)
+    assert tree['f'].aggregates() == (1, 0, 50, 500)
+
+
+def test_without_stats(basic):
+    """Test a walk without stat fields has counts but no sizes or mtimes."""
+    _, tmpdir = basic
+    tree = FSTree.at_path(tmpdir, {tmpdir})
+    assert tree.aggregates() == Aggregates(6, 5, 0, None)
+    assert FSTree({}).aggregates() == Aggregates(0, 0, 0, None)
+
+
+def test_from_walk(scratch):
+    """Test aggregates from stat fields recorded by a walk."""
+    top = scratch({'a': {'b': 'xx', 'c': {'d': 'yyy'}}, 'e': 'z'})
+    tree = FSTree.at_path(top, {top}, stat_fields=('size', 'mtime_ns'))
+    newest = max(
+        os.stat(os.path.join(directory, name)).st_mtime_ns
+        for directory, dirs, names in os.walk(top)
+        for name in dirs + names + ['.']
+    )
+    assert tree.aggregates() == Aggregates(3, 2, 6, newest)
+
+
+def test_cached(monkeypatch):
+    """Test aggregates are worked out once, for every node."""
+    tree = sample_tree()
+    calls = []
+    aggregate_tree = aggregates.aggregate_tree
+
+    def counting_aggregate_tree(*args):
+        calls.append(args[0])
+        return aggregate_tree(*args)
+
+    monkeypatch.setattr(
+        'roedoe_lib.base.aggregate_tree', counting_aggregate_tree)
+    first = tree.aggregates()
+    assert tree.aggregates() is first
+    assert tree['a']['b']._aggregates == (1, 0, 100, 1000)
+    tree['a'].aggregates()
+    assert len(calls) == 3
+
+
+def test_invalidated():
+    """Test changes through __setitem__ and metadata are noticed."""
+    tree = sample_tree()
+    tree.aggregates()
+    tree['new.txt'] = None
+    assert tree.aggregates() == Aggregates(6, 3, 181, 5000)
+    tree['f'].metadata = files(**{'g.txt': 60})
+    assert tree['f'].aggregates().size == 60
+    # Changes to directories further down aren't noticed above them; derive
+    # changed trees instead.
+    changed = tree.with_item(os.path.join('a', 'b', 'new.txt'), None)
+    assert changed.aggregates() == Aggregates(7, 3, 191, 5000)
+    assert tree['a'].aggregates() == Aggregates(3, 1, 130, 1000)
+
+
+def test_pickled():
+    """Test aggregates aren't pickled, but are worked out again."""
+    tree = sample_tree()
+    tree.aggregates()
+    copy = pickle.loads(pickle.dumps(tree))
+    assert copy._aggregates is None
+    assert copy.aggregates() == tree.aggregates()
+
+
+def test_deep():
+    """Test a tree too deep to recurse through."""
+    tree = FSTree({'f': None})
+    for _ in range(5000):
+        tree = FSTree({'d': tree})
+    assert tree.aggregates() == Aggregates(1, 5000, 0, None)
+    assert len(tree.largest(6000, 'files')) == 5000
+
+
+def test_largest():
+    """Test finding the largest directories by each aggregate."""
+    tree = sample_tree()
+    b = os.path.join('a', 'b')
+    assert tree.largest() == [
+        ('a', Aggregates(3, 1, 130, 1000)),
+        (b, Aggregates(1, 0, 100, 1000)),
+        ('f', Aggregates(1, 0, 50, 500)),
+    ]
+    assert [path for path, _ in tree.largest(2)] == ['a', b]
+    assert [path for path, _ in tree.largest(2, 'files')] == ['a', b]
+    assert [path for path, _ in tree.largest(1, 'dirs')] == ['a']
+    assert [path for path, _ in tree.largest(3, 'newest_mtime_ns')] == [
+        'a', b, 'f']
+    assert tree.largest(0) == []
+    with pytest.raises(ValueError):
+        tree.largest(1, 'colour')
+
+
+def test_largest_looks_at_few(monkeypatch):
+    """Test finding the largest doesn't look into every directory."""
+    tree = FSTree({
+        'big': FSTree({
+            'x': FSTree({'f': None}, files(f=10000)),
+        }),
+        'small': FSTree({
+            str(i): FSTree({'f': None}, files(f=i)) for i in range(100)
+        }),
+    })
+    tree.aggregates()
+    looked_at = []
+    current = FSTree.aggregates
+
+    def counting_aggregates(node):
+        looked_at.append(node)
+        return current(node)
+
+    monkeypatch.setattr(FSTree, 'aggregates', counting_aggregates)
+    assert [path for path, _ in tree.largest(2)] == [
+        'big', os.path.join('big', 'x')]
+    # The top, the two directories in it and the one in big; nothing in
+    # small.
+    assert len(looked_at) == 4
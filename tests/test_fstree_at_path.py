@@ -301,3 +301,53 @@ def test_foobar(with_suffixes):
             'wuub': None,
         }),
     })
+
+
+def test_odd_entries(odd_entries):
+    """
+    Test links to files, broken links, and links out of the valid roots.
+    """
+    _, tmpdir = odd_entries
+    tree = FSTree.at_path(tmpdir, {tmpdir})
+    # 'a/b' gets to 'a/z' first, so neither 'a/z' nor 'e' appear; the broken
+    # link and the link to '/' are both dropped.
+    assert tree == FSTree({
+        'a': FSTree({
+            'b': None,
+        }),
+        'f': FSTree({
+            'g': None,
+        }),
+    })
+
+
+def test_odd_entries_link_to_file_ignored(odd_entries):
+    """Test that an ignored link doesn't claim its destination."""
+    _, tmpdir = odd_entries
+    tree = FSTree.at_path(tmpdir, {tmpdir}, ignore('b'))
+    assert tree == FSTree({
+        'a': FSTree({
+            'z': None,
+        }),
+        'f': FSTree({
+            'g': None,
+        }),
+    })
+
+
+def test_ignored_alias(ignored_alias):
+    """
+    Test that a directory ignored where it's first reached is still found via
+    a later link.
+    """
+    _, tmpdir = ignored_alias
+    tree = FSTree.at_path(tmpdir, {tmpdir}, ignore('/a/x/y'))
+    # 'a/x' gets to 'c/real' first, so 'c/p' and 'c/real' are dropped, but
+    # 'c/real/y' is ignored there, so 'c/q' gets it.
+    assert tree == FSTree({
+        'c': FSTree({
+            'q': FSTree({
+                'file': None,
+            }),
+        }),
+    })
@@ -0,0 +1,122 @@
+"""
+Tests of FSTree.at_path_async() class method.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+
+import pytest
+
+from roedoe_lib import FSTree, ignore
+
+
+FIXTURES = (
+    'basic',
+    'mutual_empty',
+    'mutual_one_file',
+    'triple_linked',
+    'with_suffixes',
+    'odd_entries',
+    'cross_linked',
+    'ignored_alias',
+)
+
+
+@pytest.mark.parametrize('fixture', FIXTURES)
+@pytest.mark.parametrize('concurrency', (1, 4))
+def test_same_as_serial(request, fixture, concurrency):
+    """Test the async walk finds exactly what the serial walk finds."""
+    _, tmpdir = request.getfixturevalue(fixture)
+    serial = FSTree.at_path(tmpdir, {tmpdir})
+    tree = run(FSTree.at_path_async(
+        tmpdir, {tmpdir}, concurrency=concurrency))
+    assert tree == serial
+    assert tree.to_json() == serial.to_json()
+
+
+def test_ignores(basic):
+    """Test ignores, including of the tree being walked."""
+    _, tmpdir = basic
+    tree = run(FSTree.at_path_async(tmpdir, {tmpdir}, ignore('a/')))
+    assert tree == FSTree({
+        'j': FSTree({
+            'a': None,
+        }),
+    })
+    top = os.path.join(tmpdir, 'h')
+    tree = run(FSTree.at_path_async(top, {tmpdir}, ignore('h')))
+    assert tree == FSTree({})
+
+
+def test_invalid_root(triple_linked):
+    """Test walking a tree outside the valid roots."""
+    _, tmpdir = triple_linked
+    first = os.path.join(tmpdir, 'a')
+    tree = run(FSTree.at_path_async(first, {os.path.join(tmpdir, 'd')}))
+    assert tree == FSTree({})
+
+
+def test_progress(basic):
+    """Test the progress callback sees every directory."""
+    _, tmpdir = basic
+    calls = []
+    run(FSTree.at_path_async(
+        tmpdir, {tmpdir}, progress=lambda *counts: calls.append(counts)))
+    # Top, a, a/a, a/g, h, h/a, j; 6 files.
+    assert len(calls) == 7
+    assert calls[-1] == (7, 6)
+
+
+def test_many_roots_shared_executor(cross_linked):
+    """Test walking many trees at once in one loop, on one executor."""
+    _, tmpdir = cross_linked
+    tops = [os.path.join(tmpdir, 'b{}'.format(i)) for i in range(10)]
+
+    async def walk_all(executor):
+        return await asyncio.gather(*(
+            FSTree.at_path_async(
+                top, {tmpdir}, concurrency=2, executor=executor)
+            for top in tops
+        ))
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        trees = run(walk_all(executor))
+    assert trees == [FSTree.at_path(top, {tmpdir}) for top in tops]
+
+
+def test_cancel(cross_linked):
+    """Test cancelling a walk part way through."""
+    _, tmpdir = cross_linked
+
+    async def cancel_walk():
+        calls = []
+
+        def progress(dirs, files):
+            calls.append(dirs)
+            if dirs == 3:
+                walk.cancel()
+
+        walk = asyncio.ensure_future(
+            FSTree.at_path_async(tmpdir, {tmpdir}, progress=progress))
+        with pytest.raises(asyncio.CancelledError):
+            await walk
+        return calls
+
+    assert run(cancel_walk()) == [1, 2, 3]
+
+
+def test_unlistable_directory(basic):
+    """Test errors listing directories surface from the walk."""
+    _, tmpdir = basic
+    with pytest.raises(FileNotFoundError):
+        run(FSTree.at_path_async(os.path.join(tmpdir, 'nope'), {tmpdir}))
+
+
+def run(coroutine):
+    """Run a coroutine to completion in a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
@@ -0,0 +1,174 @@
+"""
+Tests of the max_depth, max_entries and deadline options of FSTree.at_path(),
+with FSTree.truncated_paths() and FSTree.expand().
+"""
+
+import os
+import time
+
+import pytest
+
+from roedoe_lib import FSTree, ignore
+
+
+SPEC = {
+    'a': {
+        'b': {
+            'c': {'d.txt': None},
+            'e.txt': None,
+        },
+        'f.txt': None,
+    },
+    'g': {'h.txt': None},
+    'i.txt': None,
+}
+
+
+def test_no_limits(scratch):
+    """Test limits too big to matter."""
+    top = scratch(SPEC)
+    tree = FSTree.at_path(top, {top}, max_depth=10, max_entries=100)
+    assert tree == FSTree.at_path(top, {top})
+    assert tree.truncated_paths() == []
+
+
+def test_max_depth(scratch):
+    """Test directories below the maximum depth are kept, unlisted."""
+    top = scratch(SPEC)
+    tree = FSTree.at_path(top, {top}, max_depth=2)
+    assert tree.dict == {'contents': {
+        'a': {'contents': {
+            'b': {'contents': {}, 'metadata': {'truncated': True}},
+            'f.txt': None,
+        }},
+        'g': {'contents': {'h.txt': None}},
+        'i.txt': None,
+    }}
+    assert tree.truncated_paths() == [os.path.join('a', 'b')]
+    assert FSTree.at_path(top, {top}, max_depth=1).truncated_paths() == [
+        'a', 'g']
+    tree = FSTree.at_path(top, {top}, max_depth=0)
+    assert tree.dict == {'contents': {}, 'metadata': {'truncated': True}}
+    assert tree.truncated_paths() == ['']
+
+
+def test_max_entries(scratch):
+    """Test the walk stops after so many entries, marking what's unfinished."""
+    top = scratch(SPEC)
+    tree = FSTree.at_path(top, {top}, max_entries=4)
+    # a, a/b, a/b/c, a/b/c/d.txt; then nothing more.
+    assert tree.dict == {
+        'contents': {
+            'a': {
+                'contents': {
+                    'b': {
+                        'contents': {'c': {'contents': {'d.txt': None}}},
+                        'metadata': {'truncated': True},
+                    },
+                },
+                'metadata': {'truncated': True},
+            },
+        },
+        'metadata': {'truncated': True},
+    }
+    assert tree.truncated_paths() == ['', 'a', os.path.join('a', 'b')]
+    # Entries skipped as already seen don't count.
+    top = scratch({'a': {'x': None}, 'z': None})
+    os.symlink('a', os.path.join(top, 'l'))
+    tree = FSTree.at_path(top, {top}, max_entries=3)
+    assert tree.truncated_paths() == []
+
+
+def test_deadline(scratch):
+    """Test a walk with its deadline already passed."""
+    top = scratch(SPEC)
+    tree = FSTree.at_path(top, {top}, deadline=time.monotonic() - 1)
+    assert tree.dict == {'contents': {}, 'metadata': {'truncated': True}}
+    tree = FSTree.at_path(top, {top}, deadline=time.monotonic() + 60)
+    assert tree.truncated_paths() == []
+
+
+def test_wide(scratch):
+    """Test the number of entries bounds the size of the tree."""
+    top = scratch({
+        'd{}'.format(i): {'f{}'.format(j): None for j in range(50)}
+        for i in range(50)
+    })
+    tree = FSTree.at_path(top, {top}, max_entries=100)
+    aggregates = tree.aggregates()
+    assert aggregates.files + aggregates.dirs == 100
+    assert '' in tree.truncated_paths()
+
+
+def test_with_stat_fields_and_workers(scratch):
+    """Test limits along with stat fields and worker threads."""
+    top = scratch(SPEC)
+    tree = FSTree.at_path(
+        top, {top}, stat_fields=('size',), workers=2, max_depth=2)
+    b = tree.lookup(os.path.join('a', 'b'))
+    assert b.metadata == {
+        'size': os.stat(os.path.join(top, 'a', 'b')).st_size,
+        'truncated': True,
+    }
+    assert tree.stats(os.path.join('a', 'b')) == {'size': b.metadata['size']}
+    with pytest.raises(ValueError):
+        FSTree.at_path(top, {top}, processes=2, max_depth=2)
+
+
+def test_expand(scratch):
+    """Test walking truncated directories again."""
+    top = scratch(SPEC)
+    full = FSTree.at_path(top, {top})
+    tree = FSTree.at_path(top, {top}, max_depth=2)
+    b = os.path.join('a', 'b')
+    expanded = tree.expand(top, {top}, b)
+    assert expanded == full
+    assert expanded.truncated_paths() == []
+    # Everything else is shared.
+    assert expanded['g'] is tree['g']
+    # Expanding with limits of its own.
+    partly = tree.expand(top, {top}, b, max_depth=1)
+    assert partly.truncated_paths() == [os.path.join('a', 'b', 'c')]
+    assert partly.expand(top, {top}, os.path.join('a', 'b', 'c')) == full
+    # Expanding everything.
+    tree = FSTree.at_path(top, {top}, max_entries=2)
+    assert tree.expand(top, {top}) == full
+    with pytest.raises(KeyError):
+        tree.expand(top, {top}, 'missing')
+
+
+def test_expand_ignores(scratch):
+    """Test ignores apply relative to the top, not the expanded directory."""
+    top = scratch({'a': {'b': {'c.txt': None, 'd.log': None}}})
+    ignores = ignore('a/b/*.log')
+    tree = FSTree.at_path(top, {top}, ignores, max_depth=1)
+    expanded = tree.expand(top, {top}, 'a', ignores)
+    assert expanded == FSTree.at_path(top, {top}, ignores)
+
+
+def test_expand_links_up(scratch):
+    """Test links back up to the directories above aren't followed."""
+    top = scratch({'a': {'b': {'c.txt': None}}})
+    os.symlink('..', os.path.join(top, 'a', 'b', 'up'))
+    tree = FSTree.at_path(top, {top}, max_depth=2)
+    expanded = tree.expand(top, {top}, os.path.join('a', 'b'))
+    assert expanded == FSTree.at_path(top, {top})
+
+
+def test_expand_empty(scratch):
+    """Test a truncated directory which turns out empty is dropped."""
+    top = scratch({'a': {'b': {}}, 'c.txt': None})
+    tree = FSTree.at_path(top, {top}, max_depth=1)
+    assert 'a' in tree
+    assert tree.expand(top, {top}, 'a') == FSTree.at_path(top, {top})
+    # Directories above left empty go too, unless they're truncated.
+    tree = FSTree.at_path(top, {top}, max_depth=2)
+    b = os.path.join('a', 'b')
+    expanded = tree.expand(top, {top}, b)
+    assert expanded.dict == {'contents': {'c.txt': None}}
+    top = scratch({'a': {'b': {'c': {}}, 'z.txt': None}})
+    tree = FSTree.at_path(top, {top}, max_depth=2, max_entries=2)
+    assert tree.truncated_paths() == ['a', b]
+    assert tree.expand(top, {top}, b).dict == {'contents': {
+        'a': {'contents': {}, 'metadata': {'truncated': True}},
+    }}
@@ -0,0 +1,73 @@
+"""
+Tests of FSTree.at_path() class method with multiple worker threads.
+"""
+
+import os
+
+import pytest
+
+from roedoe_lib import FSTree, ignore
+
+
+FIXTURES = (
+    'basic',
+    'mutual_empty',
+    'mutual_one_file',
+    'triple_linked',
+    'with_suffixes',
+    'odd_entries',
+    'cross_linked',
+    'ignored_alias',
+)
+
+
+@pytest.mark.parametrize('fixture', FIXTURES)
+@pytest.mark.parametrize('workers', (1, 2, 8))
+def test_same_as_serial(request, fixture, workers):
+    """Test the threaded walk finds exactly what the serial walk finds."""
+    _, tmpdir = request.getfixturevalue(fixture)
+    serial = FSTree.at_path(tmpdir, {tmpdir})
+    parallel = FSTree.at_path(tmpdir, {tmpdir}, workers=workers)
+    assert parallel == serial
+    # Same order of children too.
+    assert parallel.to_json() == serial.to_json()
+
+
+@pytest.mark.parametrize('workers', (1, 2, 8))
+def test_cross_linked_subtree(cross_linked, workers):
+    """
+    Test a walk starting inside a tree with links back out of where it starts.
+    """
+    _, tmpdir = cross_linked
+    top = os.path.join(tmpdir, 'b3')
+    serial = FSTree.at_path(top, {tmpdir})
+    parallel = FSTree.at_path(top, {tmpdir}, workers=workers)
+    assert parallel == serial
+    # The walk gets to every branch via the links, but each only once.
+    assert count_files(parallel) == 10 * 5 * 3
+
+
+def test_cross_linked_ignores(cross_linked):
+    """Test ignores are respected by the threaded walk."""
+    _, tmpdir = cross_linked
+    ignores = ignore('c2/', 'f1', 'up')
+    serial = FSTree.at_path(tmpdir, {tmpdir}, ignores)
+    parallel = FSTree.at_path(tmpdir, {tmpdir}, ignores, workers=4)
+    assert parallel == serial
+    assert sorted(parallel['b0']['c0'].contents) == ['f0', 'f2']
+    assert 'c2' not in parallel['b0'].contents
+
+
+def test_unlistable_directory(basic):
+    """Test errors listing directories surface from the threaded walk."""
+    _, tmpdir = basic
+    with pytest.raises(FileNotFoundError):
+        FSTree.at_path(os.path.join(tmpdir, 'nope'), {tmpdir}, workers=2)
+
+
+def count_files(tree):
+    """Count the files in an FSTree."""
+    return sum(
+        1 if value is None else count_files(value)
+        for value in tree.contents.values()
+    )
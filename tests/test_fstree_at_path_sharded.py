@@ -0,0 +1,79 @@
+"""
+Tests of FSTree.at_path() class method, sharded across processes.
+"""
+
+import os
+
+import pytest
+
+from roedoe_lib import FSTree, ignore
+
+
+FIXTURES = (
+    'basic',
+    'mutual_empty',
+    'mutual_one_file',
+    'triple_linked',
+    'with_suffixes',
+    'odd_entries',
+    'cross_linked',
+    'ignored_alias',
+)
+
+
+@pytest.mark.parametrize('fixture', FIXTURES)
+def test_same_as_serial(request, fixture):
+    """Test the sharded walk finds exactly what the serial walk finds."""
+    _, tmpdir = request.getfixturevalue(fixture)
+    serial = FSTree.at_path(tmpdir, {tmpdir})
+    sharded = FSTree.at_path(tmpdir, {tmpdir}, processes=2)
+    assert sharded == serial
+    # Same order of children too.
+    assert sharded.to_json() == serial.to_json()
+
+
+def test_with_workers(cross_linked):
+    """Test sharding with multiple threads in each process."""
+    _, tmpdir = cross_linked
+    serial = FSTree.at_path(tmpdir, {tmpdir})
+    sharded = FSTree.at_path(tmpdir, {tmpdir}, processes=2, workers=2)
+    assert sharded == serial
+
+
+def test_cross_linked_subtree(cross_linked):
+    """
+    Test a walk starting inside a tree with links back out of where it starts,
+    so that the shards all overlap.
+    """
+    _, tmpdir = cross_linked
+    top = os.path.join(tmpdir, 'b3')
+    serial = FSTree.at_path(top, {tmpdir})
+    sharded = FSTree.at_path(top, {tmpdir}, processes=3)
+    assert sharded == serial
+
+
+def test_ignored_alias(ignored_alias):
+    """
+    Test a directory seen within one shard, but via something which is then
+    dropped because another shard got to it first.
+    """
+    _, tmpdir = ignored_alias
+    ignores = ignore('/a/x/y')
+    serial = FSTree.at_path(tmpdir, {tmpdir}, ignores)
+    sharded = FSTree.at_path(tmpdir, {tmpdir}, ignores, processes=2)
+    assert sharded == serial
+    assert sharded == FSTree({
+        'c': FSTree({
+            'q': FSTree({
+                'file': None,
+            }),
+        }),
+    })
+
+
+def test_invalid_root(triple_linked):
+    """Test a sharded walk of a tree outside the valid roots."""
+    _, tmpdir = triple_linked
+    tree = FSTree.at_path(
+        os.path.join(tmpdir, 'a'), {os.path.join(tmpdir, 'd')}, processes=2)
+    assert tree == FSTree({})
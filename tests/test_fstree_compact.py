@@ -0,0 +1,81 @@
+"""
+Tests of base.FSTree.compact() and compact.CompactContents.
+"""
+
+import pickle
+import re
+
+import pytest
+
+from roedoe_lib import FSTree
+from roedoe_lib.compact import CompactContents
+
+
+def test_compact(basic):
+    """Test a compact tree works the same as the original."""
+    _, tmpdir = basic
+    tree = FSTree.at_path(tmpdir, {tmpdir})
+    compact = tree.compact()
+    assert isinstance(compact.contents, CompactContents)
+    assert isinstance(compact['a']['a'].contents, CompactContents)
+    assert compact == tree
+    assert tree == compact
+    assert compact.dict == tree.dict
+    assert compact.to_json() == tree.to_json()
+    assert FSTree.from_json(compact.to_json()) == tree
+    assert repr(compact) == repr(tree)
+    assert list(compact.contents) == sorted(tree.contents)
+    assert compact['a']['b'] is None
+    assert 'h' in compact.contents and 'z' not in compact.contents
+    assert compact.filter([re.compile('.*a$')]) == tree.filter(
+        [re.compile('.*a$')])
+    assert pickle.loads(pickle.dumps(compact)) == tree
+    assert not hasattr(compact, '__dict__')
+
+
+def test_compact_names_shared(basic):
+    """Test names are interned, so repeated names are stored once."""
+    _, tmpdir = basic
+    compact = FSTree.at_path(tmpdir, {tmpdir}).compact()
+    a_names = [
+        compact.contents.names[0],
+        compact['a'].contents.names[0],
+        compact['h'].contents.names[0],
+        compact['j'].contents.names[0],
+    ]
+    assert a_names == ['a'] * 4
+    assert all(name is a_names[0] for name in a_names)
+
+
+def test_compact_metadata():
+    """Test metadata is kept."""
+    tree = FSTree({'x': FSTree({'y': None}, metadata={'m': 1})}, metadata=2)
+    compact = tree.compact()
+    assert compact.metadata == 2
+    assert compact['x'].metadata == {'m': 1}
+    assert compact == tree
+
+
+def test_compact_contents_changes():
+    """Test changing compact contents keeps them sorted."""
+    contents = CompactContents({'b': None, 'd': None})
+    contents['c'] = None
+    contents['a'] = None
+    contents['e'] = None
+    contents['c'] = 'changed'
+    assert list(contents.items()) == [
+        ('a', None), ('b', None), ('c', 'changed'), ('d', None), ('e', None)]
+    del contents['a']
+    del contents['c']
+    assert contents.names == ('b', 'd', 'e')
+    with pytest.raises(KeyError):
+        del contents['c']
+    with pytest.raises(KeyError):
+        contents['c']
+    assert contents.get('c') is None
+    assert contents == {'b': None, 'd': None, 'e': None}
+    assert ('b', None) in contents.items()
+    assert ('b', 1) not in contents.items()
+    tree = FSTree(contents)
+    tree['f'] = None
+    assert tree == FSTree({'b': None, 'd': None, 'e': None, 'f': None})
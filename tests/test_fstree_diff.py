@@ -0,0 +1,176 @@
+"""
+Tests of FSTree.diff() and FSTree.digest().
+"""
+
+import os
+import pickle
+
+from roedoe_lib import FSTree
+from roedoe_lib.diff import TreeDiff
+
+
+def j(*parts):
+    return os.path.join(*parts)
+
+
+def sample_tree():
+    return FSTree({
+        'a': FSTree({
+            'b': FSTree({'c': None, 'd': None}),
+            'e': None,
+        }),
+        'f': None,
+        'g': FSTree({'h': FSTree({'i': None})}),
+    }, metadata='top')
+
+
+def test_no_changes():
+    """Test trees with the same structure have no differences."""
+    tree = sample_tree()
+    assert tree.diff(tree) == TreeDiff([], [], [])
+    assert tree.diff(sample_tree()) == TreeDiff([], [], [])
+    assert tree.digest() == sample_tree().digest()
+    # Metadata doesn't count.
+    other = sample_tree()
+    other['a'].metadata = 'changed'
+    assert tree.diff(other) == TreeDiff([], [], [])
+
+
+def test_changes():
+    """Test files and directories added, removed and changed."""
+    old = sample_tree()
+    new = sample_tree()
+    new['a']['b']['x'] = None
+    new['a']['e'] = FSTree({'y': None, 'z': FSTree({'w': None})})
+    new['f'] = FSTree({})
+    new['g'] = None
+    new['k'] = FSTree({'l': None})
+    diff = old.diff(new)
+    assert diff.added == [
+        j('a', 'b', 'x'), j('a', 'e', 'y'), j('a', 'e', 'z'),
+        j('a', 'e', 'z', 'w'), 'k', j('k', 'l'),
+    ]
+    assert diff.removed == [j('g', 'h'), j('g', 'h', 'i')]
+    assert diff.changed == [j('a', 'e'), 'f', 'g']
+    back = new.diff(old)
+    assert back.added == diff.removed
+    assert back.removed == diff.added
+    assert back.changed == diff.changed
+
+
+def test_file_changes(scratch):
+    """Test files whose recorded stats or digests differ are changed."""
+    tmpdir = scratch({'a': {'b.txt': 'one'}, 'c.txt': 'two', 'd.txt': ''})
+    fields = ('size',)
+    old = FSTree.at_path(
+        tmpdir, {tmpdir}, stat_fields=fields).hash_files(tmpdir)
+    with open(os.path.join(tmpdir, 'a', 'b.txt'), 'w') as f:
+        f.write('three')
+    with open(os.path.join(tmpdir, 'c.txt'), 'w') as f:
+        f.write('owt')
+    new = FSTree.at_path(tmpdir, {tmpdir}, stat_fields=fields)
+    # Only the sizes are recorded in both, and c.txt's is the same.
+    assert old.diff(new) == TreeDiff([], [], [j('a', 'b.txt')])
+    new = new.hash_files(tmpdir)
+    assert old.diff(new) == TreeDiff([], [], [j('a', 'b.txt'), 'c.txt'])
+    assert new.diff(old).changed == old.diff(new).changed
+    # Trees without recorded metadata can't tell.
+    plain = FSTree.at_path(tmpdir, {tmpdir})
+    assert old.diff(plain) == TreeDiff([], [], [])
+
+
+def test_same_as_sets(basic, scratch):
+    """Test diffs agree with comparing sets of paths."""
+    _, tmpdir = basic
+    old = FSTree.at_path(tmpdir, {tmpdir})
+    other = scratch({
+        'a': {'a': {'d': None, 'x': None}, 'b': {'y': None}, 'f': None},
+        'h': None,
+        'k': {'l': None},
+    })
+    new = FSTree.at_path(other, {other})
+
+    old_paths = set(FSTree.iter_path(tmpdir, {tmpdir}))
+    new_paths = set(FSTree.iter_path(other, {other}))
+    diff = old.diff(new)
+    changed = {
+        path for path, is_dir in old_paths if (path, not is_dir) in new_paths}
+    assert set(diff.changed) == changed
+    assert set(diff.added) == {
+        path for path, _ in new_paths - old_paths} - changed
+    assert set(diff.removed) == {
+        path for path, _ in old_paths - new_paths} - changed
+
+
+def test_unchanged_subtrees_skipped():
+    """Test shared and equal subtrees aren't walked."""
+    shared = FSTree({'s': None})
+    old = FSTree({'a': shared, 'b': FSTree({'c': None}), 'x': None})
+    new = FSTree({'a': shared, 'b': FSTree({'c': None}), 'y': None})
+    old.digest()
+    new.digest()
+    # Changes made behind __setitem__'s back aren't noticed, which shows
+    # the subtrees aren't looked into.
+    shared.contents['t'] = None
+    new['b'].contents['d'] = None
+    assert old.diff(new) == TreeDiff(['y'], ['x'], [])
+
+
+def test_digests_cached():
+    """Test digests are kept until a tree is changed."""
+    tree = sample_tree()
+    digest = tree.digest()
+    assert tree['a']._digest == sample_tree()['a'].digest()
+    assert tree.digest() is digest
+    tree['new'] = None
+    assert tree.digest() != digest
+    assert tree['g']._digest is not None
+    del tree.contents['new']
+    assert tree.digest() != digest
+    tree['f'] = None
+    assert tree.digest() == digest
+    # Only the directory changed forgets its digest.
+    a_digest = tree['a'].digest()
+    tree['a']['b'].metadata = 'changed'
+    assert tree['a']['b']._digest is None
+    assert tree['a'].digest() is a_digest
+    assert tree.with_item(os.path.join('a', 'b', 'new'), None).digest() != (
+        digest)
+
+
+def test_digest_distinguishes():
+    """Test different structures have different digests."""
+    digests = {
+        FSTree(contents).digest() for contents in (
+            {},
+            {'a': None},
+            {'a': FSTree({})},
+            {'b': None},
+            {'a': None, 'b': None},
+            {'ab': None},
+            {'a': FSTree({'b': None})},
+            {'a': FSTree({'b': FSTree({})})},
+        )
+    }
+    assert len(digests) == 8
+
+
+def test_pickle():
+    """Test digests survive pickling."""
+    tree = sample_tree()
+    tree.digest()
+    unpickled = pickle.loads(pickle.dumps(tree))
+    assert unpickled._digest is not None
+    assert unpickled['a']['b']._digest is not None
+    assert unpickled.digest() == tree.digest()
+
+
+def test_deep():
+    """Test very deep trees are fine."""
+    old = FSTree({'f': None})
+    new = FSTree({'g': None})
+    for _ in range(5000):
+        old = FSTree({'d': old})
+        new = FSTree({'d': new})
+    path = j(*['d'] * 5000)
+    assert old.diff(new) == TreeDiff([j(path, 'g')], [j(path, 'f')], [])
@@ -0,0 +1,179 @@
+"""
+Tests of FSTree equality and hashing, and FSTree.dedup().
+"""
+
+import os
+import pickle
+from collections import OrderedDict
+
+from roedoe_lib import FSTree
+
+
+def vendored_tree():
+    """A tree with the same package vendored in several places."""
+
+    def package():
+        return FSTree({
+            'lib': FSTree({'x.py': None, 'y.py': None}, metadata={'v': 1}),
+            'README': None,
+        })
+
+    return FSTree({
+        'app': FSTree({'vendor': FSTree({'pkg': package()})}),
+        'tool': FSTree({'vendor': FSTree({'pkg': package()})}),
+        'pkg': package(),
+        'other': FSTree({'lib': FSTree({'x.py': None, 'y.py': None})}),
+    })
+
+
+def test_equality():
+    """Test equality covers names, kinds and metadata."""
+    tree = vendored_tree()
+    assert tree == vendored_tree()
+    assert tree != FSTree({})
+    assert tree != None  # noqa
+    assert tree != {'app': None}
+    for change in (
+        lambda t: t['pkg'].__setitem__('z', None),
+        lambda t: t['pkg'].__setitem__('README', FSTree({})),
+        lambda t: setattr(t['pkg']['lib'], 'metadata', {'v': 2}),
+        lambda t: setattr(t, 'metadata', 'meta'),
+    ):
+        other = vendored_tree()
+        assert other == tree
+        change(other)
+        assert other != tree
+        assert tree != other
+    assert FSTree({'a': None}) != FSTree({'a': FSTree({})})
+    assert FSTree({'a': None}) != FSTree({'a': 'value'})
+
+
+def test_changed_in_place():
+    """Test equality notices changes made to contents and metadata directly."""
+    first = FSTree({'x': None}, {'k': 1})
+    second = FSTree({'x': None}, {'k': 1})
+    assert first == second
+    first.metadata['k'] = 2
+    assert first != second
+    first.metadata['k'] = 1
+    first.contents['y'] = None
+    assert first != second
+    second.contents['y'] = None
+    assert first == second
+    # Deep down, too.
+    tree = vendored_tree()
+    tree.digest()
+    tree['pkg']['lib'].contents['z.py'] = None
+    assert tree != vendored_tree()
+
+
+def test_shared_parts():
+    """Test trees sharing directories needn't compare those."""
+    tree = vendored_tree()
+    new = tree.with_item(os.path.join('pkg', 'new'), None)
+    assert new['app'] is tree['app']
+    assert new != tree
+    assert new.without_item(os.path.join('pkg', 'new')) == tree
+
+
+def test_metadata_equality():
+    """Test metadata equal by Python's rules makes trees equal."""
+    for first, second in (
+        (1, 1.0),
+        (True, 1),
+        ({'a': 1, 'b': [1, 2]}, OrderedDict([('b', [1, 2]), ('a', 1)])),
+        ({1, 2}, frozenset([2, 1])),
+        ('caf\udce9', 'caf\udce9'),
+    ):
+        assert first == second
+        assert FSTree({}, first) == FSTree({}, second)
+        assert hash(FSTree({}, first)) == hash(FSTree({}, second))
+    for first, second in (
+        (1, 2),
+        (1.5, 2.5),
+        ('1', 1),
+        ([1], (1,)),
+        ({'a': 1}, {'a': 2}),
+        ({'a': 1}, {'b': 1}),
+        (None, 0),
+        (b'a', 'a'),
+    ):
+        assert first != second
+        assert FSTree({}, first) != FSTree({}, second)
+
+
+def test_hash():
+    """Test trees can be used in sets and as keys."""
+    tree = vendored_tree()
+    assert hash(tree) == hash(vendored_tree())
+    assert len({tree, vendored_tree(), tree['pkg'], tree['app']}) == 3
+    cache = {tree: 'cached'}
+    assert cache[vendored_tree()] == 'cached'
+
+
+def test_compact_and_snapshot(tmp_path):
+    """Test trees with other contents compare as they should."""
+    tree = vendored_tree()
+    assert tree.compact() == tree
+    path = str(tmp_path / 'tree.snapshot')
+    tree.to_snapshot(path)
+    assert FSTree.from_snapshot(path) == tree
+
+
+def test_dedup():
+    """Test identical directories become one."""
+    tree = vendored_tree()
+    deduped = tree.dedup()
+    assert deduped == tree
+    pkg = deduped['pkg']
+    assert deduped['app']['vendor']['pkg'] is pkg
+    assert deduped['tool']['vendor']['pkg'] is pkg
+    assert deduped['app']['vendor'] is deduped['tool']['vendor']
+    # The same names, but different metadata.
+    assert deduped['other']['lib'] is not pkg['lib']
+    # What's already unique is shared with the original.
+    assert deduped['other'] is tree['other']
+    assert any(pkg is original for original in (
+        tree['pkg'],
+        tree['app']['vendor']['pkg'],
+        tree['tool']['vendor']['pkg'],
+    ))
+    # The original's unchanged.
+    assert tree['app']['vendor']['pkg'] is not tree['pkg']
+    assert len(pickle.dumps(deduped)) < len(pickle.dumps(tree))
+    assert pickle.loads(pickle.dumps(deduped)) == tree
+
+
+def test_dedup_compact():
+    """Test compact contents stay compact."""
+    deduped = vendored_tree().compact().dedup()
+    assert type(deduped.contents) is type(vendored_tree().compact().contents)
+    assert deduped['app']['vendor']['pkg'] is deduped['pkg']
+
+
+def test_snapshot_dedup(tmp_path):
+    """Test identical directories are written to snapshots once."""
+    path = str(tmp_path / 'tree.snapshot')
+    distinct = vendored_tree()
+    distinct['app']['vendor']['pkg'].metadata = 'app'
+    distinct['tool']['vendor']['pkg'].metadata = 'tool'
+    distinct.to_snapshot(path)
+    distinct_size = os.path.getsize(path)
+    tree = vendored_tree()
+    tree.to_snapshot(path)
+    assert os.path.getsize(path) < distinct_size
+    loaded = FSTree.from_snapshot(path)
+    assert loaded == tree
+    assert loaded['app']['vendor']['pkg'] == loaded['pkg']
+
+
+def test_deep():
+    """Test very deep trees are fine."""
+    first = FSTree({'f': None})
+    second = FSTree({'f': None})
+    for _ in range(5000):
+        first = FSTree({'d': first})
+        second = FSTree({'d': second})
+    assert first == second
+    assert hash(first) == hash(second)
+    assert first.dedup() == first
@@ -183,3 +183,50 @@ def test_filter_dir_path_link_resolved(with_suffixes):
     prefix = re.compile('^.*zoom.*$')
     filtered = tree.filter([prefix])
     assert filtered == FSTree({})
+
+
+def test_filter_shares_unchanged(with_suffixes):
+    """
+    Test that directories which lose nothing are shared with the original
+    tree, and the rest are copies, leaving the original as it was.
+    """
+    _, tmpdir = with_suffixes
+    tree = FSTree.at_path(tmpdir, {tmpdir})
+    before = FSTree.at_path(tmpdir, {tmpdir})
+    filtered = tree.filter([re.compile('^foo/.*'), re.compile(r'.*\.rst$')])
+    assert filtered['foo'] is tree['foo']
+    assert filtered['fred'] is not tree['fred']
+    assert filtered['fred'] == FSTree({'klang.rst': None})
+    assert tree == before
+    everything = tree.filter([re.compile('')])
+    assert everything is tree
+
+
+def test_filter_keeps_metadata():
+    """Test metadata is kept, on copies and shared directories alike."""
+    tree = FSTree({
+        'a': FSTree({
+            'b': FSTree({'c.md': None}, metadata={'x': 1}),
+            'd.txt': None,
+        }, metadata={'y': 2}),
+        'e': FSTree({'f.txt': None}, metadata={'z': 3}),
+    }, metadata={})
+    filtered = tree.filter([re.compile(r'.*\.md$')])
+    assert filtered == FSTree({
+        'a': FSTree({
+            'b': FSTree({'c.md': None}, metadata={'x': 1}),
+        }, metadata={'y': 2}),
+    })
+    assert filtered['a']['b'] is tree['a']['b']
+
+
+def test_filter_deep():
+    """Test a tree deeper than would be comfortable quadratically."""
+    tree = leaf = FSTree({'file.md': None, 'file.txt': None})
+    for i in range(500):
+        tree = FSTree({'d{}'.format(i): tree})
+    filtered = tree.filter([re.compile(r'.*\.md$')])
+    for i in reversed(range(500)):
+        filtered = filtered['d{}'.format(i)]
+    assert filtered == FSTree({'file.md': None})
+    assert leaf['file.txt'] is None
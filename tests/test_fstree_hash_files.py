@@ -0,0 +1,144 @@
+"""
+Tests of FSTree.hash_files() and FSTree.file_hash().
+"""
+
+import hashlib
+import os
+
+import pytest
+
+from roedoe_lib import FSTree, hashing
+
+
+SPEC = {
+    'a': {'b.txt': 'hello', 'c': {'d.txt': 'world!'}},
+    'e.txt': '',
+}
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+@pytest.mark.parametrize('workers', (None, 3))
+def test_hash_files(scratch, workers):
+    """Test every file gets its digest, size and mtime."""
+    top = scratch(SPEC)
+    tree = FSTree.at_path(top, {top})
+    hashed = tree.hash_files(top, workers=workers)
+    b = os.path.join('a', 'b.txt')
+    d = os.path.join('a', 'c', 'd.txt')
+    assert hashed.file_hash(b) == sha256('hello')
+    assert hashed.file_hash(d) == sha256('world!')
+    assert hashed.file_hash('e.txt') == sha256('')
+    st = os.stat(os.path.join(top, b))
+    assert hashed.stats(b) == {'size': 5, 'mtime_ns': st.st_mtime_ns}
+    # The original's untouched, and the structure's the same.
+    assert tree.file_hash(b) is None
+    assert tree.metadata is None
+    assert hashed.diff(tree) == ([], [], [])
+    with pytest.raises(KeyError):
+        hashed.file_hash('missing')
+
+
+def test_other_algorithm(scratch):
+    """Test hashing with an algorithm other than the default."""
+    top = scratch({'f': 'text'})
+    hashed = FSTree.at_path(top, {top}).hash_files(top, 'blake2b')
+    assert hashed.file_hash('f', 'blake2b') == (
+        hashlib.blake2b(b'text').hexdigest())
+    assert hashed.file_hash('f') is None
+
+
+def test_bad_algorithm(scratch):
+    """Test algorithms which don't exist or have no fixed digest length."""
+    top = scratch({'f': 'text'})
+    tree = FSTree.at_path(top, {top})
+    for algorithm in ('no-such-hash', 'shake_128'):
+        with pytest.raises(ValueError):
+            tree.hash_files(top, algorithm)
+
+
+def test_keeps_metadata(scratch):
+    """Test stat fields from the walk are kept alongside digests."""
+    top = scratch(SPEC)
+    tree = FSTree.at_path(top, {top}, stat_fields=('inode', 'size'))
+    hashed = tree.hash_files(top)
+    b = os.path.join('a', 'b.txt')
+    assert hashed.stats('a') == tree.stats('a')
+    assert hashed.stats(b)['inode'] == tree.stats(b)['inode']
+    assert hashed.file_hash(b) == sha256('hello')
+    with pytest.raises(ValueError):
+        FSTree({'f': None}, 'not a dict').hash_files(top)
+
+
+def test_big_file(scratch, monkeypatch):
+    """Test files big enough to be mmapped, or read in several chunks."""
+    text = 'x' * 1000
+    top = scratch({'big': text})
+    tree = FSTree.at_path(top, {top})
+    monkeypatch.setattr(hashing, 'CHUNK_SIZE', 64)
+    monkeypatch.setattr(hashing, '_buffers', hashing.threading.local())
+    assert tree.hash_files(top).file_hash('big') == sha256(text)
+    monkeypatch.setattr(hashing, 'MMAP_SIZE', 100)
+    assert tree.hash_files(top).file_hash('big') == sha256(text)
+
+
+def test_deduped(scratch):
+    """Test a tree with the same node at several paths."""
+    top = scratch({'a': {'f': 'one'}, 'b': {'f': 'two'}})
+    tree = FSTree.at_path(top, {top}).dedup()
+    assert tree['a'] is tree['b']
+    hashed = tree.hash_files(top, workers=2)
+    assert hashed.file_hash(os.path.join('a', 'f')) == sha256('one')
+    assert hashed.file_hash(os.path.join('b', 'f')) == sha256('two')
+
+
+def test_unreadable(scratch):
+    """Test files gone since the walk get no digest."""
+    top = scratch({'f': 'text', 'g': 'more'})
+    tree = FSTree.at_path(top, {top})
+    os.remove(os.path.join(top, 'g'))
+    hashed = tree.hash_files(top)
+    assert hashed.file_hash('f') == sha256('text')
+    assert hashed.file_hash('g') is None
+    assert 'g' in hashed
+
+
+def test_incremental(scratch, monkeypatch):
+    """Test only changed files are read again given a previous tree."""
+    top = scratch(SPEC)
+    previous = FSTree.at_path(top, {top}).hash_files(top)
+    b = os.path.join(top, 'a', 'b.txt')
+    with open(b, 'w') as f:
+        f.write('goodbye')
+
+    read = []
+    new = hashing.hashlib.new
+
+    def counting_new(algorithm):
+        read.append(algorithm)
+        return new(algorithm)
+
+    monkeypatch.setattr(hashing.hashlib, 'new', counting_new)
+    hashed = FSTree.at_path(top, {top}).hash_files(top, previous=previous)
+    # Once to check the algorithm, once for the changed file.
+    assert len(read) == 2
+    assert hashed.file_hash(os.path.join('a', 'b.txt')) == sha256('goodbye')
+    assert hashed.file_hash(os.path.join('a', 'c', 'd.txt')) == (
+        sha256('world!'))
+    assert hashed.stats(os.path.join('a', 'b.txt'))['size'] == 7
+
+    # Stats recorded by the walk save statting unchanged files again.
+    statted = []
+    stat = os.stat
+
+    def counting_stat(path, *args, **kwargs):
+        statted.append(path)
+        return stat(path, *args, **kwargs)
+
+    tree = FSTree.at_path(top, {top}, stat_fields=('size', 'mtime_ns'))
+    monkeypatch.setattr(hashing.os, 'stat', counting_stat)
+    again = tree.hash_files(top, previous=hashed)
+    assert not statted
+    assert again.file_hash(os.path.join('a', 'b.txt')) == sha256('goodbye')
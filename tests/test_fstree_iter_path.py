@@ -0,0 +1,125 @@
+"""
+Tests of FSTree.iter_path() class method.
+"""
+
+import os
+
+import pytest
+
+from roedoe_lib import FSTree, ignore, walk
+
+
+FIXTURES = (
+    'basic',
+    'mutual_empty',
+    'mutual_one_file',
+    'triple_linked',
+    'with_suffixes',
+    'odd_entries',
+    'cross_linked',
+    'ignored_alias',
+)
+
+
+def flattened(tree, prefix=''):
+    """(rel_path, is_dir) pairs for a tree, in pre-order."""
+    pairs = []
+    for name, value in tree.contents.items():
+        path = os.path.join(prefix, name)
+        pairs.append((path, value is not None))
+        if value is not None:
+            pairs.extend(flattened(value, path))
+    return pairs
+
+
+@pytest.mark.parametrize('fixture', FIXTURES)
+@pytest.mark.parametrize('workers', (None, 2))
+def test_same_as_at_path(request, fixture, workers):
+    """Test iter_path() yields exactly what at_path() finds, in order."""
+    _, tmpdir = request.getfixturevalue(fixture)
+    tree = FSTree.at_path(tmpdir, {tmpdir})
+    pairs = list(FSTree.iter_path(tmpdir, {tmpdir}, workers=workers))
+    assert pairs == flattened(tree)
+
+
+def test_basic(basic):
+    """Test what's yielded for the basic tree, empty directory and all."""
+    _, tmpdir = basic
+    assert list(FSTree.iter_path(tmpdir, {tmpdir})) == [
+        ('a', True),
+        ('a/a', True),
+        ('a/a/d', False),
+        ('a/a/e', False),
+        ('a/b', False),
+        ('a/f', False),
+        ('h', True),
+        ('h/a', True),
+        ('h/a/i', False),
+        ('j', True),
+        ('j/a', False),
+    ]
+
+
+def test_ignores(cross_linked):
+    """Test ignores, and walks starting inside trees, are as for at_path()."""
+    _, tmpdir = cross_linked
+    ignores = ignore('c2/', 'f1', 'up')
+    assert list(FSTree.iter_path(tmpdir, {tmpdir}, ignores)) == flattened(
+        FSTree.at_path(tmpdir, {tmpdir}, ignores))
+    top = os.path.join(tmpdir, 'b3')
+    assert list(FSTree.iter_path(top, {tmpdir})) == flattened(
+        FSTree.at_path(top, {tmpdir}))
+
+
+def test_ignore_files(scratch):
+    """Test ignore files are read as for at_path()."""
+    tmpdir = scratch({
+        '.gitignore': '*.log\nbuild/\n',
+        'a.log': None,
+        'a.py': None,
+        'build': {'out': None},
+        'src': {
+            '.gitignore': '!keep.log\n',
+            'keep.log': None,
+            'x.log': None,
+        },
+    })
+    pairs = list(FSTree.iter_path(
+        tmpdir, {tmpdir}, ignore_files=['.gitignore']))
+    assert pairs == flattened(
+        FSTree.at_path(tmpdir, {tmpdir}, ignore_files=['.gitignore']))
+    assert ('src/keep.log', False) in pairs
+    assert ('src/x.log', False) not in pairs
+
+
+def test_top_excluded(basic):
+    """Test nothing's yielded when the top is ignored or not allowed."""
+    _, tmpdir = basic
+    assert list(FSTree.iter_path(tmpdir, {tmpdir}, ignore(tmpdir))) == []
+    assert list(FSTree.iter_path(tmpdir, {os.path.join(tmpdir, 'a')})) == []
+
+
+@pytest.mark.parametrize('workers', (None, 4))
+def test_early_stop(scratch, monkeypatch, workers):
+    """Test stopping early lists no more than needed."""
+    tmpdir = scratch({
+        'd{}'.format(i): {'f{}'.format(j): None for j in range(3)}
+        for i in range(50)
+    })
+    listed = []
+    list_dir = walk.list_dir
+
+    def counting_list_dir(path, *args):
+        listed.append(path)
+        return list_dir(path, *args)
+
+    monkeypatch.setattr(walk, 'list_dir', counting_list_dir)
+    paths = FSTree.iter_path(tmpdir, {tmpdir}, workers=workers)
+    assert listed == []
+    assert next(paths) == ('d0', True)
+    assert next(paths) == ('d0/f0', False)
+    paths.close()
+    with pytest.raises(StopIteration):
+        next(paths)
+    # Just the top and d0, plus whatever was listed ahead of the walk.
+    assert len(listed) <= 2 + 4 * walk.PREFETCH_PER_WORKER
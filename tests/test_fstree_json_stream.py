@@ -0,0 +1,129 @@
+"""
+Tests of base.FSTree.dump_json() and FSTree.load_json().
+"""
+
+import io
+import json
+
+import pytest
+
+from roedoe_lib import FSTree
+from roedoe_lib.jsonstream import dump_tree, load_tree
+
+
+def sample_tree():
+    return FSTree({
+        'b': FSTree({
+            'x.py': None,
+            'empty': FSTree({}),
+        }, metadata={'inode': 5, 'names': ['p', 'q"\\'], 'f': 1.5}),
+        'a.py': None,
+        'c': FSTree({'d': FSTree({'z': None})}, metadata=0),
+        'caf\udce9': None,
+        'café': FSTree({'e': None}, metadata='mét☃'),
+    }, metadata={'top': True})
+
+
+def trees(basic):
+    _, tmpdir = basic
+    return [
+        FSTree.at_path(tmpdir, {tmpdir}),
+        sample_tree(),
+        FSTree({}),
+        FSTree({}, metadata={'m': None}),
+    ]
+
+
+def dumped(tree, chunk_size=None):
+    fp = io.StringIO()
+    if chunk_size is None:
+        tree.dump_json(fp)
+    else:
+        dump_tree(tree, fp, chunk_size)
+    return fp.getvalue()
+
+
+def test_dump_same_as_to_json(basic):
+    """Test dump_json() writes what to_json() returns."""
+    for tree in trees(basic):
+        assert dumped(tree) == tree.to_json()
+        assert dumped(tree, chunk_size=1) == tree.to_json()
+
+
+def test_load_same_as_from_json(basic):
+    """Test load_json() reads what from_json() does."""
+    for tree in trees(basic):
+        for text in (tree.to_json(), tree.to_json(indent=4)):
+            expected = FSTree.from_json(text)
+            assert FSTree.load_json(io.StringIO(text)) == expected
+            assert FSTree.load_json(io.BytesIO(text.encode())) == expected
+            for chunk_size in (1, 2, 7):
+                assert load_tree(
+                    io.StringIO(text), FSTree, chunk_size) == expected
+                assert load_tree(
+                    io.BytesIO(text.encode()), FSTree, chunk_size) == expected
+            assert FSTree.load_json(io.StringIO(text)).to_json() == (
+                expected.to_json())
+
+
+def test_load_any_order():
+    """Test keys can come in any order, with others ignored."""
+    text = json.dumps({
+        'fstree': {
+            'metadata': {'m': [1, {'contents': {}}]},
+            'other': {'contents': {'x': None}},
+            'contents': {'f': None, 'd': {'metadata': 2, 'contents': {}}},
+        },
+        'version': '1.0.0',
+        'extra': [1, 2, 3],
+        'type': 'FSTree',
+    })
+    tree = FSTree.load_json(io.StringIO(text))
+    assert tree == FSTree.from_json(text)
+    assert tree.metadata == {'m': [1, {'contents': {}}]}
+    assert tree['d'].metadata == 2
+
+
+def test_load_bad():
+    """Test documents from_json() wouldn't accept."""
+    for text in (
+        '{"type": "other", "fstree": {"contents": {}}}',
+        '{"fstree": {"contents": {}}}',
+        '{"type": "FSTree"}',
+        '[]',
+        '',
+        '{"type": "FSTree", "fstree": {"contents": {}}} x',
+        '{"type": "FSTree", "fstree": {"contents": {"a": null,}}}',
+        '{"type": "FSTree", "fstree": {"contents": {"a": null}',
+        '{"type": "FSTree", "fstree": {"contents": {"a": nul}}}',
+        '{"type": "FSTree" "fstree": {"contents": {}}}',
+    ):
+        with pytest.raises(ValueError):
+            FSTree.load_json(io.StringIO(text))
+
+
+def test_deep():
+    """Test very deep trees are fine."""
+    tree = FSTree({'f': None})
+    for _ in range(5000):
+        tree = FSTree({'d': tree}, metadata=1)
+    text = dumped(tree)
+    assert text.count('{"contents": {"d": ') == 5000
+    loaded = load_tree(io.StringIO(text), FSTree, 100)
+    for _ in range(5000):
+        assert loaded.metadata == 1
+        loaded = loaded['d']
+    assert loaded.dict == {'contents': {'f': None}}
+
+
+def test_round_trip_file(basic, tmp_path):
+    """Test writing to and reading from a real file."""
+    path = str(tmp_path / 'tree.json')
+    for tree in trees(basic):
+        expected = FSTree.from_json(tree.to_json())
+        with open(path, 'w') as fp:
+            tree.dump_json(fp)
+        with open(path) as fp:
+            assert FSTree.load_json(fp) == expected
+        with open(path, 'rb') as fp:
+            assert FSTree.load_json(fp) == expected
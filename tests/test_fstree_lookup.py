@@ -0,0 +1,140 @@
+"""
+Tests of FSTree.lookup(), FSTree.__contains__() and FSTree.contains_many().
+"""
+
+import os
+import pickle
+
+import pytest
+
+from roedoe_lib import FSTree
+
+
+def sample_tree():
+    return FSTree({
+        'a': FSTree({
+            'b': FSTree({'c': FSTree({'d.txt': None})}),
+            'e': None,
+        }),
+        'f': None,
+    })
+
+
+def test_lookup():
+    """Test looking up files and directories by path."""
+    tree = sample_tree()
+    assert tree.lookup('f') is None
+    assert tree.lookup('a') is tree['a']
+    assert tree.lookup(os.path.join('a', 'b', 'c')) is tree['a']['b']['c']
+    assert tree.lookup(os.path.join('a', 'b', 'c', 'd.txt')) is None
+    for missing in ('', 'x', os.path.join('a', 'x'), 'a' + os.sep, 1):
+        with pytest.raises(KeyError):
+            tree.lookup(missing)
+    assert tree['a'].lookup(os.path.join('b', 'c', 'd.txt')) is None
+
+
+def test_contains():
+    """Test membership of paths."""
+    tree = sample_tree()
+    assert os.path.join('a', 'b', 'c', 'd.txt') in tree
+    assert 'a' in tree
+    assert 'd.txt' not in tree
+    assert '' not in tree
+    assert tree.contains_many([
+        'f', 'x', os.path.join('a', 'e'), os.path.join('a', 'e', 'x'),
+    ]) == [True, False, True, False]
+    assert tree.contains_many(iter([])) == []
+
+
+def test_same_as_walk(basic):
+    """Test every path a walk finds can be looked up."""
+    _, tmpdir = basic
+    tree = FSTree.at_path(tmpdir, {tmpdir})
+    pairs = list(FSTree.iter_path(tmpdir, {tmpdir}))
+    assert all(tree.contains_many(path for path, _ in pairs))
+    for path, is_dir in pairs:
+        assert isinstance(tree.lookup(path), FSTree) == is_dir
+    assert len(tree._path_index()) == len(pairs)
+
+
+def test_index_built_once():
+    """Test the index is built by contains_many(), and then reused."""
+    tree = sample_tree()
+    assert 'f' in tree
+    tree.lookup('a')
+    assert tree._index is None
+    tree.contains_many(['a'])
+    index = tree._index
+    assert index is not None
+    tree.contains_many(['f'])
+    assert tree._index is index
+
+
+def test_invalidated_by_setitem():
+    """Test changes anywhere in the tree are noticed."""
+    tree = sample_tree()
+    assert os.path.join('a', 'g') not in tree
+    tree['a']['g'] = None
+    assert os.path.join('a', 'g') in tree
+    tree['a']['b'] = None
+    assert os.path.join('a', 'b') in tree
+    assert tree.lookup(os.path.join('a', 'b')) is None
+    assert os.path.join('a', 'b', 'c') not in tree
+    tree['h'] = FSTree({'i': None})
+    assert tree.contains_many([os.path.join('h', 'i')]) == [True]
+
+
+def test_compact():
+    """Test lookups in compact trees."""
+    tree = sample_tree().compact()
+    assert os.path.join('a', 'b', 'c', 'd.txt') in tree
+    tree['a']['z'] = None
+    assert os.path.join('a', 'z') in tree
+
+
+def test_pickle():
+    """Test the index survives pickling, if it's up to date."""
+    tree = sample_tree()
+    tree.contains_many(['a'])
+    unpickled = pickle.loads(pickle.dumps(tree))
+    assert unpickled == tree
+    assert unpickled._index is not None
+    assert unpickled.lookup('a') is unpickled['a']
+    assert unpickled['a']._index is None
+    # Out of date indexes aren't pickled.
+    tree['x'] = None
+    unpickled = pickle.loads(pickle.dumps(tree))
+    assert unpickled._index is None
+    assert 'x' in unpickled
+    # Nor are missing ones.
+    assert pickle.loads(pickle.dumps(sample_tree()))._index is None
+
+
+# FSTree({'a': FSTree({'b.txt': None}, {'x': 1}), 'c.txt': None}), as
+# pickled (protocol 2) before FSTree had slots.
+OLD_PICKLE = (
+    b'\x80\x02croedoe_lib.base\nFSTree\nq\x00)\x81q\x01}q\x02(X\x08\x00'
+    b'\x00\x00contentsq\x03}q\x04(X\x01\x00\x00\x00aq\x05h\x00)\x81q\x06'
+    b'}q\x07(h\x03}q\x08X\x05\x00\x00\x00b.txtq\tNsX\x08\x00\x00\x00'
+    b'metadataq\n}q\x0bX\x01\x00\x00\x00xq\x0cK\x01subX\x05\x00\x00\x00'
+    b'c.txtq\rNuh\nNub.'
+)
+
+
+def test_old_pickles():
+    """Test trees pickled before FSTree had slots can be unpickled."""
+    tree = pickle.loads(OLD_PICKLE)
+    assert tree == FSTree({
+        'a': FSTree({'b.txt': None}, {'x': 1}),
+        'c.txt': None,
+    })
+    assert tree['a'].metadata == {'x': 1}
+    assert os.path.join('a', 'b.txt') in tree
+
+
+def test_deep():
+    """Test very deep trees are fine."""
+    tree = FSTree({'f': None})
+    for _ in range(5000):
+        tree = FSTree({'d': tree})
+    assert os.path.join(*['d'] * 5000 + ['f']) in tree
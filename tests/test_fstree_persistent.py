@@ -0,0 +1,137 @@
+"""
+Tests of FSTree.with_item(), FSTree.without_item() and FSTree.with_metadata().
+"""
+
+import os
+import re
+
+import pytest
+
+from roedoe_lib import FSTree
+
+
+def sample_tree():
+    return FSTree({
+        'a': FSTree({
+            'b': FSTree({'c.txt': None}),
+            'd.txt': None,
+        }, {'files': {'d.txt': {'size': 1}}, 'mtime_ns': 1}),
+        'e': FSTree({'f.txt': None}),
+    })
+
+
+def test_with_item():
+    """Test adding and replacing things, sharing everything else."""
+    tree = sample_tree()
+    before = tree.dict
+    path = os.path.join('a', 'b', 'new.txt')
+    new = tree.with_item(path, None)
+    assert path in new
+    assert path not in tree
+    assert tree.dict == before
+    # Just the directories along the path are copied.
+    assert new['e'] is tree['e']
+    assert new['a'] is not tree['a']
+    assert new['a'].metadata is tree['a'].metadata
+    assert new['a']['b'] is not tree['a']['b']
+    # Replacing a directory with a file and vice versa.
+    replaced = new.with_item('e', None).with_item('g', FSTree({'h': None}))
+    assert replaced.lookup('e') is None
+    assert os.path.join('g', 'h') in replaced
+    assert new['e'] is tree['e']
+
+
+def test_without_item():
+    """Test removing things, sharing everything else."""
+    tree = sample_tree()
+    new = tree.without_item(os.path.join('a', 'b'))
+    assert os.path.join('a', 'b') not in new
+    assert os.path.join('a', 'b', 'c.txt') in tree
+    assert new['e'] is tree['e']
+    assert tree.without_item('e').dict == {
+        'contents': {'a': sample_tree()['a'].dict}}
+    for missing in ('x', os.path.join('a', 'x'), os.path.join('x', 'y')):
+        with pytest.raises(KeyError):
+            tree.without_item(missing)
+
+
+def test_bad_paths():
+    """Test paths which aren't in the tree, or go through files."""
+    tree = sample_tree()
+    for path in ('', os.path.join('x', 'y'), os.path.join('a', 'd.txt', 'y'),
+                 'a' + os.sep):
+        with pytest.raises(KeyError):
+            tree.with_item(path, None)
+
+
+def test_file_metadata():
+    """Test what's recorded for a removed or replaced file is dropped."""
+    tree = sample_tree()
+    d = os.path.join('a', 'd.txt')
+    assert tree.stats(d) == {'size': 1}
+    new = tree.without_item(d)
+    assert new['a'].metadata == {'mtime_ns': 1}
+    assert tree['a'].metadata['files'] == {'d.txt': {'size': 1}}
+    assert tree.with_item(d, None).stats(d) is None
+    # Metadata is only copied when it changes.
+    other = tree.with_item(os.path.join('a', 'other.txt'), None)
+    assert other['a'].metadata is tree['a'].metadata
+
+
+def test_with_metadata():
+    """Test giving directories new metadata."""
+    tree = sample_tree()
+    new = tree.with_metadata({'x': 1}, os.path.join('a', 'b'))
+    assert new['a']['b'].metadata == {'x': 1}
+    assert tree['a']['b'].metadata is None
+    assert new['a']['b'].contents == tree['a']['b'].contents
+    assert new['e'] is tree['e']
+    top = tree.with_metadata('top')
+    assert top.metadata == 'top'
+    assert tree.metadata is None
+    assert top['a'] is tree['a']
+    with pytest.raises(KeyError):
+        tree.with_metadata({}, os.path.join('a', 'd.txt'))
+
+
+def test_compact():
+    """Test compact trees stay compact."""
+    tree = sample_tree().compact()
+    new = tree.with_item(os.path.join('a', 'new.txt'), None)
+    assert type(new['a'].contents) is type(tree['a'].contents)
+    assert type(new.contents) is type(tree.contents)
+    assert os.path.join('a', 'new.txt') in new
+
+
+def test_caches_kept():
+    """Test cached digests and aggregates of shared parts stay valid."""
+    tree = sample_tree()
+    tree.digest()
+    tree.aggregates()
+    new = tree.with_item(os.path.join('a', 'new.txt'), None)
+    assert new['e']._digest == tree['e'].digest()
+    assert new['e']._aggregates is tree['e']._aggregates
+    assert new.aggregates().files == 4
+    assert tree.aggregates().files == 3
+    assert new != tree
+    assert tree.diff(new).added == [os.path.join('a', 'new.txt')]
+    # The old tree's caches are still up to date.
+    assert tree['e']._digest == tree['e'].digest()
+
+
+def test_snapshot_tree(tmp_path):
+    """Test deriving new trees from a read-only snapshot."""
+    path = str(tmp_path / 'tree.snapshot')
+    sample_tree().to_snapshot(path)
+    tree = FSTree.from_snapshot(path)
+    new = tree.with_item(os.path.join('a', 'b', 'new.txt'), None)
+    assert os.path.join('a', 'b', 'new.txt') in new
+    assert new['e'] is tree['e']
+
+
+def test_filter_file_metadata():
+    """Test filtering drops what's recorded for files filtered out."""
+    tree = sample_tree()
+    filtered = tree.filter([re.compile(r'.*c\.txt$')])
+    assert filtered['a'].metadata == {'mtime_ns': 1}
+    assert tree['a'].metadata['files']
@@ -0,0 +1,258 @@
+"""
+Tests of FSTree.rescan() class method.
+"""
+
+import os
+import shutil
+import time
+
+import pytest
+
+from roedoe_lib import FSTree, ignore
+
+from conftest import Link
+
+
+FIXTURES = (
+    'basic',
+    'mutual_empty',
+    'mutual_one_file',
+    'triple_linked',
+    'with_suffixes',
+    'odd_entries',
+    'cross_linked',
+    'ignored_alias',
+)
+
+
+@pytest.mark.parametrize('fixture', FIXTURES)
+def test_fresh_same_as_at_path(request, fixture):
+    """Test rescanning from nothing finds what FSTree.at_path() finds."""
+    _, tmpdir = request.getfixturevalue(fixture)
+    tree = FSTree.rescan(None, tmpdir, {tmpdir})
+    assert without_metadata(tree) == FSTree.at_path(tmpdir, {tmpdir})
+
+
+def test_metadata(basic):
+    """Test directories' mtimes and inodes are recorded."""
+    _, tmpdir = basic
+    tree = FSTree.rescan(None, tmpdir, {tmpdir})
+    st = os.stat(os.path.join(tmpdir, 'a', 'a'))
+    assert tree['a']['a'].metadata['mtime_ns'] == st.st_mtime_ns
+    assert tree['a']['a'].metadata['inode'] == st.st_ino
+    # The empty directory is remembered, though it's not in the tree.
+    assert 'g' in tree['a'].metadata['pruned']
+
+
+def test_unchanged(scratch, basic):
+    """Test rescanning an unchanged tree gives back the previous one."""
+    spec, _ = basic
+    tmpdir = aged(scratch(spec))
+    first = FSTree.rescan(None, tmpdir, {tmpdir})
+    assert FSTree.rescan(first, tmpdir, {tmpdir}) is first
+
+
+def test_file_added(scratch, basic):
+    """Test adding a file, and that what's unchanged is reused."""
+    spec, _ = basic
+    tmpdir = aged(scratch(spec))
+    first = FSTree.rescan(None, tmpdir, {tmpdir})
+    touch(tmpdir, 'a/a/new')
+    second = assert_rescan(first, tmpdir)
+    assert 'new' in second['a']['a'].contents
+    assert second['h'] is first['h']
+    assert second['j'] is first['j']
+
+
+def test_file_removed(scratch, basic):
+    """Test removing a file, so that a directory disappears."""
+    spec, _ = basic
+    tmpdir = aged(scratch(spec))
+    first = FSTree.rescan(None, tmpdir, {tmpdir})
+    os.remove(os.path.join(tmpdir, 'j', 'a'))
+    second = assert_rescan(first, tmpdir)
+    assert 'j' not in second.contents
+    assert 'j' in second.metadata['pruned']
+    assert second['a'] is first['a']
+
+
+def test_file_added_in_empty_dirs(scratch):
+    """Test adding files in (nested) directories which were empty."""
+    tmpdir = aged(scratch({
+        'a': {
+            'b': None,
+            'c': {},
+            'd': {
+                'e': {},
+            },
+        },
+    }))
+    first = FSTree.rescan(None, tmpdir, {tmpdir})
+    touch(tmpdir, 'a/c/new')
+    touch(tmpdir, 'a/d/e/new')
+    second = assert_rescan(first, tmpdir)
+    assert without_metadata(second) == FSTree({
+        'a': FSTree({
+            'b': None,
+            'c': FSTree({
+                'new': None,
+            }),
+            'd': FSTree({
+                'e': FSTree({
+                    'new': None,
+                }),
+            }),
+        }),
+    })
+
+
+def test_shadowed_freed(scratch, mutual_one_file):
+    """
+    Test that something skipped because it had already been seen turns up
+    once the thing that saw it first has gone.
+    """
+    spec, _ = mutual_one_file
+    tmpdir = aged(scratch(spec))
+    first = FSTree.rescan(None, tmpdir, {tmpdir})
+    assert 'd' not in first.contents
+    os.remove(os.path.join(tmpdir, 'a', 'b', 'c'))
+    second = assert_rescan(first, tmpdir)
+    assert 'd' in second.contents
+
+
+def test_link_retargeted_elsewhere(scratch):
+    """
+    Test a link which now resolves somewhere else, though only a link it
+    points to has changed.
+    """
+    tmpdir = aged(scratch({
+        'd1': {
+            'f1': None,
+        },
+        'd2': {
+            'f2': None,
+        },
+        'l': {
+            'x': Link('../y'),
+        },
+        'y': Link('d1'),
+    }))
+    ignores = ignore('/d1', '/d2')
+    first = FSTree.rescan(None, tmpdir, {tmpdir}, ignores)
+    assert without_metadata(first['l']['x']) == FSTree({'f1': None})
+    os.remove(os.path.join(tmpdir, 'y'))
+    os.symlink('d2', os.path.join(tmpdir, 'y'))
+    second = assert_rescan(first, tmpdir, ignores)
+    assert without_metadata(second['l']['x']) == FSTree({'f2': None})
+
+
+def test_link_target_removed(scratch):
+    """Test links to files and directories which have since gone."""
+    tmpdir = aged(scratch({
+        'a': {
+            'dlink': Link('../b/d'),
+            'flink': Link('../b/file'),
+        },
+        'b': {
+            'd': {
+                'g': None,
+            },
+            'file': None,
+        },
+    }))
+    first = FSTree.rescan(None, tmpdir, {tmpdir})
+    assert set(first['a'].contents) == {'dlink', 'flink'}
+    os.remove(os.path.join(tmpdir, 'b', 'file'))
+    second = assert_rescan(first, tmpdir)
+    assert set(second['a'].contents) == {'dlink'}
+    shutil.rmtree(os.path.join(tmpdir, 'b', 'd'))
+    third = assert_rescan(second, tmpdir)
+    assert 'a' not in third.contents
+
+
+def test_racy(scratch, basic):
+    """Test changes immediately after a scan are picked up."""
+    spec, _ = basic
+    tmpdir = scratch(spec)
+    first = FSTree.rescan(None, tmpdir, {tmpdir})
+    touch(tmpdir, 'h/a/new')
+    touch(tmpdir, 'a/g/new')
+    second = assert_rescan(first, tmpdir)
+    assert 'new' in second['h']['a'].contents
+    assert 'new' in second['a']['g'].contents
+
+
+def test_from_at_path(basic):
+    """Test rescanning a tree without the metadata rescan() records."""
+    _, tmpdir = basic
+    first = FSTree.at_path(tmpdir, {tmpdir})
+    assert_rescan(first, tmpdir)
+
+
+def test_within_tree_links(scratch, triple_linked):
+    """Test links within the tree, where nothing has changed."""
+    spec, _ = triple_linked
+    tmpdir = aged(scratch(spec))
+    first = FSTree.rescan(None, tmpdir, {tmpdir})
+    assert first['a']['b'].metadata['links'] == {
+        'c': os.path.realpath(os.path.join(tmpdir, 'd')),
+    }
+    assert FSTree.rescan(first, tmpdir, {tmpdir}) is first
+
+
+def test_only_changes_listed(scratch, cross_linked, monkeypatch):
+    """Test only directories which have changed get listed again."""
+    spec, _ = cross_linked
+    tmpdir = aged(scratch(spec))
+    first = FSTree.rescan(None, tmpdir, {tmpdir})
+    touch(tmpdir, 'b4/c1/new')
+    listed = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        listed.append(os.path.realpath(path))
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', counting_scandir)
+    second = FSTree.rescan(first, tmpdir, {tmpdir})
+    monkeypatch.undo()
+    assert listed == [os.path.realpath(os.path.join(tmpdir, 'b4', 'c1'))]
+    assert second == FSTree.rescan(None, tmpdir, {tmpdir})
+
+
+# Helpers
+
+def assert_rescan(previous, tmpdir, ignores=None):
+    """
+    Rescan some tree, asserting the result is the same as scanning it from
+    scratch, and return it.
+    """
+    tree = FSTree.rescan(previous, tmpdir, {tmpdir}, ignores)
+    assert tree == FSTree.rescan(None, tmpdir, {tmpdir}, ignores)
+    assert without_metadata(tree) == FSTree.at_path(tmpdir, {tmpdir}, ignores)
+    return tree
+
+
+def aged(tmpdir):
+    """Make everything in some tree an hour old; return the tree's path."""
+    then = time.time() - 3600
+    for path, dirs, files in os.walk(tmpdir):
+        for name in dirs + files:
+            os.utime(
+                os.path.join(path, name), (then, then),
+                follow_symlinks=False)
+    os.utime(tmpdir, (then, then))
+    return tmpdir
+
+
+def touch(tmpdir, path):
+    """Create an empty file in some tree."""
+    open(os.path.join(tmpdir, *path.split('/')), 'a').close()
+
+
+def without_metadata(tree):
+    """Copy some FSTree, without any of its metadata."""
+    return FSTree({
+        k: without_metadata(v) if isinstance(v, FSTree) else v
+        for k, v in tree.contents.items()
+    })
@@ -0,0 +1,174 @@
+"""
+Tests of base.FSTree.to_snapshot() and FSTree.from_snapshot().
+"""
+
+import os
+import pickle
+import struct
+
+import pytest
+
+from roedoe_lib import FSTree
+from roedoe_lib.snapshot import HEADER, MAGIC, SnapshotContents
+
+
+def sample_tree():
+    return FSTree({
+        'b': FSTree({
+            'x.py': None,
+            'empty': FSTree({}),
+        }, metadata={'inode': 5, 'names': ['p', 'q']}),
+        'a.py': None,
+        'c': FSTree({'d': FSTree({'z': None})}, metadata=0),
+        'caf\udce9': None,
+        'café': FSTree({'e': None}, metadata='meta'),
+    }, metadata={'top': True})
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / 'tree.snapshot')
+
+
+def test_round_trip(basic, snapshot_path):
+    """Test a tree read from a snapshot is the same as the one written."""
+    _, tmpdir = basic
+    walked = FSTree.at_path(tmpdir, {tmpdir})
+    for tree in (walked, sample_tree(), FSTree({}), FSTree({}, metadata=[])):
+        tree.to_snapshot(snapshot_path)
+        loaded = FSTree.from_snapshot(snapshot_path)
+        assert isinstance(loaded.contents, SnapshotContents)
+        assert loaded == tree
+        assert tree == loaded
+        assert loaded.dict == tree.dict
+    # Walks give contents in name order, which is kept.
+    walked.to_snapshot(snapshot_path)
+    assert FSTree.from_snapshot(snapshot_path).to_json() == walked.to_json()
+
+
+def test_shared_records(snapshot_path):
+    """
+    Test identical directories share a record, but not ones whose metadata
+    is only equal.
+    """
+    def size_of(tree):
+        tree.to_snapshot(snapshot_path)
+        return os.path.getsize(snapshot_path)
+
+    one = size_of(FSTree({'a': FSTree({'f': None}, {'v': 1})}))
+    assert size_of(FSTree({
+        'a': FSTree({'f': None}, {'v': 1}),
+        'b': FSTree({'f': None}, {'v': 1}),
+    })) < 2 * one
+    tree = FSTree({
+        'a': FSTree({'f': None}, {'v': 1}),
+        'b': FSTree({'f': None}, {'v': True}),
+        'c': FSTree({'d': FSTree({}, {'v': 1.0})}),
+        'e': FSTree({'d': FSTree({}, {'v': 1})}),
+    })
+    tree.to_snapshot(snapshot_path)
+    loaded = FSTree.from_snapshot(snapshot_path)
+    assert loaded.to_json() == tree.to_json()
+    assert loaded['b'].metadata['v'] is True
+    assert isinstance(loaded['c']['d'].metadata['v'], float)
+    # Directories which are the same object share a record too.
+    deduped = tree.dedup()
+    assert size_of(tree) > size_of(deduped)
+    assert FSTree.from_snapshot(snapshot_path).to_json() == deduped.to_json()
+
+
+def test_lookups(snapshot_path):
+    """Test looking things up in a snapshot."""
+    sample_tree().to_snapshot(snapshot_path)
+    loaded = FSTree.from_snapshot(snapshot_path)
+    assert loaded.metadata == {'top': True}
+    assert loaded['a.py'] is None
+    assert loaded['b'].metadata == {'inode': 5, 'names': ['p', 'q']}
+    assert loaded['c'].metadata == 0
+    assert loaded['c']['d']['z'] is None
+    assert loaded['café'].metadata == 'meta'
+    assert loaded['caf\udce9'] is None
+    assert 'b' in loaded.contents
+    assert 'nope' not in loaded.contents
+    assert 1 not in loaded.contents
+    with pytest.raises(KeyError):
+        loaded['nope']
+    assert loaded.contents.get('nope') is None
+    assert ('a.py', None) in loaded.contents.items()
+    assert ('b', None) not in loaded.contents.items()
+    assert len(loaded.contents) == 5
+    assert list(loaded['b'].contents) == ['empty', 'x.py']
+    assert not loaded['b']['empty']
+
+
+def test_lazy(snapshot_path):
+    """Test nodes are made only when needed, then kept."""
+    sample_tree().to_snapshot(snapshot_path)
+    loaded = FSTree.from_snapshot(snapshot_path)
+    assert loaded.contents.children == {}
+    c = loaded['c']
+    assert list(loaded.contents.children.values()) == [c]
+    assert c.contents.children == {}
+    assert loaded['c'] is c
+    assert loaded['b'] is loaded['b']
+    # Looking up paths makes just the nodes along them, without an index.
+    loaded = FSTree.from_snapshot(snapshot_path)
+    assert os.path.join('c', 'd', 'z') in loaded
+    assert loaded.contains_many([os.path.join('c', 'd'), 'x']) == [
+        True, False]
+    assert list(loaded.contents.children.values()) == [loaded['c']]
+    assert loaded._index is None
+
+
+def test_read_only(snapshot_path):
+    """Test a tree from a snapshot can't be changed."""
+    sample_tree().to_snapshot(snapshot_path)
+    loaded = FSTree.from_snapshot(snapshot_path)
+    with pytest.raises(TypeError):
+        loaded['new'] = None
+
+
+def test_pickle(snapshot_path):
+    """Test a tree from a snapshot pickles as a plain tree."""
+    sample_tree().to_snapshot(snapshot_path)
+    loaded = FSTree.from_snapshot(snapshot_path)
+    unpickled = pickle.loads(pickle.dumps(loaded))
+    assert unpickled == sample_tree()
+    assert isinstance(unpickled.contents, dict)
+
+
+def test_deep(snapshot_path):
+    """Test very deep trees are fine."""
+    tree = FSTree({'f': None})
+    for _ in range(5000):
+        tree = FSTree({'d': tree})
+    tree.to_snapshot(snapshot_path)
+    loaded = FSTree.from_snapshot(snapshot_path)
+    for _ in range(5000):
+        loaded = loaded['d']
+    assert loaded.dict == {'contents': {'f': None}}
+
+
+def test_bad_files(snapshot_path):
+    """Test files which aren't snapshots, or are the wrong version."""
+    for content in (
+        b'',
+        b'{"type": "FSTree"}',
+        HEADER.pack(b'NOTSNAP!', 1, 0),
+        HEADER.pack(MAGIC, 99, 0),
+    ):
+        with open(snapshot_path, 'wb') as snapshot:
+            snapshot.write(content)
+        with pytest.raises(ValueError):
+            FSTree.from_snapshot(snapshot_path)
+
+
+def test_format(snapshot_path):
+    """Test the header says where the top directory is."""
+    FSTree({'a': None}).to_snapshot(snapshot_path)
+    with open(snapshot_path, 'rb') as snapshot:
+        data = snapshot.read()
+    magic, version, offset = HEADER.unpack_from(data)
+    assert (magic, version) == (MAGIC, 1)
+    assert struct.unpack_from('<III', data, offset) == (1, 0, 1)
+    assert data.endswith(b'a')
@@ -0,0 +1,143 @@
+"""
+Tests of the stat_fields option of FSTree.at_path(), and FSTree.stats().
+"""
+
+import asyncio
+import io
+import os
+
+import pytest
+
+from roedoe_lib import FSTree, walk
+
+
+ALL_FIELDS = ('size', 'mtime_ns', 'mode', 'inode', 'dev')
+
+
+def expected_stats(path, fields=ALL_FIELDS):
+    st = os.stat(path)
+    return {field: getattr(st, walk.STAT_FIELDS[field]) for field in fields}
+
+
+def test_files_and_directories(scratch):
+    """Test stats are recorded for every file and directory walked."""
+    top = scratch({
+        'a': {'b.txt': 'hello', 'c': {'d.txt': 'world!'}},
+        'e.txt': '',
+    })
+    tree = FSTree.at_path(top, {top}, stat_fields=ALL_FIELDS)
+    assert tree.stats() == expected_stats(top)
+    for rel_path in (
+        'a', os.path.join('a', 'b.txt'), os.path.join('a', 'c'),
+        os.path.join('a', 'c', 'd.txt'), 'e.txt',
+    ):
+        assert tree.stats(rel_path) == expected_stats(
+            os.path.join(top, rel_path))
+    assert tree.stats(os.path.join('a', 'b.txt'))['size'] == 5
+    # Where they're kept.
+    assert tree['a'].metadata['files'] == {
+        'b.txt': expected_stats(os.path.join(top, 'a', 'b.txt')),
+    }
+    assert list(tree.metadata['files']) == ['e.txt']
+    c = os.path.join(top, 'a', 'c')
+    assert tree['a']['c'].metadata == dict(
+        expected_stats(c),
+        files={'d.txt': expected_stats(os.path.join(c, 'd.txt'))})
+    # The structure is just as without.
+    assert tree.diff(FSTree.at_path(top, {top})) == ([], [], [])
+
+
+def test_some_fields(scratch):
+    """Test recording just some fields, including just inodes."""
+    top = scratch({'a': {'b': None}, 'c': None})
+    tree = FSTree.at_path(top, {top}, stat_fields={'size', 'dev'})
+    assert tree.stats('c') == expected_stats(
+        os.path.join(top, 'c'), ('dev', 'size'))
+    tree = FSTree.at_path(top, {top}, stat_fields=['inode'])
+    assert tree.stats(os.path.join('a', 'b')) == {
+        'inode': os.stat(os.path.join(top, 'a', 'b')).st_ino}
+    assert tree.stats('a') == {'inode': os.stat(os.path.join(top, 'a')).st_ino}
+
+
+def test_without_stat_fields(basic):
+    """Test nothing is recorded by default."""
+    _, tmpdir = basic
+    tree = FSTree.at_path(tmpdir, {tmpdir})
+    assert tree.metadata is None
+    assert tree.stats() is None
+    assert tree.stats(os.path.join('a', 'b')) is None
+    with pytest.raises(KeyError):
+        tree.stats('missing')
+
+
+def test_unknown_field(basic):
+    """Test asking for a field there's no such thing as."""
+    _, tmpdir = basic
+    with pytest.raises(ValueError):
+        FSTree.at_path(tmpdir, {tmpdir}, stat_fields=('size', 'colour'))
+
+
+def test_links_followed(triple_linked):
+    """Test the stats of links are those of what they point to."""
+    _, tmpdir = triple_linked
+    tree = FSTree.at_path(tmpdir, {tmpdir}, stat_fields=ALL_FIELDS)
+    paths = list(tree._path_index())
+    assert paths
+    for rel_path in paths:
+        assert tree.stats(rel_path) == expected_stats(
+            os.path.join(tmpdir, rel_path))
+
+
+def test_stat_calls(scratch, monkeypatch):
+    """Test stats are got once per entry, during the walk's listing."""
+    top = scratch({'a': {'b': None, 'c': None}, 'd': None})
+    calls = []
+    entry_stats = walk.entry_stats
+
+    def counting_entry_stats(dir_entry, stat_fields):
+        stats = entry_stats(dir_entry, stat_fields)
+        calls.append(dir_entry.name)
+        return stats
+
+    monkeypatch.setattr(walk, 'entry_stats', counting_entry_stats)
+    FSTree.at_path(top, {top}, stat_fields=('size', 'mtime_ns'))
+    assert sorted(calls) == ['a', 'b', 'c', 'd']
+
+
+@pytest.mark.parametrize('options', (
+    {'workers': 3},
+    {'processes': 2},
+    {'processes': 2, 'workers': 2},
+))
+def test_concurrent_walks(cross_linked, options):
+    """Test threaded and sharded walks record the same stats."""
+    _, tmpdir = cross_linked
+    serial = FSTree.at_path(tmpdir, {tmpdir}, stat_fields=ALL_FIELDS)
+    tree = FSTree.at_path(tmpdir, {tmpdir}, stat_fields=ALL_FIELDS, **options)
+    assert tree.to_json() == serial.to_json()
+
+
+def test_async_walk(cross_linked):
+    """Test at_path_async() records the same stats."""
+    _, tmpdir = cross_linked
+    serial = FSTree.at_path(tmpdir, {tmpdir}, stat_fields=ALL_FIELDS)
+    tree = asyncio.run(FSTree.at_path_async(
+        tmpdir, {tmpdir}, stat_fields=ALL_FIELDS))
+    assert tree.to_json() == serial.to_json()
+
+
+def test_round_trips(scratch, tmp_path):
+    """Test stats survive JSON and snapshots, and count towards digests."""
+    top = scratch({'a': {'b': 'x'}, 'c': 'yz'})
+    tree = FSTree.at_path(top, {top}, stat_fields=('size',))
+    assert FSTree.from_json(tree.to_json()).stats('c') == {'size': 2}
+    buffer = io.StringIO()
+    tree.dump_json(buffer)
+    buffer.seek(0)
+    assert FSTree.load_json(buffer) == tree
+    snapshot = str(tmp_path / 'tree.snapshot')
+    tree.to_snapshot(snapshot)
+    loaded = FSTree.from_snapshot(snapshot)
+    assert loaded.stats(os.path.join('a', 'b')) == {'size': 1}
+    assert loaded == tree
+    assert tree != FSTree.at_path(top, {top})
@@ -0,0 +1,349 @@
+"""
+Tests of ignores.IgnoreScopes, and of walks pruning with it.
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from roedoe_lib import FSTree, ignore
+from roedoe_lib.ignores import IgnoreScopes
+
+
+SPEC = {
+    'node_modules': {
+        'lib': {
+            'index.js': None,
+            'keep.md': None,
+        },
+        'package.json': None,
+    },
+    '.git': {
+        'HEAD': None,
+        'objects': {
+            'ab': None,
+        },
+    },
+    'src': {
+        'thing.py': None,
+        'thing.pyc': None,
+        'node_modules': {
+            'x.js': None,
+        },
+        'build': {
+            'out.o': None,
+        },
+    },
+    'build': {
+        'out.o': None,
+        'keep.pyc': None,
+    },
+    'docs': {
+        'index.md': None,
+        'api': {
+            'index.md': None,
+            'index.rst': None,
+        },
+    },
+    'buildx': {
+        'thing.py': None,
+    },
+}
+
+IGNORES = [
+    ('node_modules/',),
+    ('.git/', '*.pyc'),
+    ('/build',),
+    ('/build/',),
+    ('build/*.o',),
+    ('docs/*.md',),
+    ('docs/**/*.md',),
+    ('/docs/api/',),
+    ('node_modules/', '!keep.md'),
+    ('node_modules/', '!/node_modules/lib/'),
+    ('node_modules/', '!keep.md', 'keep.md'),
+    ('*.pyc', '!keep.pyc', 'build/'),
+    ('src/**',),
+    ('*',),
+    ('*', '!*/', '!*.py'),
+    ('\\.git/', 'x?y/', '[bn]*/'),
+]
+
+
+@pytest.mark.parametrize('patterns', IGNORES)
+def test_same_as_checking_everything(scratch, patterns):
+    """Test walks give the same results as checking every entry."""
+    tmpdir = scratch(SPEC)
+    ignores = ignore(*patterns)
+    expected = checking_everything(
+        FSTree.at_path(tmpdir, {tmpdir}), ignores)
+    assert FSTree.at_path(tmpdir, {tmpdir}, ignores) == expected
+    assert FSTree.at_path(tmpdir, {tmpdir}, ignores, workers=2) == expected
+
+
+def test_pruned_not_listed(scratch, monkeypatch):
+    """Test directories whose contents are all ignored aren't listed."""
+    tmpdir = scratch(SPEC)
+    listed = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        listed.append(os.path.relpath(path, tmpdir))
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', counting_scandir)
+    FSTree.at_path(tmpdir, {tmpdir}, ignore('node_modules/', '.git/'))
+    monkeypatch.undo()
+    assert sorted(listed) == [
+        '.', 'build', 'buildx', 'docs', 'docs/api', 'src', 'src/build',
+    ]
+
+
+def test_scopes():
+    """Test which patterns are checked where."""
+    scopes = IgnoreScopes(ignore(
+        'build/*.o', 'docs/*.md', '*.pyc', 'node_modules/', '!keep.md',
+        'src/node_modules/'))
+    assert len(scope_of(scopes, '').patterns) == 6
+    assert patterns_in(scope_of(scopes, 'build')) == [
+        'build/*.o', '*.pyc', 'node_modules/', '!keep.md']
+    assert patterns_in(scope_of(scopes, 'docs')) == [
+        'docs/*.md', '*.pyc', 'node_modules/', '!keep.md']
+    assert patterns_in(scope_of(scopes, 'lib/deeper')) == [
+        '*.pyc', 'node_modules/', '!keep.md']
+    assert not scope_of(scopes, 'node_modules').pruned
+    assert scope_of(scopes, 'src/node_modules').pruned
+    assert scope_of(scopes, 'src/node_modules/lib').pruned
+    assert scope_of(scopes, 'src').spec is not scope_of(scopes, '').spec
+    assert scope_of(scopes, 'lib').spec is scope_of(scopes, 'lib/deeper').spec
+
+
+def test_scopes_nothing_to_check():
+    """Test directories which no pattern can reach."""
+    scopes = IgnoreScopes(ignore('/build/*.o', '/docs/'))
+    assert scope_of(scopes, 'src').spec is None
+    assert scope_of(scopes, 'src/deeper').spec is None
+    assert scope_of(scopes, 'build').spec is not None
+    assert scope_of(scopes, 'docs').pruned
+    assert scope_of(scopes, 'docs/deeper').pruned
+
+
+def test_scopes_other_specs():
+    """Test things other than plain PathSpecs are just used as they are."""
+
+    class Spec:
+        def match_file(self, path):
+            return path.endswith('.o')
+
+    spec = Spec()
+    scopes = IgnoreScopes(spec)
+    assert scope_of(scopes, 'build').spec is spec
+    assert not scope_of(scopes, 'build').pruned
+
+
+IGNORE_FILES_SPEC = {
+    '.gitignore': '*.log\nbuild/\n/top_only.txt\n!keep.log\n',
+    'top_only.txt': None,
+    'a.log': None,
+    'keep.log': None,
+    'build': {
+        '.gitignore': '!*\n',
+        'out.o': None,
+    },
+    'src': {
+        '.gitignore': '# Comment\n\n*.o\n!special.o\nkeep.log\ngen/\n',
+        '.ignore': '!gen/\n',
+        'top_only.txt': None,
+        'thing.py': None,
+        'thing.o': None,
+        'special.o': None,
+        'keep.log': None,
+        'gen': {
+            'made.py': None,
+        },
+        'build': None,
+        'deeper': {
+            '.gitignore': '/x\n',
+            'x': None,
+            'y': {
+                'x': None,
+                'z.log': None,
+            },
+        },
+    },
+    'docs': {
+        'index.md': None,
+        'logs': {
+            'today.log': None,
+        },
+    },
+}
+
+
+def test_ignore_files(scratch):
+    """Test ignore files are read and honoured as git would."""
+    tmpdir = scratch(IGNORE_FILES_SPEC)
+    ignore_files = ('.gitignore', '.ignore')
+    tree = FSTree.at_path(tmpdir, {tmpdir}, ignore_files=ignore_files)
+    assert tree == FSTree({
+        '.gitignore': None,
+        'docs': FSTree({
+            'index.md': None,
+        }),
+        'keep.log': None,
+        'src': FSTree({
+            '.gitignore': None,
+            '.ignore': None,
+            'build': None,
+            'deeper': FSTree({
+                '.gitignore': None,
+                'y': FSTree({
+                    'x': None,
+                }),
+            }),
+            'gen': FSTree({
+                'made.py': None,
+            }),
+            'special.o': None,
+            'thing.py': None,
+            'top_only.txt': None,
+        }),
+    })
+    for kwargs in ({'workers': 2}, {'processes': 2}):
+        assert FSTree.at_path(
+            tmpdir, {tmpdir}, ignore_files=ignore_files, **kwargs) == tree
+
+
+def test_ignore_files_and_ignores(scratch):
+    """Test ignore files take precedence over ignores."""
+    tmpdir = scratch(IGNORE_FILES_SPEC)
+    tree = FSTree.at_path(
+        tmpdir, {tmpdir}, ignore('*.py', 'docs/', '!a.log'),
+        ignore_files=('.gitignore',))
+    assert tree == FSTree({
+        '.gitignore': None,
+        'keep.log': None,
+        'src': FSTree({
+            '.gitignore': None,
+            '.ignore': None,
+            'build': None,
+            'deeper': FSTree({
+                '.gitignore': None,
+                'y': FSTree({
+                    'x': None,
+                }),
+            }),
+            'special.o': None,
+            'top_only.txt': None,
+        }),
+    })
+
+
+def test_ignore_files_compiled_once(scratch, monkeypatch):
+    """Test each ignore file is only read once per walk."""
+    tmpdir = scratch(IGNORE_FILES_SPEC)
+    opened = []
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(os.path.relpath(path, tmpdir))
+        return open(path, *args, **kwargs)
+
+    monkeypatch.setattr(
+        'roedoe_lib.ignores.open', counting_open, raising=False)
+    FSTree.at_path(tmpdir, {tmpdir}, ignore_files=('.gitignore',))
+    monkeypatch.undo()
+    assert sorted(opened) == [
+        '.gitignore', 'docs/.gitignore', 'docs/logs/.gitignore',
+        'src/.gitignore', 'src/deeper/.gitignore',
+        'src/deeper/y/.gitignore',
+    ]
+
+
+NEGATED_DIRS_SPEC = {
+    'whitelist': {
+        '.gitignore': '*\n!*/\n!*.py\n',
+        'a.py': None,
+        'a.txt': None,
+        'sub': {
+            'b.py': None,
+            'b.txt': None,
+        },
+    },
+    'dotted': {
+        '.gitignore': 'd.*\n!*.py\n',
+        'd.py': None,
+        'x.py': {
+            'd.md': None,
+            'e.md': None,
+        },
+    },
+    'reincluded': {
+        '.gitignore': '*\n!build/\n',
+        'build': {
+            'out.o': None,
+        },
+    },
+    'globstar': {
+        '.gitignore': 'a/**\n!a/keep\n',
+        'a': {
+            'drop': None,
+            'keep': None,
+        },
+    },
+}
+
+
+@pytest.mark.skipif(shutil.which('git') is None, reason='git not found')
+@pytest.mark.parametrize('spec', (IGNORE_FILES_SPEC, NEGATED_DIRS_SPEC))
+def test_ignore_files_as_git(scratch, spec):
+    """Test ignore files are honoured the same as by git itself."""
+    tmpdir = scratch(spec)
+    subprocess.check_call(
+        ['git', 'init', '-q', tmpdir], stdout=subprocess.DEVNULL)
+    listed = subprocess.check_output(
+        ['git', '-C', tmpdir, 'ls-files', '--others', '--exclude-standard'],
+        universal_newlines=True)
+    tree = FSTree.at_path(
+        tmpdir, {tmpdir}, ignore('/.git/'), ignore_files=('.gitignore',))
+    assert sorted(listed.splitlines()) == sorted(paths_in(tree))
+
+
+# Helpers
+
+def paths_in(tree, prefix=''):
+    """All the files in a tree, as paths."""
+    for name, value in tree.contents.items():
+        if isinstance(value, FSTree):
+            yield from paths_in(value, prefix + name + '/')
+        else:
+            yield prefix + name
+
+
+def checking_everything(tree, ignores, prefix=''):
+    """
+    Filter a tree as walking it would, checking every entry against some
+    ignores.
+    """
+    contents = {}
+    for name, value in tree.contents.items():
+        path = prefix + name
+        if ignores.match_file(path):
+            continue
+        if isinstance(value, FSTree):
+            value = checking_everything(value, ignores, path + '/')
+            if not value:
+                continue
+        contents[name] = value
+    return FSTree(contents)
+
+
+def scope_of(scopes, rel_path):
+    """Scope of some directory, where there are no ignore files."""
+    return scopes.scope(rel_path, os.path.join('nowhere', rel_path))
+
+
+def patterns_in(scope):
+    """Patterns checked for some scope, as they were given."""
+    return [pattern.pattern for _, pattern in scope.patterns]
@@ -0,0 +1,266 @@
+"""
+Tests of live.LiveFSTree.
+"""
+
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+from roedoe_lib import FSTree, ignore
+from roedoe_lib.live import LiveFSTree
+
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith('linux'), reason='inotify is Linux only')
+
+
+SPEC = {
+    'a': {
+        'a': {
+            'd': None,
+            'e': None,
+        },
+        'b': None,
+        'g': {},
+    },
+    'h': {
+        'i': None,
+    },
+}
+
+
+def test_initial(basic):
+    """Test the initial tree is what FSTree.at_path() finds."""
+    _, tmpdir = basic
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        assert live.snapshot() == FSTree.at_path(tmpdir, {tmpdir})
+
+
+def test_create_and_delete_files(scratch):
+    """Test files appearing and disappearing, including in empty dirs."""
+    tmpdir = scratch(SPEC)
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        touch(tmpdir, 'a/a/new')
+        touch(tmpdir, 'a/g/new')
+        os.remove(os.path.join(tmpdir, 'h', 'i'))
+        assert_eventually(live, tmpdir)
+        assert 'new' in live.snapshot()['a']['g'].contents
+        assert 'h' not in live.snapshot().contents
+
+
+def test_create_and_delete_dirs(scratch):
+    """Test new directories being walked and watched, and removed again."""
+    tmpdir = scratch(SPEC)
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        os.makedirs(os.path.join(tmpdir, 'x', 'y'))
+        touch(tmpdir, 'x/y/z')
+        assert_eventually(live, tmpdir)
+        touch(tmpdir, 'x/y/zz')
+        shutil.rmtree(os.path.join(tmpdir, 'a'))
+        assert_eventually(live, tmpdir)
+        assert live.snapshot() == FSTree({
+            'h': FSTree({
+                'i': None,
+            }),
+            'x': FSTree({
+                'y': FSTree({
+                    'z': None,
+                    'zz': None,
+                }),
+            }),
+        })
+
+
+def test_dir_replaced(scratch):
+    """Test a directory removed and made again between updates."""
+    tmpdir = scratch(SPEC)
+    with LiveFSTree(tmpdir, {tmpdir}, latency=0.2) as live:
+        shutil.rmtree(os.path.join(tmpdir, 'a'))
+        os.makedirs(os.path.join(tmpdir, 'a'))
+        assert_eventually(live, tmpdir)
+        touch(tmpdir, 'a/new')
+        assert_eventually(live, tmpdir)
+        assert 'new' in live.snapshot()['a'].contents
+
+
+def test_moves(scratch):
+    """Test moving things within, into and out of the tree."""
+    tmpdir = scratch(SPEC)
+    outside = scratch({'o': {'p': None}})
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        os.rename(os.path.join(tmpdir, 'a', 'a'), os.path.join(tmpdir, 'm'))
+        os.rename(os.path.join(tmpdir, 'h'), os.path.join(outside, 'h'))
+        os.rename(os.path.join(outside, 'o'), os.path.join(tmpdir, 'o'))
+        assert_eventually(live, tmpdir)
+        # Moved directories are still watched.
+        touch(tmpdir, 'm/new')
+        touch(tmpdir, 'o/new')
+        assert_eventually(live, tmpdir)
+        assert sorted(live.snapshot()['m'].contents) == ['d', 'e', 'new']
+
+
+def test_attributes(scratch):
+    """Test a directory becoming unreadable, then readable again."""
+    if os.geteuid() == 0:
+        pytest.skip('Everything is readable as root')
+    tmpdir = scratch(SPEC)
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        os.chmod(os.path.join(tmpdir, 'h'), 0)
+        assert_eventually(live, tmpdir, FSTree({
+            'a': FSTree.at_path(os.path.join(tmpdir, 'a'), {tmpdir}),
+        }))
+        os.chmod(os.path.join(tmpdir, 'h'), 0o755)
+        assert_eventually(live, tmpdir)
+
+
+def test_links(scratch):
+    """
+    Test links to things already in the tree, and things turning up when
+    what claimed them first goes.
+    """
+    tmpdir = scratch(SPEC)
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        os.symlink(
+            os.path.join(tmpdir, 'a', 'a'), os.path.join(tmpdir, 'h', 'l'))
+        os.symlink(
+            os.path.join(tmpdir, 'h'), os.path.join(tmpdir, 'z'))
+        assert_eventually(live, tmpdir)
+        assert 'l' not in live.snapshot()['h'].contents
+        assert 'z' not in live.snapshot().contents
+        shutil.rmtree(os.path.join(tmpdir, 'a'))
+        os.rename(os.path.join(tmpdir, 'h'), os.path.join(tmpdir, 'hh'))
+        assert_eventually(live, tmpdir)
+
+
+def test_link_to_top(scratch):
+    """Test a link back to the top, which shares the top's watch."""
+    tmpdir = scratch({})
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        touch(tmpdir, 'f')
+        assert_eventually(live, tmpdir)
+        os.symlink('.', os.path.join(tmpdir, 'a'))
+        # Seen through either route, depending on how events are batched,
+        # once the link's been walked.
+        touch(tmpdir, 'x')
+        deadline = time.monotonic() + 5
+        while not any(
+            path in live.snapshot() for path in ('x', os.path.join('a', 'x'))
+        ):
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+        os.remove(os.path.join(tmpdir, 'a'))
+        os.remove(os.path.join(tmpdir, 'x'))
+        assert_eventually(live, tmpdir)
+        touch(tmpdir, 'g')
+        assert_eventually(live, tmpdir, FSTree({'f': None, 'g': None}))
+
+
+def test_links_into_tree(scratch, mutual_one_file):
+    """Test changes seen via a link to a directory."""
+    spec, _ = mutual_one_file
+    tmpdir = scratch(spec)
+    top = os.path.join(tmpdir, 'a')
+    with LiveFSTree(top, {tmpdir}) as live:
+        assert live.snapshot() == FSTree.at_path(top, {tmpdir})
+        touch(tmpdir, 'd/e/new')
+        assert_eventually(live, top, valid_roots={tmpdir})
+        assert 'new' in live.snapshot()['b']['c']['e'].contents
+
+
+def test_ignores(scratch):
+    """Test new entries are ignored as FSTree.at_path() would."""
+    tmpdir = scratch(SPEC)
+    ignores = ignore('*.pyc', 'x/')
+    with LiveFSTree(tmpdir, {tmpdir}, ignores) as live:
+        touch(tmpdir, 'a/g/thing.pyc')
+        os.makedirs(os.path.join(tmpdir, 'x'))
+        touch(tmpdir, 'x/thing')
+        touch(tmpdir, 'a/g/thing.py')
+        assert_eventually(live, tmpdir, ignores=ignores)
+        assert live.snapshot()['a']['g'] == FSTree({'thing.py': None})
+
+
+def test_bursts(scratch):
+    """Test many changes at once."""
+    tmpdir = scratch(SPEC)
+    with LiveFSTree(tmpdir, {tmpdir}, latency=0.2) as live:
+        for i in range(20):
+            os.makedirs(os.path.join(tmpdir, 'burst', str(i)))
+            for j in range(20):
+                touch(tmpdir, 'burst/{}/{}'.format(i, j))
+        assert_eventually(live, tmpdir)
+
+
+def test_snapshot_unaffected_by_updates(scratch):
+    """Test a snapshot stays as it was."""
+    tmpdir = scratch(SPEC)
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        before = live.snapshot()
+        expected = FSTree.at_path(tmpdir, {tmpdir})
+        touch(tmpdir, 'a/a/new')
+        shutil.rmtree(os.path.join(tmpdir, 'h'))
+        assert_eventually(live, tmpdir)
+        assert before == expected
+
+
+def test_snapshots_share_unchanged(scratch):
+    """Test snapshots share what's unchanged between them."""
+    tmpdir = scratch(SPEC)
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        before = live.snapshot()
+        assert live.snapshot() is before
+        touch(tmpdir, 'a/a/new')
+        assert_eventually(live, tmpdir)
+        after = live.snapshot()
+        assert 'new' in after['a']['a'].contents
+        assert 'new' not in before['a']['a'].contents
+        assert after['h'] is before['h']
+        assert after['a'] is not before['a']
+
+
+def test_top_removed(scratch):
+    """Test the whole tree going away."""
+    tmpdir = scratch({'top': SPEC})
+    top = os.path.join(tmpdir, 'top')
+    with LiveFSTree(top, {tmpdir}) as live:
+        shutil.rmtree(top)
+        assert_eventually(live, top, FSTree({}))
+
+
+def test_within_tree_links_fixture(scratch, triple_linked):
+    """Test the initial tree where there are links across the tree."""
+    spec, _ = triple_linked
+    tmpdir = scratch(spec)
+    with LiveFSTree(tmpdir, {tmpdir}) as live:
+        assert live.snapshot() == FSTree.at_path(tmpdir, {tmpdir})
+
+
+# Helpers
+
+def assert_eventually(live, top, expected=None, valid_roots=None,
+                      ignores=None, timeout=5):
+    """
+    Assert a live tree soon matches what FSTree.at_path() finds, or some
+    expected FSTree.
+    """
+    valid_roots = valid_roots or {top}
+    deadline = time.monotonic() + timeout
+    while True:
+        if expected is None:
+            wanted = FSTree.at_path(top, valid_roots, ignores)
+        else:
+            wanted = expected
+        snapshot = live.snapshot()
+        if snapshot == wanted:
+            return
+        if time.monotonic() > deadline:
+            assert snapshot == wanted
+        time.sleep(0.02)
+
+
+def touch(tmpdir, path):
+    """Create an empty file in some tree."""
+    open(os.path.join(tmpdir, *path.split('/')), 'a').close()
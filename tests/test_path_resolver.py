@@ -0,0 +1,130 @@
+"""
+Tests of base.get_path_resolver() and base.PathResolver.
+"""
+
+import os
+import pickle
+
+from roedoe_lib import FSTree, PathResolver, get_path_resolver
+
+from conftest import Link, LinkWithinTree
+
+
+def test_within_roots(scratch):
+    """Test paths inside and outside the roots."""
+    tmpdir = scratch({'data': {'foo': {'bar': None}, 'foobar': None}})
+    data = os.path.join(tmpdir, 'data')
+    resolve = get_path_resolver({os.path.join(data, 'foo')})
+    assert resolve(os.path.join(data, 'foo')) == os.path.realpath(
+        os.path.join(data, 'foo'))
+    assert resolve(os.path.join(data, 'foo', 'bar')) == os.path.realpath(
+        os.path.join(data, 'foo', 'bar'))
+    assert resolve(os.path.join(data, 'foo', 'missing')) is not None
+    # Not just a string prefix.
+    assert resolve(os.path.join(data, 'foobar')) is None
+    assert resolve(data) is None
+    assert resolve(tmpdir) is None
+
+
+def test_links(scratch):
+    """Test links are followed before checking."""
+    tmpdir = scratch({
+        'inside': {
+            'out': LinkWithinTree('outside'),
+            'back': Link('../inside'),
+        },
+        'outside': {},
+    })
+    resolve = get_path_resolver({os.path.join(tmpdir, 'inside')})
+    assert resolve(os.path.join(tmpdir, 'inside', 'out')) is None
+    assert resolve(os.path.join(tmpdir, 'inside', 'back')) == (
+        os.path.realpath(os.path.join(tmpdir, 'inside')))
+
+
+def test_many_roots():
+    """Test lots of roots, nested roots and the filesystem root."""
+    roots = ['/r/{}/s'.format(i) for i in range(1000)]
+    resolver = PathResolver(roots + ['/r/5/s/t', '/r/7'])
+    assert resolver.contains('/r/999/s')
+    assert resolver.contains('/r/5/s/t/u')
+    assert resolver.contains('/r/7/anything')
+    assert not resolver.contains('/r/1000/s')
+    assert not resolver.contains('/r/5')
+    assert not resolver.contains('/r/5/st')
+    assert not resolver.contains('/')
+    assert PathResolver(['/r/5/s/t', '/']).contains('/anything/at/all')
+
+
+def test_shared_and_pickled(basic):
+    """Test one resolver can be used for many walks, and pickled."""
+    _, tmpdir = basic
+    resolver = get_path_resolver({tmpdir})
+    assert get_path_resolver(resolver) is resolver
+    expected = FSTree.at_path(tmpdir, {tmpdir})
+    assert FSTree.at_path(tmpdir, resolver) == expected
+    assert FSTree.at_path(tmpdir, resolver, processes=2) == expected
+    unpickled = pickle.loads(pickle.dumps(resolver))
+    assert unpickled(tmpdir) == resolver(tmpdir)
+
+
+LINKS_SPEC = {
+    'a': {
+        'b': {
+            'file': None,
+        },
+        'to_b': Link('b'),
+        'to_file': Link('b/file'),
+        'chain': Link('to_b'),
+        'up_and_down': Link('../a/./to_b/../b'),
+        'through': Link('to_b/../../c'),
+        'broken': Link('nowhere/../b'),
+        'loop1': Link('loop2'),
+        'loop2': Link('loop1'),
+        'self': Link('self/x'),
+        'absolute': LinkWithinTree('c/to_a'),
+    },
+    'c': {
+        'to_a': Link('../a'),
+    },
+}
+
+
+def test_caching_same_as_realpath(scratch):
+    """Test a caching resolver gives the same answers as os.path.realpath."""
+    tmpdir = scratch(LINKS_SPEC)
+    resolver = PathResolver({tmpdir}).caching()
+    for _ in range(2):
+        for dir_name in ('a', 'c'):
+            real_dir = os.path.realpath(os.path.join(tmpdir, dir_name))
+            for name in os.listdir(real_dir):
+                expected = os.path.realpath(os.path.join(real_dir, name))
+                assert resolver.child(real_dir, name) == expected, name
+
+
+def test_caching_outside_roots(scratch):
+    """Test a caching resolver still checks the roots."""
+    tmpdir = scratch(LINKS_SPEC)
+    resolver = PathResolver({os.path.join(tmpdir, 'c')}).caching()
+    real_c = os.path.realpath(os.path.join(tmpdir, 'c'))
+    assert resolver.child(real_c, 'to_a') is None
+
+
+def test_caching_reads_links_once(scratch, monkeypatch):
+    """Test each link's only read once."""
+    tmpdir = scratch(LINKS_SPEC)
+    resolver = PathResolver({tmpdir}).caching()
+    real_a = os.path.realpath(os.path.join(tmpdir, 'a'))
+    read = []
+    readlink = os.readlink
+
+    def counting_readlink(path):
+        read.append(os.path.relpath(path, real_a))
+        return readlink(path)
+
+    monkeypatch.setattr(os, 'readlink', counting_readlink)
+    for name in ('chain', 'to_b', 'chain', 'up_and_down'):
+        resolver.child(real_a, name)
+    monkeypatch.undo()
+    # up_and_down goes via a, then to_b and b again, which are cached.
+    assert read == ['chain', 'to_b', 'b', 'up_and_down', '.']
+    pickle.loads(pickle.dumps(resolver))